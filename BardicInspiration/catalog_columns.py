@@ -0,0 +1,115 @@
+"""The dictionary process_csv returns, turned into numpy columns so that many searches can be answered together:
+    tempos                float, one per song (-1 when unknown)
+    keys, times, labels   integer codes into key_names, time_names and label_names (labels lower case)
+    instrument_bits       one row per song with a bit for each of instrument_names, packed 8 to a byte
+Songs are numbered in catalog order, and that number is the song's ID. For searching, each column also gets a table
+with the packed bitset of the songs that have each value (bit n set for song n), followed by a row of zeros for a
+value no song has and a row of ones for "Any". search_batch looks up every search's row in each table at once and
+ANDs them, so a batch of searches is a handful of numpy operations instead of a loop over the songs per search."""
+
+import numpy
+
+try:
+    from BardicInspiration.catalog_snapshot import tempo_range
+except ImportError:
+    from catalog_snapshot import tempo_range
+
+ANY_CODE = -1  # The search doesn't care about this column: the last row of a bitset table
+MISSING_CODE = -2  # The search asks for a value no song has: the row before it
+
+def categorical_codes(values):
+    """(codes, names) with names[codes[n]] == values[n]. Names are numbered in the order they first appear"""
+    numbers = {}
+    codes = numpy.fromiter((numbers.setdefault(value, len(numbers)) for value in values), dtype=numpy.int32,
+                           count=len(values))
+    return codes, list(numbers)
+
+def query_codes(choices, names):
+    """The code of each choice among names, ANY_CODE for "Any" and MISSING_CODE for a value that isn't there"""
+    numbers = dict((name, number) for number, name in enumerate(names))
+    return numpy.array([ANY_CODE if choice == "Any" else numbers.get(choice, MISSING_CODE) for choice in choices],
+                       dtype=numpy.int32)
+
+def bitset_table(value_bits):
+    """Packs a (values, songs) boolean matrix into bitsets and adds the MISSING_CODE and ANY_CODE rows"""
+    song_count = value_bits.shape[1]
+    rows = numpy.concatenate([value_bits, numpy.zeros((1, song_count), dtype=bool),
+                              numpy.ones((1, song_count), dtype=bool)])
+    return numpy.packbits(rows, axis=1)
+
+class CatalogColumns:
+    """Columns of a process_csv dictionary, see the module docstring"""
+    def __init__(self, music_info):
+        self.songs = list(music_info)
+        attributes = list(music_info.values())
+
+        self.tempos = numpy.array([song['Tempo'] for song in attributes], dtype=numpy.float64)
+        self.keys, self.key_names = categorical_codes([song['Key Signature'] for song in attributes])
+        self.times, self.time_names = categorical_codes([song['Time Signature'] for song in attributes])
+        self.labels, self.label_names = categorical_codes([song['Label'].lower() for song in attributes])
+
+        numbers = {}
+        song_numbers, instrument_numbers = [], []
+        for song_number, song in enumerate(attributes):
+            for instrument in set(song['Instruments']):
+                song_numbers.append(song_number)
+                instrument_numbers.append(numbers.setdefault(instrument, len(numbers)))
+        self.instrument_names = list(numbers)
+        bits = numpy.zeros((len(self.songs), len(numbers)), dtype=bool)
+        bits[song_numbers, instrument_numbers] = True
+        self.instrument_bits = numpy.packbits(bits, axis=1)
+
+        self.key_table = bitset_table(self.keys[None, :] == numpy.arange(len(self.key_names))[:, None])
+        self.time_table = bitset_table(self.times[None, :] == numpy.arange(len(self.time_names))[:, None])
+        self.label_table = bitset_table(self.labels[None, :] == numpy.arange(len(self.label_names))[:, None])
+        self.instrument_table = bitset_table(bits.T)
+        self.tempo_order = numpy.argsort(self.tempos, kind='stable')
+        self.sorted_tempos = self.tempos[self.tempo_order]
+
+    def __len__(self):
+        return len(self.songs)
+
+    def names(self, ids):
+        """Song names of an ID array"""
+        return [self.songs[song_id] for song_id in ids]
+
+    def tempo_bits(self, min_tempo, max_tempo):
+        """Boolean array of the songs with min_tempo <= tempo <= max_tempo, found with two binary searches"""
+        start = numpy.searchsorted(self.sorted_tempos, min_tempo, side='left')
+        end = numpy.searchsorted(self.sorted_tempos, max_tempo, side='right')
+        bits = numpy.zeros(len(self.songs), dtype=bool)
+        bits[self.tempo_order[start:end]] = True
+        return bits
+
+    def tempo_table(self, tempos):
+        """(table, codes) for a list of tempo choices, with one row per different range they ask for"""
+        numbers = {}
+        codes = numpy.array([ANY_CODE if tempo == "Any" else numbers.setdefault(tempo_range(tempo), len(numbers))
+                             for tempo in tempos], dtype=numpy.int32)
+        value_bits = numpy.zeros((len(numbers), len(self.songs)), dtype=bool)
+        for number, (min_tempo, max_tempo) in enumerate(numbers):
+            value_bits[number] = self.tempo_bits(min_tempo, max_tempo)
+        return bitset_table(value_bits), codes
+
+    def search_chunk(self, searches):
+        tempos, times, instruments, keys, labels = zip(*searches)
+        labels = [label if label == "Any" else label.lower() for label in labels]
+        tempo_table, tempo_codes = self.tempo_table(tempos)
+
+        matches = tempo_table[tempo_codes]
+        matches &= self.time_table[query_codes(times, self.time_names)]
+        matches &= self.instrument_table[query_codes(instruments, self.instrument_names)]
+        matches &= self.key_table[query_codes(keys, self.key_names)]
+        matches &= self.label_table[query_codes(labels, self.label_names)]
+        return [numpy.flatnonzero(row) for row in numpy.unpackbits(matches, axis=1, count=len(self.songs))]
+
+    def search_batch(self, searches, chunk_size=None):
+        """One ID array per search, each search being (tempo, time, instrument, key, label) like the choices of
+        music_search (the tempo can also be a (min, max) tuple). The searches are looked up chunk_size at a time,
+        by default as many as keep the chunk's unpacked results around 32 million entries"""
+        if chunk_size is None:
+            chunk_size = max(1, (32 * 1024 * 1024) // max(len(self.songs), 1))
+        results = []
+        for start in range(0, len(searches), chunk_size):
+            results.extend(self.search_chunk(searches[start:start + chunk_size]))
+        return results
@@ -0,0 +1,198 @@
+"""Keeps the dictionary process_csv parses out of music_features.csv in a binary snapshot next to it, so the next
+program that needs the catalog reads one file instead of parsing every row again. music_features.csv.snapshot.pkl
+holds two pickles:
+    header        SNAPSHOT_VERSION and the size, modification time and SHA-256 of the CSV it was made from
+    music_info    the process_csv dictionary
+load_catalog uses the snapshot while the CSV has the same size and modification time (or, after the CSV was only
+touched or copied, the same contents). Otherwise it parses the CSV and writes a new snapshot in a background thread,
+so the caller doesn't wait for it. Searching (music_classification) and picking the songs to train on (model_registry)
+both load the catalog this way. To make the snapshot ahead of time:
+    python catalog_snapshot.py music_features.csv"""
+
+import argparse
+import csv
+import gc
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+
+try:
+    from BardicInspiration.note_cache import file_hash
+except ImportError:
+    from note_cache import file_hash
+
+SNAPSHOT_VERSION = 3  # Bump this whenever process_csv changes what it returns
+snapshot_lock = threading.Lock()  # One snapshot written at a time in this process
+snapshot_threads = []  # Background writes that may still be running, see wait_for_snapshots
+
+TEMPO_RANGES = {
+    "0-60": (0.0, 60.0),
+    "61-120": (61.0, 120.0),
+    "121-180": (121.0, 180.0),
+    "181+": (181.0, float('inf'))
+}
+
+def tempo_range(selected_tempo):
+    """(min, max) of a tempo choice: one of the TEMPO_RANGES names or a (min, max) tuple of its own"""
+    if isinstance(selected_tempo, tuple):
+        return selected_tempo
+    return TEMPO_RANGES[selected_tempo]
+
+def parse_tempo(tempo):
+    """The tempo from a CSV row as a number, or -1 when it is unknown or isn't a number"""
+    if tempo.lower() in ['unknown', '']:
+        return -1
+    try:
+        return float(tempo)
+    except ValueError:
+        return -1
+
+def parse_pitch_classes(text):
+    """The 12 counts of a CSV pitch_classes field, or None when the row doesn't have them"""
+    counts = [float(count) for count in re.findall(r'[\d.]+', text or '')]
+    return counts if len(counts) == 12 else None
+
+def catalog_entry(row):
+    """The process_csv dictionary of one CSV row. Catalogs extracted before the pitch_classes column was added
+    have no 'Pitch Classes'"""
+    instruments = [instrument.strip() for instrument in row['instruments'].split(';')]
+    entry = {
+        'Tempo': parse_tempo(row['tempo']),
+        'Time Signature': row['time_signature'],
+        'Instruments': instruments,  # Convert string representation of list to list
+        'Key Signature': row['key_signature'],
+        'Label': row['label']
+    }
+    if row.get('pitch_classes') is not None:
+        entry['Pitch Classes'] = parse_pitch_classes(row['pitch_classes'])
+    return entry
+
+def process_csv(csv_file):
+    """Process a CSV file containing music information and return a dictionary. A tempo that isn't a number is
+    -1, the same as an unknown one."""
+    music_info = {}
+    with open(csv_file, 'r', newline='', encoding='utf-8') as file:  # feature_catalog writes it as UTF-8
+        reader = csv.DictReader(file)
+        for row in reader:
+            music_info[row['song_name']] = catalog_entry(row)
+    return music_info
+
+def snapshot_file(csv_file):
+    return csv_file + ".snapshot.pkl"
+
+def csv_state(csv_file):
+    stat = os.stat(csv_file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def read_header(file):
+    """The header of an open snapshot, or None when it isn't a snapshot of this version"""
+    try:
+        header = pickle.load(file)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    return header if isinstance(header, dict) and header.get('version') == SNAPSHOT_VERSION else None
+
+def read_music_info(file):
+    """The dictionary after the header. The garbage collector is paused meanwhile, as it would otherwise keep
+    looking through the many small dictionaries and lists being made, which takes longer than reading them"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(file.read())
+    finally:
+        if enabled:
+            gc.enable()
+
+def write_snapshot(csv_file, state, music_info):
+    """Writes the snapshot to a temporary file first and then swaps it in, so a reader never sees half of one"""
+    folder = os.path.dirname(os.path.abspath(csv_file))
+    with snapshot_lock:
+        handle, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                pickle.dump(dict(state, version=SNAPSHOT_VERSION), file, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(music_info, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, snapshot_file(csv_file))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+def in_background(function, *args):
+    """Runs function in a thread that the program waits for before it exits. If it fails, there is just no new
+    snapshot and the CSV gets parsed again next time. That includes a caller changing the dictionary while it is
+    being pickled, which raises RuntimeError"""
+    def run():
+        try:
+            function(*args)
+        except (OSError, KeyError, ValueError, RuntimeError, pickle.PicklingError):
+            pass
+    thread = threading.Thread(target=run, name="catalog snapshot")
+    thread.start()
+    snapshot_threads[:] = [running for running in snapshot_threads if running.is_alive()] + [thread]
+    return thread
+
+def wait_for_snapshots():
+    """Waits until every snapshot being written in the background is written"""
+    while snapshot_threads:
+        snapshot_threads.pop().join()
+
+def save_snapshot(csv_file, state, music_info, background):
+    if background:
+        in_background(write_snapshot, csv_file, state, music_info)
+    else:
+        write_snapshot(csv_file, state, music_info)
+
+def load_catalog(csv_file, background=True):
+    """The process_csv dictionary of csv_file, read from its snapshot when the snapshot is up to date. Otherwise the
+    CSV is parsed and the snapshot written again, in a background thread unless background is False. The same
+    dictionary may go on being pickled in the background, so callers shouldn't change it"""
+    source = csv_state(csv_file)
+    csv_hash = None
+    try:
+        with open(snapshot_file(csv_file), 'rb') as file:
+            header = read_header(file)
+            if header is not None and header['size'] == source['size']:
+                if header['mtime_ns'] != source['mtime_ns']:
+                    csv_hash = file_hash(csv_file)  # Touched or copied, but maybe not changed
+                if csv_hash is None or csv_hash == header['hash']:
+                    music_info = read_music_info(file)
+                    if csv_hash is not None:  # Remember the new modification time so the CSV isn't hashed every time
+                        save_snapshot(csv_file, dict(source, hash=csv_hash), music_info, background)
+                    return music_info
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass  # No snapshot, or a broken one, so parse the CSV
+
+    music_info = process_csv(csv_file)
+    if csv_hash is None:
+        csv_hash = file_hash(csv_file)
+    if csv_state(csv_file) == source:  # Not changed while it was parsed
+        save_snapshot(csv_file, dict(source, hash=csv_hash), music_info, background)
+    return music_info
+
+def refresh_snapshot(csv_file):
+    """Brings csv_file's snapshot up to date in a background thread, for after the CSV was written"""
+    return in_background(load_catalog, csv_file, False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Make the snapshot of the music features catalog")
+    parser.add_argument("csv_file", nargs="?", default="music_features.csv", help="features CSV")
+    args = parser.parse_args()
+
+    state = csv_state(args.csv_file)
+    start = time.perf_counter()
+    music_info = process_csv(args.csv_file)
+    parsed = time.perf_counter() - start
+    start = time.perf_counter()
+    write_snapshot(args.csv_file, dict(state, hash=file_hash(args.csv_file)), music_info)
+    written = time.perf_counter() - start
+    start = time.perf_counter()
+    load_catalog(args.csv_file, background=False)
+    loaded = time.perf_counter() - start
+    print(f"{len(music_info)} songs: parsed the CSV in {parsed:.2f} s, wrote {snapshot_file(args.csv_file)} in "
+          f"{written:.2f} s, loaded it in {loaded:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Stores the training notes as integers instead of a pickled list of note names. A corpus folder holds
+    vocab.json    the note names, so vocab[token] is the name of a token. They are sorted, except that notes added by
+                  append_songs go at the end
+    tokens.npy    every song's notes as int16 (int32 for very large vocabularies), one song after another
+    offsets.npy   where each song starts in tokens, plus the total length at the end
+tokens.npy is memory mapped when loaded, so even a corpus bigger than memory opens instantly and nothing has to be
+unpickled or looked up in a dict before training or generation can use it."""
+
+import json
+import os
+
+import numpy
+
+VOCAB_FILE = "vocab.json"
+TOKENS_FILE = "tokens.npy"
+OFFSETS_FILE = "offsets.npy"
+
+class Corpus:
+    """Integer encoded notes. tokens[offsets[i]:offsets[i + 1]] are the notes of song i"""
+    def __init__(self, tokens, offsets, vocab):
+        self.tokens = tokens
+        self.offsets = offsets
+        self.vocab = vocab
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def song(self, number):
+        """Tokens of one song"""
+        return self.tokens[self.offsets[number]:self.offsets[number + 1]]
+
+    def notes(self):
+        """All the notes decoded back into names, the same list get_notes returns"""
+        return list(numpy.array(self.vocab, dtype=object)[self.tokens])
+
+def token_dtype(vocab_size):
+    """Smallest integer type that can hold every token"""
+    return numpy.int16 if vocab_size <= numpy.iinfo(numpy.int16).max + 1 else numpy.int32
+
+def encode_songs(song_notes, vocab=None):
+    """Builds a Corpus out of one list of note names per song. The vocabulary is every note name sorted, the
+    same order music_creation and the trained network use"""
+    if vocab is None:
+        vocab = sorted(set(name for notes in song_notes for name in notes))
+    note_to_integer = dict((name, number) for number, name in enumerate(vocab))
+
+    lengths = [len(notes) for notes in song_notes]
+    tokens = numpy.fromiter((note_to_integer[name] for notes in song_notes for name in notes),
+                            dtype=token_dtype(len(vocab)), count=sum(lengths))
+    offsets = numpy.concatenate(([0], numpy.cumsum(lengths))).astype(numpy.int64)
+
+    return Corpus(tokens, offsets, list(vocab))
+
+def append_songs(corpus, song_notes):
+    """Returns a new Corpus with the songs added after the ones already in corpus. Note names the corpus hasn't seen
+    are added to the end of the vocabulary, so every existing token keeps its meaning (and a network trained on the
+    corpus keeps its output rows)"""
+    new_names = sorted(set(name for notes in song_notes for name in notes) - set(corpus.vocab))
+    added = encode_songs(song_notes, list(corpus.vocab) + new_names)
+
+    tokens = numpy.concatenate((numpy.asarray(corpus.tokens).astype(added.tokens.dtype, copy=False), added.tokens))
+    offsets = numpy.concatenate((corpus.offsets, added.offsets[1:] + corpus.offsets[-1]))
+
+    return Corpus(tokens, offsets, added.vocab)
+
+def replace_file(path, write):
+    """Writes a file next to path first and then swaps it in, so readers never see half of it"""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as file:
+        write(file)
+    os.replace(temp_path, path)
+
+def save_corpus(corpus, corpus_folder):
+    """Writes the corpus files into corpus_folder"""
+    if not os.path.exists(corpus_folder):
+        os.makedirs(corpus_folder)
+    replace_file(os.path.join(corpus_folder, TOKENS_FILE), lambda file: numpy.save(file, numpy.asarray(corpus.tokens)))
+    replace_file(os.path.join(corpus_folder, OFFSETS_FILE), lambda file: numpy.save(file, numpy.asarray(corpus.offsets)))
+    replace_file(os.path.join(corpus_folder, VOCAB_FILE), lambda file: file.write(json.dumps(corpus.vocab).encode('utf-8')))
+
+def corpus_exists(corpus_folder):
+    return all(os.path.exists(os.path.join(corpus_folder, name)) for name in (VOCAB_FILE, TOKENS_FILE, OFFSETS_FILE))
+
+def load_corpus(corpus_folder, mmap=True):
+    """Opens a corpus written by save_corpus. With mmap the tokens stay on disk and are read as they are used"""
+    if not corpus_exists(corpus_folder):
+        raise FileNotFoundError(f"No corpus found in '{corpus_folder}'.")
+    with open(os.path.join(corpus_folder, VOCAB_FILE), 'r', encoding='utf-8') as vocab_file:
+        vocab = json.load(vocab_file)
+    tokens = numpy.load(os.path.join(corpus_folder, TOKENS_FILE), mmap_mode='r' if mmap else None)
+    offsets = numpy.load(os.path.join(corpus_folder, OFFSETS_FILE))
+    return Corpus(tokens, offsets, vocab)
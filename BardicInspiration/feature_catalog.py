@@ -0,0 +1,132 @@
+"""Keeps music_features.csv in step with the MIDI files it was built from, so extracting a folder again only reads
+the files that are new or changed. Next to the CSV, <csv>.manifest.json remembers every file that was extracted:
+its path, size, modification time, content hash, label, the song_name of its row and the FEATURES_VERSION it was
+extracted with. A file whose size and modification time still match is skipped without being opened, and one that
+was only touched (same contents) is skipped after hashing it. A changed file's row is replaced where it is instead
+of a second row being added.
+Rows are keyed by song_name, the same as music_classification.process_csv, and when the CSV has several rows for a
+song the last one wins, again like process_csv. A catalog with duplicate rows from before the manifest existed can
+be cleaned up with
+    python feature_catalog.py compact music_features.csv"""
+
+import argparse
+import csv
+import io
+import json
+import os
+
+try:
+    from BardicInspiration.corpus import replace_file
+    from BardicInspiration.note_cache import file_hash
+    from BardicInspiration.catalog_snapshot import refresh_snapshot
+except ImportError:
+    from corpus import replace_file
+    from note_cache import file_hash
+    from catalog_snapshot import refresh_snapshot
+
+FIELDNAMES = ['song_name', 'tempo', 'time_signature', 'instruments', 'key_signature', 'label', 'pitch_classes']
+MANIFEST_SUFFIX = ".manifest.json"
+FEATURES_VERSION = 3  # Bump this whenever extraction adds or changes a feature, so every file is extracted again
+
+def read_rows(csv_file):
+    """Every row of a features CSV in file order, duplicates included. A missing file has no rows"""
+    if not os.path.exists(csv_file):
+        return []
+    with open(csv_file, 'r', newline='', encoding='utf-8') as file:
+        return list(csv.DictReader(file))
+
+def write_rows(csv_file, rows, fieldnames=FIELDNAMES):
+    """Writes the rows to csv_file, swapping the new file in once it is complete"""
+    text = io.StringIO(newline='')
+    writer = csv.DictWriter(text, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(rows)
+    replace_file(csv_file, lambda file: file.write(text.getvalue().encode('utf-8')))
+
+def catalog_row(features):
+    """The CSV row of extracted features, with the instrument names joined by ';' the way process_csv reads them"""
+    row = dict(features)
+    if isinstance(row.get('instruments'), list):
+        row['instruments'] = ';'.join(row['instruments'])
+    return row
+
+class FeatureCatalog:
+    """A features CSV and its manifest, loaded into memory. Call save() to write both back"""
+    def __init__(self, csv_file):
+        self.csv_file = csv_file
+        rows = read_rows(csv_file)
+        self.duplicates = len(rows)
+        self.rows = {}
+        for row in rows:
+            self.rows[row['song_name']] = row  # A repeated song keeps its first place but takes the last row
+        self.duplicates -= len(self.rows)
+        self.manifest = self.read_manifest()
+        self.rows_changed = self.manifest_changed = False
+
+    @property
+    def manifest_file(self):
+        return self.csv_file + MANIFEST_SUFFIX
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def check(self, midi_file, label):
+        """Returns None if the catalog already has midi_file's row under label, otherwise the file's state (size,
+        modification time and hash) to pass to upsert once its features are extracted"""
+        path = os.path.abspath(midi_file)
+        stat = os.stat(midi_file)
+        entry = self.manifest.get(path)
+        known = (entry is not None and entry['label'] == label and entry['song_name'] in self.rows
+                 and entry.get('version') == FEATURES_VERSION)
+        if known and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return None
+        state = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': file_hash(midi_file)}
+        if known and entry['hash'] == state['hash']:
+            entry.update(state)  # Touched but not changed
+            self.manifest_changed = True
+            return None
+        return state
+
+    def upsert(self, midi_file, label, features, state):
+        """Adds the row for midi_file's features, or replaces the song's row if the catalog already has one"""
+        self.rows[features['song_name']] = catalog_row(features)
+        self.manifest[os.path.abspath(midi_file)] = dict(state, label=label, song_name=features['song_name'],
+                                                         version=FEATURES_VERSION)
+        self.rows_changed = self.manifest_changed = True
+
+    def save(self):
+        """Writes the CSV and then the manifest, if they changed. If only the CSV gets written, the next run extracts
+        the files again and replaces their rows, so nothing is duplicated. A new CSV also gets its snapshot made again
+        in the background (see catalog_snapshot.py), so the next search doesn't have to parse it"""
+        if self.rows_changed or self.duplicates or not os.path.exists(self.csv_file):
+            write_rows(self.csv_file, self.rows.values())
+            refresh_snapshot(self.csv_file)
+        if self.manifest_changed:
+            replace_file(self.manifest_file,
+                         lambda file: file.write(json.dumps(self.manifest, indent=1).encode('utf-8')))
+        self.duplicates = 0
+        self.rows_changed = self.manifest_changed = False
+
+def compact(csv_file):
+    """Rewrites csv_file with one row per song (the last one) and returns how many duplicate rows were removed"""
+    if not os.path.exists(csv_file):
+        raise FileNotFoundError(f"Catalog '{csv_file}' does not exist.")
+    catalog = FeatureCatalog(csv_file)
+    removed = catalog.duplicates
+    catalog.save()
+    return removed
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the music features catalog")
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("csv_file", nargs="?", default="music_features.csv", help="features CSV")
+    args = parser.parse_args()
+
+    print(f"Removed {compact(args.csv_file)} duplicate rows from {args.csv_file}")
+
+if __name__ == "__main__":
+    main()
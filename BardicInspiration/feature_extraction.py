@@ -1,17 +1,33 @@
 import tkinter as tk
 from tkinter import filedialog
+import argparse
 import os
+import sys
+import time
 import mido
-import csv
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from BardicInspiration.midi_scanner import scan_music_data
+    from BardicInspiration.feature_catalog import FeatureCatalog
+    from BardicInspiration.instrument_int_to_string import PROGRAM_FAMILIES
+except ImportError:
+    from midi_scanner import scan_music_data
+    from feature_catalog import FeatureCatalog
+    from instrument_int_to_string import PROGRAM_FAMILIES
+
+MIDI_EXTENSIONS = ('.mid', '.midi')
 
 def extract_music_data(midi_file, label):
-    """This code will take out the important information we need, such as tempo, instruments, time signature, and key signature"""
+    """This code will take out the important information we need, such as tempo, instruments, time signature, and key signature.
+    Instruments are named as they are read, with the table in instrument_int_to_string"""
     features = {}
     song_name = os.path.splitext(os.path.basename(midi_file))[0]
     features['song_name'] = song_name
     midi = mido.MidiFile(midi_file)
     tempo_changes = 0
     total_time = 0
+    pitch_classes = [0] * 12  # How many notes of each pitch class (C, C#, D, ...) the song plays, drums left out
     for track in midi.tracks:
         for message in track:
             if message.type == 'set_tempo':
@@ -21,31 +37,86 @@ def extract_music_data(midi_file, label):
             elif message.type == 'program_change':
                 if 'instruments' not in features:
                     features['instruments'] = []
-                features['instruments'].append(message.program)
+                features['instruments'].append(PROGRAM_FAMILIES[message.program])
             elif message.type == 'key_signature':
                 features['key_signature'] = message.key
+            elif message.type == 'note_on' and message.velocity > 0 and message.channel != 9:
+                pitch_classes[message.note % 12] += 1
             total_time += message.time
     features['label'] = label
+    features['pitch_classes'] = pitch_classes
     return features
 
 def process_folder(folder_path, label, output_csv):
+    """Adds the MIDI files in folder_path to the output_csv catalog, reading them with mido. Files that are already
+    in the catalog unchanged are skipped and changed ones have their row replaced (see feature_catalog.py)"""
+    report = process_folder_batch(folder_path, label, output_csv, workers=1, verbose=False, fast=False)
+    for midi_file, _, error in report:
+        if error:
+            print(f"An error occurred while processing {os.path.basename(midi_file)}. Please check your file.")
+
+def extract_file(task):
+    """Runs one (extract, midi_file, label) task, where extract is extract_music_data or scan_music_data, and returns
+    (features, seconds, error). A file that can't be read gives features None and the error message instead of
+    stopping the batch"""
+    extract, midi_file, label = task
+    start = time.perf_counter()
+    try:
+        features, error = extract(midi_file, label), None
+    except Exception as e:
+        features, error = None, f"{type(e).__name__}: {e}"
+    return features, time.perf_counter() - start, error
+
+def extract_files(midi_files, label, workers=None, chunksize=8, fast=True):
+    """Extracts the features of every file with `workers` processes (None uses every CPU, 1 runs them here) and yields
+    (midi_file, features, seconds, error) in the same order as midi_files, as soon as each result is ready.
+    fast reads the files with midi_scanner instead of mido"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    extract = scan_music_data if fast else extract_music_data
+    tasks = [(extract, midi_file, label) for midi_file in midi_files]
+    if workers <= 1 or len(tasks) <= 1:
+        results = map(extract_file, tasks)
+        yield from ((midi_file,) + result for midi_file, result in zip(midi_files, results))
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        for midi_file, result in zip(midi_files, executor.map(extract_file, tasks, chunksize=chunksize)):
+            yield (midi_file,) + result
+
+def process_folder_batch(folder_path, label, output_csv, workers=None, verbose=True, fast=True):
+    """Batch version of process_folder for bulk ingestion: the MIDI files in folder_path that are new or changed since
+    they were last added to output_csv are read by a pool of processes, and their rows added or replaced by this one.
+    Files that fail are reported and skipped. Files are read with midi_scanner unless fast is False, then mido is used.
+    Returns one (midi_file, seconds, error) per file in file name order, with error None for the ones in the catalog
+    and seconds None for the ones that were skipped because they hadn't changed"""
     if not os.path.exists(folder_path):
         raise FileNotFoundError(f"Folder '{folder_path}' does not exist.")
-    is_new_file = not os.path.exists(output_csv)
+    midi_files = sorted(os.path.join(folder_path, filename) for filename in os.listdir(folder_path)
+                        if filename.lower().endswith(MIDI_EXTENSIONS))
+
+    start = time.perf_counter()
+    catalog = FeatureCatalog(output_csv)
+    states = dict((midi_file, catalog.check(midi_file, label)) for midi_file in midi_files)
+    changed_files = [midi_file for midi_file in midi_files if states[midi_file] is not None]
+
+    results = {}
     try:
-        with open(output_csv, 'a', newline='') as csvfile:
-            fieldnames = ['song_name', 'tempo', 'time_signature', 'instruments', 'key_signature', 'label']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            if is_new_file:
-                writer.writeheader()
-            for filename in os.listdir(folder_path):
-
-                features = extract_music_data(os.path.join(folder_path, filename), label)
-                writer.writerow(features)
-    except FileNotFoundError as e:
-        raise FileNotFoundError(f"Error processing folder: {e}")
-    except EOFError:
-        print("An error occurred while processing the file. Please check your file.")
+        for midi_file, features, seconds, error in extract_files(changed_files, label, workers, fast=fast):
+            if error is None:
+                catalog.upsert(midi_file, label, features, states[midi_file])
+            if verbose:
+                print(f"{seconds * 1000:9.1f} ms  {os.path.basename(midi_file)}" + (f"  FAILED: {error}" if error else ""))
+            results[midi_file] = (seconds, error)
+    finally:
+        catalog.save()  # Keep what was extracted even if the run is interrupted
+    report = [(midi_file,) + results.get(midi_file, (None, None)) for midi_file in midi_files]
+
+    if verbose:
+        failed = sum(1 for _, _, error in report if error)
+        print(f"{len(results) - failed} of {len(report)} files extracted into {output_csv} "
+              f"in {time.perf_counter() - start:.2f} s ({len(report) - len(results)} unchanged, {failed} failed)")
+    return report
 
 def browse_folder(folder_path_entry):
     """Allows user to select the folder with the MIDI files."""
@@ -96,5 +167,20 @@ def main():
 
     root.mainloop()
 
+def batch_main(argv):
+    parser = argparse.ArgumentParser(prog="feature_extraction.py batch",
+                                     description="Extract the features of every MIDI file in a folder without the window")
+    parser.add_argument("folder", help="folder with the MIDI files")
+    parser.add_argument("--label", required=True, help="label to give every song (Tavern, Boss, Sad, ...)")
+    parser.add_argument("--output", default="music_features.csv", help="CSV file to add the rows to")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: one per CPU)")
+    parser.add_argument("--mido", action="store_true", help="read the files with mido instead of the fast scanner")
+    args = parser.parse_args(argv)
+
+    report = process_folder_batch(args.folder, args.label, args.output, args.workers, fast=not args.mido)
+    return 1 if any(error for _, _, error in report) else 0
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        raise SystemExit(batch_main(sys.argv[2:]))
     main()
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""Talks to generation_server.py so music can be created without loading TensorFlow in this process. Usage:
+    python generation_client.py --count 3"""
+
+import argparse
+import io
+import json
+import os
+import urllib.error
+import urllib.request
+import zipfile
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+def server_url(host, port, path):
+    """Builds the address of one of the server's pages"""
+    return f"http://{host}:{port}{path}"
+
+def server_is_running(host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=0.5):
+    """Checks if a generation server is answering on host and port"""
+    try:
+        with urllib.request.urlopen(server_url(host, port, "/health"), timeout=timeout) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+def request_music(count=1, length=500, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=600):
+    """Asks the server for new music. One piece comes back as MIDI bytes, several pieces as a zip of MIDI files"""
+    data = json.dumps({"count": count, "length": length}).encode("utf-8")
+    request = urllib.request.Request(server_url(host, port, "/generate"), data=data,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+def save_music(music_bytes, count, output_folder="output"):
+    """Saves what request_music returned the same way music_creation.py names its files"""
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    if count == 1:
+        output_file_path = os.path.join(output_folder, "output.mid")
+        with open(output_file_path, "wb") as output_file:
+            output_file.write(music_bytes)
+        return [output_file_path]
+
+    output_file_paths = []
+    with zipfile.ZipFile(io.BytesIO(music_bytes)) as archive:
+        for name in archive.namelist():
+            output_file_path = os.path.join(output_folder, os.path.basename(name))
+            with open(output_file_path, "wb") as output_file:
+                output_file.write(archive.read(name))
+            output_file_paths.append(output_file_path)
+    return output_file_paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Ask the generation server for new music")
+    parser.add_argument("--count", type=int, default=1, help="number of pieces to generate")
+    parser.add_argument("--length", type=int, default=500, help="notes per piece")
+    parser.add_argument("--output", default="output", help="folder to save the MIDI files in")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    if not server_is_running(args.host, args.port):
+        print(f"No generation server running on {args.host}:{args.port}. Start it with: python generation_server.py")
+        return 1
+
+    music_bytes = request_music(args.count, args.length, args.host, args.port)
+    for output_file_path in save_music(music_bytes, args.count, args.output):
+        print("MIDI file generated:", output_file_path)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,167 @@
+"""Batches the next-note steps of many generation requests into one network call. Each request keeps its own
+LSTM states, so requests that started at different times can still share a batch. The scheduler waits a few
+milliseconds for other requests to catch up, stacks their steps, samples every next note at once and hands each
+request its note and new states back."""
+
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy
+
+try:
+    from BardicInspiration.music_creation import create_step_network, sample_notes
+except ImportError:
+    from music_creation import create_step_network, sample_notes
+
+class StepRequest:
+    """One step of one piece waiting to go through the network"""
+    def __init__(self, notes, states):
+        self.notes = notes
+        self.states = states
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+class GenerationScheduler:
+    """Collects step requests for up to max_wait_ms (or until max_batch_size are waiting) and runs them together"""
+    def __init__(self, lstm_model, note_vocab, max_batch_size=32, max_wait_ms=5.0, metrics_history=1000,
+                 input_scale=None):
+        self.step_model = create_step_network(lstm_model, note_vocab)
+        self.note_vocab = note_vocab
+        self.input_scale = input_scale or note_vocab  # What training divided the note numbers by
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.pending = queue.Queue()
+        self.thread = None
+
+        self.metrics_lock = threading.Lock()
+        self.request_metrics = collections.deque(maxlen=metrics_history)
+        self.batch_sizes = collections.deque(maxlen=metrics_history)
+
+    def start(self):
+        """Starts the background thread that runs the batches"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """Stops the background thread once the steps already waiting have been run"""
+        if self.thread is not None:
+            self.pending.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, notes, states=None):
+        """Queues one step. notes are normalized inputs shaped (timesteps, 1), states the six LSTM state vectors from
+        the last step (None to start fresh). Returns a Future for (sampled note index, new states)"""
+        if states is None:
+            states = [numpy.zeros(512, dtype='float32') for _ in range(6)]
+        request = StepRequest(numpy.asarray(notes, dtype='float32'), states)
+        self.pending.put(request)
+        return request.future
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            first = self.pending.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self.pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+            self.run_batch(batch)
+
+    def run_batch(self, batch):
+        """Runs the waiting steps through the network. Seed windows and single notes have different lengths, so
+        each length gets its own call"""
+        with self.metrics_lock:
+            self.batch_sizes.append(len(batch))
+
+        by_length = collections.defaultdict(list)
+        for request in batch:
+            by_length[len(request.notes)].append(request)
+
+        for requests in by_length.values():
+            try:
+                notes = numpy.stack([request.notes for request in requests])
+                states = [numpy.stack([request.states[i] for request in requests]) for i in range(6)]
+                outputs = self.step_model([notes] + states, training=False)
+                predictions = outputs[0].numpy()
+                new_states = [output.numpy() for output in outputs[1:]]
+                indexes = sample_notes(predictions)
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+
+            for row, request in enumerate(requests):
+                request.future.set_result((int(indexes[row]), [state[row] for state in new_states]))
+
+    def generate(self, net_input, pitch_names, length=500):
+        """Creates one piece the same way create_music does, with every step going through the shared batches"""
+        started = time.perf_counter()
+        step_latencies = []
+
+        pattern = net_input[numpy.random.randint(0, len(net_input) - 1)]
+        notes = numpy.reshape(pattern, (len(pattern), 1)) / float(self.input_scale)
+        states = None
+        pred_output = []
+
+        for _ in range(length):
+            step_started = time.perf_counter()
+            index, states = self.submit(notes, states).result()
+            step_latencies.append(time.perf_counter() - step_started)
+
+            pred_output.append(str(pitch_names[index]))
+            notes = numpy.full((1, 1), index / float(self.input_scale), dtype='float32')
+
+        with self.metrics_lock:
+            self.request_metrics.append({
+                'latency': time.perf_counter() - started,
+                'steps': length,
+                'mean_step_latency': float(numpy.mean(step_latencies)) if step_latencies else 0.0,
+            })
+
+        return pred_output
+
+    def metrics(self):
+        """Latency of recent requests (in milliseconds) and how full the batches were"""
+        with self.metrics_lock:
+            latencies = numpy.array([metric['latency'] for metric in self.request_metrics]) * 1000
+            step_latencies = numpy.array([metric['mean_step_latency'] for metric in self.request_metrics]) * 1000
+            batch_sizes = numpy.array(self.batch_sizes)
+
+        if len(latencies) == 0:
+            return {'requests': 0, 'batches': len(batch_sizes)}
+
+        return {
+            'requests': len(latencies),
+            'latency_ms': {
+                'mean': float(latencies.mean()),
+                'p50': float(numpy.percentile(latencies, 50)),
+                'p95': float(numpy.percentile(latencies, 95)),
+                'max': float(latencies.max()),
+            },
+            'step_latency_ms': {
+                'mean': float(step_latencies.mean()),
+                'p95': float(numpy.percentile(step_latencies, 95)),
+            },
+            'batches': len(batch_sizes),
+            'mean_batch_size': float(batch_sizes.mean()) if len(batch_sizes) else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+        }
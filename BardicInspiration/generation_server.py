@@ -0,0 +1,163 @@
+"""Keeps the trained network, the vocabulary and the seed windows loaded in one long running process, so
+"Gimme My Music!" doesn't have to start TensorFlow, rebuild the network and reload the notes on every click.
+Start it from the BardicInspiration folder (it listens on localhost only):
+    python generation_server.py
+and ask it for music with generation_client.py or the Music Generator window."""
+
+import argparse
+import io
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from BardicInspiration.music_creation import (load_generation_model, create_stateful_network, create_music_batch,
+                                                  write_midi, weights_file_exists)
+    from BardicInspiration.model_registry import LABELS
+    from BardicInspiration.generation_client import DEFAULT_HOST, DEFAULT_PORT
+    from BardicInspiration.generation_scheduler import GenerationScheduler
+except ImportError:
+    from music_creation import load_generation_model, create_stateful_network, create_music_batch, write_midi, weights_file_exists
+    from model_registry import LABELS
+    from generation_client import DEFAULT_HOST, DEFAULT_PORT
+    from generation_scheduler import GenerationScheduler
+
+MAX_COUNT = 16
+MAX_LENGTH = 5000
+
+class GenerationService:
+    """Holds everything generation needs between requests"""
+    def __init__(self, lstm_model, net_input, pitch_names, note_vocab, input_scale=None, scheduler=None):
+        self.lstm_model = lstm_model
+        self.net_input = net_input
+        self.pitch_names = pitch_names
+        self.note_vocab = note_vocab
+        self.input_scale = input_scale or note_vocab  # What training divided the note numbers by
+        self.stateful_models = {}  # A stateful copy of the network for the last batch size asked for
+        self.lock = threading.Lock()
+        self.scheduler = scheduler  # Shares network calls between requests for single pieces when set
+
+    @classmethod
+    def load(cls, label=None):
+        """Loads the notes and trained weights the same way music_creation.py does, for label's model if it is set"""
+        return cls(*load_generation_model(label))
+
+    def generate(self, count=1, length=500):
+        """Generates `count` pieces and returns them as lists of note names"""
+        if self.scheduler is not None and count == 1:
+            return [self.scheduler.generate(self.net_input, self.pitch_names, length)]
+
+        # The stateful networks keep their state between calls, so only one request can use them at a time
+        with self.lock:
+            stateful_model = self.stateful_models.get(count)
+            if stateful_model is None:
+                # Only the latest one is kept, so asking for every count in turn doesn't keep MAX_COUNT networks
+                self.stateful_models.clear()
+                stateful_model = create_stateful_network(self.lstm_model, self.note_vocab, batch_size=count)
+                self.stateful_models[count] = stateful_model
+            return create_music_batch(self.lstm_model, self.net_input, self.pitch_names, self.note_vocab, count,
+                                      length, stateful_model=stateful_model, input_scale=self.input_scale)
+
+    def generate_midi(self, count=1, length=500):
+        """Generates music and returns (bytes, content type). One piece is a MIDI file, several are a zip of them"""
+        midi_files = []
+        with tempfile.TemporaryDirectory() as temp_folder:
+            for number, pred_output in enumerate(self.generate(count, length), start=1):
+                output_file_path = write_midi(pred_output, os.path.join(temp_folder, f"output_{number}.mid"))
+                with open(output_file_path, "rb") as output_file:
+                    midi_files.append(output_file.read())
+
+        if count == 1:
+            return midi_files[0], "audio/midi"
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for number, midi_file in enumerate(midi_files, start=1):
+                archive.writestr(f"output_{number}.mid", midi_file)
+        return buffer.getvalue(), "application/zip"
+
+class GenerationRequestHandler(BaseHTTPRequestHandler):
+    """GET /health tells clients the server is up, GET /metrics shows batching latency, and POST /generate with
+    {"count": n, "length": notes} makes music"""
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_body(200, json.dumps({"status": "ok"}).encode("utf-8"), "application/json")
+        elif self.path == "/metrics":
+            scheduler = self.server.service.scheduler
+            metrics = scheduler.metrics() if scheduler is not None else {}
+            self.send_body(200, json.dumps(metrics).encode("utf-8"), "application/json")
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self.send_error(404)
+            return
+        try:
+            content_length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(content_length) or b"{}")
+            count = int(request.get("count", 1))
+            length = int(request.get("length", 500))
+        except (ValueError, TypeError, AttributeError):
+            self.send_error(400, "Request body must be JSON like {\"count\": 1, \"length\": 500}")
+            return
+        if not 1 <= count <= MAX_COUNT or not 1 <= length <= MAX_LENGTH:
+            self.send_error(400, f"count must be 1-{MAX_COUNT} and length 1-{MAX_LENGTH}")
+            return
+
+        try:
+            body, content_type = self.server.service.generate_midi(count, length)
+        except Exception as e:
+            self.send_error(500, f"Generating music failed: {e}")
+            return
+        self.send_body(200, body, content_type)
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Creates the HTTP server; call serve_forever() on it to start answering requests"""
+    server = ThreadingHTTPServer((host, port), GenerationRequestHandler)
+    server.service = service
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the music generation network loaded and serve requests")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=32, help="most steps run in one network call")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="how long to wait for other requests to join a batch")
+    parser.add_argument("--no-batching", action="store_true", help="don't share network calls between requests")
+    parser.add_argument("--label", choices=LABELS, default=None, help="serve this label's model from the model registry")
+    args = parser.parse_args()
+
+    if not weights_file_exists(args.label):
+        print("No training weights file found. Train the model first.")
+        return 1
+
+    service = GenerationService.load(args.label)
+    if not args.no_batching:
+        service.scheduler = GenerationScheduler(service.lstm_model, service.note_vocab, args.max_batch_size,
+                                                args.max_wait_ms, input_scale=service.input_scale).start()
+
+    server = create_server(service, args.host, args.port)
+    print(f"Generation server listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if service.scheduler is not None:
+            service.scheduler.stop()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
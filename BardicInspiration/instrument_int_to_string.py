@@ -1,71 +1,105 @@
+"""For our music_classification code, we need instruments to be the name of the instrument, not the number. Since we
+are only using a selection of instruments, they are grouped by type of instrument according to the MIDI coding for
+instruments: programs come in groups of 8 (0-7 pianos, 8-15 bells, ...), the first ten groups each get a name and
+everything from 80 up is "Other". The names are worked out once into two 128 entry tables:
+    PROGRAM_FAMILIES       tuple of names, for looking up one program at a time
+    PROGRAM_FAMILY_CODES   numpy array of indexes into FAMILIES, for looking up whole columns at once
+feature_extraction writes the names straight into music_features.csv. A catalog made before that, with program
+numbers like "[0, 41]" in its instruments column, can be converted with
+    python instrument_int_to_string.py music_features.csv output.csv"""
+
+import argparse
 import csv
-import json  # Importing json module to safely parse string representations of lists
+import itertools
+import json
+import re
 
-# Define a function to convert integers or ranges to strings
-def int_range_to_string(num):
-    """For our music_classification code, we need instruments to be lists as the name of the instrument, not the number.
-    Since we are only using a selection of instruments, I grouped them by type of instrument according to the 
-    MIDI coding for instruments."""
-    int_range_to_string_map = {
-        range(0, 7): "Piano",
-        range(8, 15): "Bells",
-        range(16, 23): "Organ",
-        range(24, 31): "Guitar",
-        range(32, 39): "Bass",
-        range(40, 47): "Violin",
-        range(48, 55): "Voice",
-        range(56, 63): "Trumpet",
-        range(64, 71): "Reeds",
-        range(72, 79): "Flute",
-        range(80, 127): "Other"
-        # Add more ranges and their corresponding strings as needed
-    }
+import numpy
+
+FAMILIES = ("Piano", "Bells", "Organ", "Guitar", "Bass", "Violin", "Voice", "Trumpet", "Reeds", "Flute", "Other")
+UNKNOWN = "Unknown"  # Not a program number (outside 0-127)
+PROGRAM_FAMILY_CODES = numpy.minimum(numpy.arange(128) // 8, len(FAMILIES) - 1).astype(numpy.uint8)
+PROGRAM_FAMILIES = tuple(FAMILIES[code] for code in PROGRAM_FAMILY_CODES)
+CODE_NAMES = numpy.array(FAMILIES + (UNKNOWN,), dtype=object)  # CODE_NAMES[code] for the codes of family_codes
+PROGRAM_NUMBER = re.compile(r'-?\d+')
+CELL_TOKEN = re.compile(r'-?\d+|\]')
+NUMBER_LIST = re.compile(r'\[\s*(-?\d+\s*(,\s*-?\d+\s*)*)?\]')
 
-    # Parse string representation of lists
+def program_family(program):
+    """Name of one program number"""
+    return PROGRAM_FAMILIES[program] if 0 <= program < len(PROGRAM_FAMILIES) else UNKNOWN
+
+def int_range_to_string(num):
+    """Name of a program number, or the names of a list of them. The list can also be its text, like "[0, 41]"."""
     if isinstance(num, str):
         try:
             num = json.loads(num)
         except json.JSONDecodeError:
-            return "Unknown"
-
-    # Handle list of integers
+            return UNKNOWN
     if isinstance(num, list):
-        result = []
-        for n in num:
-            for int_range, string_value in int_range_to_string_map.items():
-                if n in int_range:
-                    result.append(string_value)
-                    break
-            else:
-                result.append("Unknown")
-        return result
-    # Handle single integer
-    else:
-        for int_range, string_value in int_range_to_string_map.items():
-            if int(num) in int_range:
-                return string_value
-        return "Unknown"
+        return [program_family(int(n)) for n in num]
+    return program_family(int(num))
+
+def family_codes(programs):
+    """The FAMILIES index of every program in an array, and len(FAMILIES) for the ones outside 0-127"""
+    programs = numpy.asarray(programs, dtype=numpy.int64)
+    inside = (programs >= 0) & (programs < len(PROGRAM_FAMILY_CODES))
+    return numpy.where(inside, PROGRAM_FAMILY_CODES[numpy.where(inside, programs, 0)], len(FAMILIES))
+
+def split_names(codes, lengths):
+    """Family names of an array of codes, split into lists of lengths"""
+    names = CODE_NAMES[codes].tolist()
+    return [names[end - length:end] for length, end in zip(lengths, itertools.accumulate(lengths))]
+
+def map_programs(column):
+    """Names for a whole column of program lists, one list per song. Every song's programs are looked up together
+    and then split back into one list of names per song"""
+    lengths = [len(programs) for programs in column]
+    programs = numpy.fromiter(itertools.chain.from_iterable(column), dtype=numpy.int64, count=sum(lengths))
+    return split_names(family_codes(programs), lengths)
 
-# Read the CSV file
-input_file = 'music_features.csv'
-output_file = 'output.csv'
+def map_instrument_column(cells):
+    """Converts a column of CSV instruments cells. Cells that are only a list of program numbers ("[0, 41]") become names
+    joined with ';' ("Piano;Violin"), the way music_features.csv keeps them, and the others are left alone"""
+    numbered = [number for number, cell in enumerate(cells) if NUMBER_LIST.fullmatch(cell)]
+    # One pass over all of them: the program numbers in order, with a ']' where each cell ends
+    tokens = numpy.array(CELL_TOKEN.findall(''.join(cells[number] for number in numbered)), dtype=str)
+    ends = tokens == ']'
+    programs = tokens[~ends].astype(numpy.int64)
+    cell_ends = numpy.flatnonzero(ends) - numpy.arange(len(numbered))  # Programs before each cell's ']'
+    lengths = numpy.diff(cell_ends, prepend=0).tolist()
+    cells = list(cells)
+    for number, names in zip(numbered, split_names(family_codes(programs), lengths)):
+        cells[number] = ';'.join(names)
+    return cells
 
-data = []
-with open(input_file, 'r', newline='') as csvfile:
-    reader = csv.reader(csvfile)
-    header = next(reader)  # Read the header row
-    data.append(header)  # Append the header row to the data list
-    for row in reader:
-        data.append(row)
+def convert_csv(input_file, output_file, chunk_rows=10000):
+    """Writes input_file to output_file with the instruments column converted, chunk_rows rows at a time so the whole
+    file is never in memory. Returns the number of rows"""
+    count = 0
+    with open(input_file, 'r', newline='') as source, open(output_file, 'w', newline='') as destination:
+        reader = csv.reader(source)
+        writer = csv.writer(destination)
+        header = next(reader)
+        writer.writerow(header)
+        column = header.index('instruments')
+        while True:
+            rows = [row for row in itertools.islice(reader, chunk_rows) if row]
+            if not rows:
+                return count
+            for row, cell in zip(rows, map_instrument_column([row[column] for row in rows])):
+                row[column] = cell
+            writer.writerows(rows)
+            count += len(rows)
 
-# Find the index of the column with header 'instruments'
-column_index_to_process = header.index('instruments')
+def main():
+    parser = argparse.ArgumentParser(description="Replace the program numbers of a features CSV with instrument names")
+    parser.add_argument("input_file", nargs="?", default="music_features.csv", help="features CSV to read")
+    parser.add_argument("output_file", nargs="?", default="output.csv", help="CSV to write")
+    args = parser.parse_args()
 
-# Replace integers or ranges with strings in the specified column
-for row in data[1:]:  # Start from index 1 to skip the header row
-    row[column_index_to_process] = int_range_to_string(row[column_index_to_process])
+    rows = convert_csv(args.input_file, args.output_file)
+    print(f"Wrote {rows} rows to {args.output_file}")
 
-# Write the updated data to a new CSV file
-with open(output_file, 'w', newline='') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerows(data)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
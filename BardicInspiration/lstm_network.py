@@ -1,18 +1,24 @@
 """We are creating and running our LSTM model to train our .midi files so we may produce music later. Since we are using
-5 different folders, we will have to run this code for each catagory of music we have"""
+5 different catagories of music, each one gets its own model in the model registry (see model_registry.py), for example
+    python lstm_network.py --label Tavern Boss
+trains the Tavern and Boss models at the same time"""
 """This code was based off code from two people, Sigurður Skúli and Jordan Bird. However, their music generation
 code is only for MIDI files with 1 instrument, and this is set to train on several instruments. Here are links
 to their codes:  https://github.com/jordan-bird/Keras-LSTM-Music-Generator: Jordan Bird; 
 https://github.com/Skuldur/Classical-Piano-Composer"""
 
+import argparse
 import glob
+import math
 import shutil
 import numpy
-import pickle
+from numpy.lib.stride_tricks import sliding_window_view
 import tkinter as tk
 from tkinter import filedialog
 import csv
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from music21 import converter, note, chord
 from keras.models import Sequential, clone_model
 from keras.layers import Dense
@@ -20,35 +26,311 @@ from keras.layers import Dropout
 from keras.layers import LSTM
 from keras.layers import Activation
 from keras.layers import BatchNormalization
-from tensorflow.python.keras.utils import np_utils
-from keras.callbacks import ModelCheckpoint
+from keras.callbacks import Callback
+import tensorflow as tf
 from tkinter import messagebox
 
-def train_neural_network(folder_path):
-    """Method we will use to train the LSTM model with our music files"""
+try:
+    from BardicInspiration.generation_client import server_is_running, request_music, save_music
+    from BardicInspiration.note_cache import NoteCache, file_hash
+    from BardicInspiration.corpus import Corpus, encode_songs, append_songs, save_corpus, load_corpus, replace_file
+    from BardicInspiration.training_checkpoint import (DEFAULT_CHECKPOINT_FOLDER, TrainingCheckpoint, load_checkpoint,
+                                                       restore_checkpoint, save_best_weights, load_best_weights)
+    from BardicInspiration.model_registry import (ModelRegistry, LABELS, DEFAULT_REGISTRY_FOLDER, label_songs,
+                                                  training_fingerprint, read_fingerprint, save_fingerprint,
+                                                  saved_weights_file)
+except ImportError:
+    from generation_client import server_is_running, request_music, save_music
+    from note_cache import NoteCache, file_hash
+    from corpus import Corpus, encode_songs, append_songs, save_corpus, load_corpus, replace_file
+    from training_checkpoint import (DEFAULT_CHECKPOINT_FOLDER, TrainingCheckpoint, load_checkpoint, restore_checkpoint,
+                                     save_best_weights, load_best_weights)
+    from model_registry import (ModelRegistry, LABELS, DEFAULT_REGISTRY_FOLDER, label_songs, training_fingerprint,
+                                read_fingerprint, save_fingerprint, saved_weights_file)
+
+def train_neural_network(folder_path, epochs=100, patience=None, jit_compile=False, resume=False, force=False):
+    """Method we will use to train the LSTM model with our music files. epochs, patience and jit_compile are
+    passed on to train and create_network. Training is checkpointed in data/checkpoints after every epoch, and
+    resume carries on from the last checkpoint there.
+    If best_weights_loss.weights.h5 was already trained on exactly these files with the same settings, nothing is
+    done unless force is set. Returns True if it trained and False if the model was already up to date"""
     output_folder = "data"  # Specify the set output folder for saving notes
+    weights_file = "best_weights_loss.weights.h5"
+
+    fingerprint = training_fingerprint(training_files(folder_path), epochs=epochs, patience=patience)
+    if not force and read_fingerprint(output_folder) == fingerprint and os.path.exists(saved_weights_file(weights_file)):
+        print("The model is already trained on these songs with these settings, skipping training")
+        return False
+    save_fingerprint(output_folder, None)  # The saved corpus and weights won't match until training finishes
+
     notes = get_notes(folder_path, output_folder)
     """Notes pulls in the list of notes we get from the get_notes method. get_notes is filled after we parse
     out each instrument for each piece of music that is being read in"""
-    
-    pitch_names = len(set(notes))
-
-    music_input, music_output = music_creation(notes, pitch_names)
-
-    lstm_model = create_network(music_input, pitch_names)
+    if not notes:
+        raise ValueError("Not enough notes to create music sequences")
 
-    train(lstm_model, music_input, music_output)
+    train_on_corpus(output_folder, epochs=epochs, patience=patience, jit_compile=jit_compile,
+                    checkpoint_folder=DEFAULT_CHECKPOINT_FOLDER, resume=resume, weights_file=weights_file)
+    save_fingerprint(output_folder, fingerprint)
 
     print("Training neural network...")
+    return True
+
+def train_on_corpus(corpus_folder, epochs=100, patience=None, jit_compile=False, checkpoint_folder=None, resume=False,
+                    weights_file="best_weights_loss.weights.h5"):
+    """Builds the network for the corpus get_notes saved in corpus_folder and trains it. Returns the corpus"""
+    # get_notes saved the notes as an integer corpus, so training can use the tokens directly
+    corpus = load_corpus(corpus_folder)
+    pitch_names = len(corpus.vocab)
+
+    music_input, music_output = create_training_windows(corpus.tokens)
+
+    lstm_model = create_network(music_input, pitch_names, jit_compile=jit_compile)
+
+    train(lstm_model, music_input, music_output, epochs=epochs, patience=patience,
+          checkpoint_folder=checkpoint_folder, resume=resume, weights_file=weights_file)
+
+    return corpus
+
+def train_label(label, midi_folder="MIDI Music", features_csv="music_features.csv",
+                registry_folder=DEFAULT_REGISTRY_FOLDER, epochs=100, patience=None, jit_compile=False, resume=False,
+                workers=None, force=False):
+    """Trains a model on every song music_features.csv files under label, as a new version in the model registry
+    (see model_registry.py). The version only becomes the label's current model once training finishes. With
+    resume, a version that was left unfinished carries on from its last checkpoint.
+    If a version was already trained on exactly these files with the same settings, it is made current and returned
+    without training, unless force is set"""
+    registry = ModelRegistry(registry_folder)
+
+    files = sorted(os.path.join(midi_folder, song + '.mid') for song in label_songs(features_csv, label))
+    files = [file for file in files if os.path.exists(file)]
+    fingerprint = training_fingerprint(files, epochs=epochs, patience=patience)
+    trained_version = None if force else registry.find(label, fingerprint)
+    if trained_version is not None:
+        print(f"{label} v{trained_version.version} is already trained on these songs with these settings")
+        registry.set_current(trained_version)
+        return trained_version
+
+    model_version = registry.unfinished_version(label) if resume else None
+    if model_version is None:
+        model_version = registry.new_version(label)
+    print(f"Training {label} v{model_version.version} on {len(files)} songs")
+
+    notes = get_notes(midi_folder, model_version.corpus_folder, workers, files=files,
+                      cache_folder=os.path.join("data", "note_cache"))
+    if not notes:
+        raise ValueError(f"Not enough notes to create music sequences for {label}")
+
+    corpus = train_on_corpus(model_version.corpus_folder, epochs=epochs, patience=patience, jit_compile=jit_compile,
+                             checkpoint_folder=model_version.checkpoint_folder, resume=resume,
+                             weights_file=model_version.weights_file)
+
+    registry.publish(model_version, {'songs': len(files), 'notes': len(corpus.tokens), 'vocab': len(corpus.vocab),
+                                     'input_scale': len(corpus.vocab), 'epochs': epochs, 'fingerprint': fingerprint,
+                                     'song_hashes': [file_hash(file) for file in files]})
+    return model_version
+
+def extend_weights(old_weights, new_weights):
+    """Copies a trained network's weights into a network with a bigger vocabulary. Arrays with the same shape are
+    copied as they are; the output layer's arrays are copied into their first columns, so only the rows for new
+    notes keep new_weights' fresh values"""
+    weights = []
+    for old_weight, new_weight in zip(old_weights, new_weights):
+        if old_weight.shape == new_weight.shape:
+            weights.append(old_weight)
+        else:
+            weight = new_weight.copy()
+            weight[..., :old_weight.shape[-1]] = old_weight
+            weights.append(weight)
+    return weights
+
+def replay_sample(corpus, note_count, random_generator):
+    """Tokens of randomly picked songs from corpus, about note_count of them (every song if the corpus is smaller),
+    kept in corpus order"""
+    picked = []
+    picked_notes = 0
+    for number in random_generator.permutation(len(corpus)):
+        if picked_notes >= note_count:
+            break
+        picked.append(number)
+        picked_notes += corpus.offsets[number + 1] - corpus.offsets[number]
+    return numpy.concatenate([corpus.song(number) for number in sorted(picked)] or [corpus.tokens[:0]])
+
+def fine_tune_label(label, new_files, registry_folder=DEFAULT_REGISTRY_FOLDER, epochs=5, replay_ratio=3,
+                    jit_compile=False, workers=None, seed=None):
+    """Updates a label's current model with new MIDI files instead of training it again from scratch. The new version
+    starts from the current weights; notes that weren't in the vocabulary before get new output rows while the learned
+    rows are kept. It trains for a few epochs on the new songs mixed with a random replay of about replay_ratio times
+    as many notes from the songs it already knew, so it doesn't forget them. The note numbers are still divided by
+    the base version's input scale, so the notes it knew reach the network with the same values as before.
+    New files with the same contents as a song the base version was trained on are left out, and if that leaves
+    nothing to add the base version is returned as it is. Versions trained before their info.json listed the songs'
+    content hashes ('song_hashes') can't be checked this way"""
+    registry = ModelRegistry(registry_folder)
+    base_version = registry.current(label)
+    if base_version is None:
+        raise FileNotFoundError(f"No trained model for '{label}' to fine tune. Train it first with --label {label}")
+    base_corpus = load_corpus(base_version.corpus_folder)
+    input_scale = base_version.input_scale() or len(base_corpus.vocab)
+
+    trained_hashes = base_version.info().get('song_hashes', [])
+    known_hashes = set(trained_hashes)
+    files, hashes = [], []
+    for file in sorted(new_files):
+        song_hash = file_hash(file)
+        if song_hash in known_hashes:
+            print(f"Skipping {file}, the same song is already in {label} v{base_version.version} or in an earlier file")
+        else:
+            known_hashes.add(song_hash)  # The same song twice among the new files is only added once
+            files.append(file)
+            hashes.append(song_hash)
+    if not files:
+        print(f"{label} v{base_version.version} is already trained on every one of these songs")
+        return base_version
+
+    file_notes = get_cached_notes(files, NoteCache(os.path.join("data", "note_cache")), workers)
+    new_songs = [notes for notes in file_notes if notes]
+    if not new_songs:
+        raise ValueError("None of the new MIDI files had any notes")
+    new_hashes = [song_hash for song_hash, notes in zip(hashes, file_notes) if notes]
+
+    corpus = append_songs(base_corpus, new_songs)
+    model_version = registry.new_version(label)
+    save_corpus(corpus, model_version.corpus_folder)
+    print(f"Fine tuning {label} v{base_version.version} into v{model_version.version} with {len(new_songs)} new songs, "
+          f"{len(corpus.vocab) - len(base_corpus.vocab)} new notes")
+
+    old_note_count = base_corpus.offsets[-1]
+    new_tokens = corpus.tokens[old_note_count:]
+    old_corpus = Corpus(corpus.tokens[:old_note_count], base_corpus.offsets, corpus.vocab)  # Same token type as new_tokens
+    replay_tokens = replay_sample(old_corpus, replay_ratio * len(new_tokens), numpy.random.default_rng(seed))
+    music_input, music_output = create_training_windows(numpy.concatenate((replay_tokens, new_tokens)))
+
+    base_model = create_network(music_input, len(base_corpus.vocab))
+    base_model.load_weights(saved_weights_file(base_version.weights_file))
+    lstm_model = create_network(music_input, len(corpus.vocab), jit_compile=jit_compile)
+    lstm_model.set_weights(extend_weights(base_model.get_weights(), lstm_model.get_weights()))
+    del base_model
+
+    train(lstm_model, music_input, music_output, epochs=epochs, checkpoint_folder=model_version.checkpoint_folder,
+          weights_file=model_version.weights_file, input_scale=input_scale)
+
+    registry.publish(model_version, {'songs': base_version.info().get('songs', len(base_corpus)) + len(new_songs),
+                                     'notes': len(corpus.tokens), 'vocab': len(corpus.vocab),
+                                     'input_scale': input_scale, 'epochs': epochs,
+                                     'fine_tuned_from': base_version.version, 'new_songs': len(new_songs),
+                                     'song_hashes': trained_hashes + new_hashes})
+    return model_version
+
+def limit_threads(threads):
+    """Runs at the start of each training process so several of them can share the CPU without each one
+    starting a thread per core"""
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def train_labels(labels, processes=None, threads_per_process=None, **training_options):
+    """Trains several labels at once, each in its own process limited to threads_per_process threads. By default
+    every label gets a process (up to one per CPU) and the CPUs are split between them. training_options are passed
+    on to train_label. Returns {label: ModelVersion}, with None for labels that failed"""
+    cpu_count = os.cpu_count() or 1
+    if processes is None:
+        processes = min(len(labels), cpu_count)
+    if threads_per_process is None:
+        threads_per_process = max(1, cpu_count // processes)
+    training_options.setdefault('workers', threads_per_process)
+
+    model_versions = {}
+    # TensorFlow can't be forked once it is running, so every process starts fresh
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=limit_threads, initargs=(threads_per_process,)) as executor:
+        futures = dict((label, executor.submit(train_label, label, **training_options)) for label in labels)
+        for label, future in futures.items():
+            try:
+                model_versions[label] = future.result()
+                print(f"Finished training {label} v{model_versions[label].version}")
+            except Exception as e:
+                print(f"Training {label} failed:", e)
+                model_versions[label] = None
+    return model_versions
+
+
+def parse_midi_file(file):
+    """Parses one MIDI file and returns the notes from all of its instruments. A file that can't be parsed gives
+    back an empty list so it doesn't stop the other files from being read"""
+    notes = []
+    try:
+        print("Parsing MIDI file:", file)
+        midi_files = converter.parse(file)
+
+        # Print information about the MIDI file
+        print("Number of parts:", len(midi_files.parts))
+        for part in midi_files.parts:
+            print("Part:", part.partName)
+
+            # Iterate over each note in the part
+            for element in part.recurse().notes:
+                if isinstance(element, note.Rest):
+                    notes.append('Rest')
+                elif isinstance(element, note.Note):
+                    notes.append(str(element.pitch))
+                elif isinstance(element, chord.Chord):
+                    chord_notes = '.'.join(note.Note(pitch).nameWithOctave for pitch in element.normalOrder)
+                    notes.append('.'.join([chord_notes]))
 
+    except Exception as e:
+        print("Error parsing MIDI file:", file)
+        print(e)
+        return []
 
-def save_notes_to_file(notes, output_file_path):
-    """Save notes to a file using pickling."""
-    with open(output_file_path, 'wb') as output_file:
-        pickle.dump(notes, output_file)
+    return notes
 
-def get_notes(folder_path, output_folder):
-    """Method to go through the MIDI files in the specified folder, parse notes from all instruments, and save them to a single file."""
+def parse_midi_files(files, workers=None):
+    """Parses the files in a pool of `workers` processes (None uses every CPU, 1 parses them here one at a time)
+    and returns one list of notes per file, in the same order as files"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(files) <= 1:
+        return [parse_midi_file(file) for file in files]
+
+    # TensorFlow can't be forked once it is running, so the workers start fresh as in train_labels
+    with ProcessPoolExecutor(max_workers=min(workers, len(files)),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(parse_midi_file, file) for file in files]
+        file_notes = []
+        for file, future in zip(files, futures):
+            try:
+                file_notes.append(future.result())
+            except Exception as e:
+                # The worker itself died, so parse this file here instead
+                print("Parsing worker failed on", file, "-", e)
+                file_notes.append(parse_midi_file(file))
+    return file_notes
+
+def get_cached_notes(files, cache, workers=None):
+    """Returns one list of notes per file like parse_midi_files, but only parses the files that aren't in the cache"""
+    keys = [cache.key(file) for file in files]
+    file_notes = [cache.get(key) for key in keys]
+
+    missing = [number for number, notes in enumerate(file_notes) if notes is None]
+    print(f"{len(files) - len(missing)} of {len(files)} MIDI files found in the note cache")
+    parsed_notes = parse_midi_files([files[number] for number in missing], workers)
+
+    for number, notes in zip(missing, parsed_notes):
+        file_notes[number] = notes
+        if notes:  # Files that failed to parse are tried again next time
+            cache.put(keys[number], notes)
+    if missing:
+        cache.prune()
+
+    return file_notes
+
+def get_notes(folder_path, output_folder, workers=None, use_cache=True, files=None, cache_folder=None):
+    """Method to go through the MIDI files in the specified folder, parse notes from all instruments, and save them as an integer
+    corpus (see corpus.py). The files are parsed by `workers` processes at once, but always merged in file name order so the
+    corpus comes out the same. files picks which MIDI files to use instead of the folder's (see training_files).
+    Notes from files parsed before are read from the note cache (output_folder/note_cache unless cache_folder is set)
+    instead of being parsed again"""
     notes = []
 
     print("Folder path:", folder_path)
@@ -62,75 +344,69 @@ def get_notes(folder_path, output_folder):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    for file in glob.glob(os.path.join(folder_path, "*.mid")):
-        try:
-            print("Parsing MIDI file:", file)
-            midi_files = converter.parse(file)
-
-            # Print information about the MIDI file
-            print("Number of parts:", len(midi_files.parts))
-            for part in midi_files.parts:
-                print("Part:", part.partName)
-
-                # Iterate over each note in the part
-                for element in part.recurse().notes:
-                    if isinstance(element, note.Rest):
-                        notes.append('Rest')
-                    elif isinstance(element, note.Note):
-                        notes.append(str(element.pitch))
-                    elif isinstance(element, chord.Chord):
-                        chord_notes = '.'.join(note.Note(pitch).nameWithOctave for pitch in element.normalOrder)
-                        notes.append('.'.join([chord_notes]))
-
-        except Exception as e:
-            print("Error parsing MIDI file:", file)
-            print(e)
+    if files is None:
+        files = training_files(folder_path)
+    files = sorted(files)
+    if cache_folder is None:
+        cache_folder = os.path.join(output_folder, "note_cache")
+    if use_cache:
+        file_notes = get_cached_notes(files, NoteCache(cache_folder), workers)
+    else:
+        file_notes = parse_midi_files(files, workers)
+    for notes_in_file in file_notes:
+        notes.extend(notes_in_file)
 
     if not notes:
         print("No notes found in MIDI files.")
     else:
-        output_file_path = os.path.join(output_folder, "notes.pkl")
-        save_notes_to_file(notes, output_file_path)
-        print(f"All notes saved to: {output_file_path}")
+        save_corpus(encode_songs([notes_in_file for notes_in_file in file_notes if notes_in_file]), output_folder)
+        print(f"All notes saved to: {output_folder}")
 
     return notes
 
-def music_creation(notes, pitch_names): 
-    """We are preparing the music to be put into the LSTM Neural Network after the MIDI files have been parsed
-    into notes and chords"""
-
-    number_of_notes = 100
-    if len(notes) <= number_of_notes:
+def create_training_windows(tokens, number_of_notes=100):
+    """The training sequences, without copying anything. music_input is a (patterns, 100, 1) strided view over the
+    token array, one window of 100 notes per position, and music_output is the token that follows each window, left
+    as an integer instead of a one-hot row. create_training_dataset normalizes them one batch at a time during
+    training"""
+    if len(tokens) <= number_of_notes:
         raise ValueError("Not enough notes to create music sequences")
 
-    pitches = sorted(set(item for item in notes))   
-    
-    note_to_integer = dict((note, number) for number, note in enumerate(pitches))   
-        
-    music_input = []
-    music_output = []
-
-    for i in range(0, (len(notes) - number_of_notes), 1):
-        sequence_in = notes[i:i + number_of_notes]
-        sequence_out = notes[i + number_of_notes]
-        music_input.append([note_to_integer[char] for char in sequence_in])  
-        music_output.append([note_to_integer[sequence_out]])  # Wrap single note in a list
-
- 
-    note_patterns = len(music_input)
-    
-    music_input = numpy.reshape(music_input, (note_patterns, number_of_notes, 1))
-
-    music_input = music_input / float(pitch_names)
-
-    music_output = np_utils.to_categorical(music_output, num_classes=pitch_names)  # Convert to categorical with correct number of classes
+    tokens = numpy.asarray(tokens)  # No copy, even for a memory mapped corpus
+    music_input = sliding_window_view(tokens, number_of_notes)[:-1, :, numpy.newaxis]
+    music_output = tokens[number_of_notes:]
 
     return music_input, music_output
 
-
-def create_network(music_input, pitch_names):
+def create_training_dataset(music_input, music_output, pitch_names, batch_size=32, seed=None, skip_batches=0):
+    """Streams training batches out of the windows made by create_training_windows. Every batch is batch_size
+    windows picked at random offsets, turned into normalized float32 only when it is needed, and tf.data prefetches
+    the next batches in the background while the network trains. Since the windows are a view over the token
+    array, a memory mapped corpus only has the windows in each batch read from disk, so the corpus can be bigger
+    than memory. The dataset never ends; use steps_per_epoch to size an epoch. skip_batches leaves out the first
+    batches this seed would give, so a resumed run gets the same batches as one that was never stopped"""
+    random_generator = numpy.random.default_rng(seed)  # Shared between epochs so each one gets new batches
+
+    def generate_batches():
+        # Only the offsets are drawn for the skipped batches, no windows are read
+        for _ in range(skip_batches):
+            random_generator.integers(0, len(music_output), size=batch_size)
+        while True:
+            # Sorted positions read the (possibly memory mapped) tokens front to back
+            batch = numpy.sort(random_generator.integers(0, len(music_output), size=batch_size))
+            batch_input = numpy.asarray(music_input[batch], dtype='float32') / float(pitch_names)
+            batch_output = numpy.asarray(music_output[batch], dtype='int32')
+            yield batch_input, batch_output
+
+    dataset = tf.data.Dataset.from_generator(generate_batches, output_signature=(
+        tf.TensorSpec(shape=(batch_size, music_input.shape[1], music_input.shape[2]), dtype=tf.float32),
+        tf.TensorSpec(shape=(batch_size,), dtype=tf.int32)))
+
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def create_network(music_input, pitch_names, jit_compile=False):
     """We are putting in our parameters for how we want the structure of out Long Short-Term Memory Network
-    to look"""
+    to look. jit_compile=True has XLA compile the whole training step into one program"""
 
     lstm_model = Sequential()
     lstm_model.add(LSTM(
@@ -149,44 +425,177 @@ def create_network(music_input, pitch_names):
     lstm_model.add(Dropout(0.2))
     lstm_model.add(Dense(pitch_names))
     lstm_model.add(Activation('softmax'))
-    lstm_model.compile(loss = 'categorical_crossentropy', optimizer= 'rmsprop')
+    lstm_model.compile(loss = 'sparse_categorical_crossentropy', optimizer= 'rmsprop', jit_compile=jit_compile)
 
     return lstm_model
 
-def train(lstm_model, music_input, music_output):
+class BestLossWeights(Callback):
+    """Keeps the weights of the epoch whose loss was closest to target_loss. The weights are copied into a set of
+    variables made once when training starts, so an improving epoch costs one copy on the device instead of pulling
+    every weight out with get_weights(). With checkpoint_folder set they are written to disk there instead (see
+    training_checkpoint.py), so no second copy of the model stays in memory. When training ends the model is left
+    holding the best weights.
+    With patience set, training stops after that many epochs in a row without getting closer to target_loss"""
+
+    def __init__(self, target_loss=0.2, patience=None, checkpoint_folder=None):
+        super().__init__()
+        self.target_loss = target_loss
+        self.patience = patience
+        self.checkpoint_folder = checkpoint_folder
+        self.best_loss_difference = float('inf')
+        self.best_epoch = None
+        self.epochs_without_improvement = 0
+
+    def state(self):
+        """The best-so-far tracker, for saving in a checkpoint"""
+        return {'best_loss_difference': self.best_loss_difference, 'best_epoch': self.best_epoch,
+                'epochs_without_improvement': self.epochs_without_improvement}
+
+    def load_state(self, state):
+        self.best_loss_difference = state['best_loss_difference']
+        self.best_epoch = state['best_epoch']
+        self.epochs_without_improvement = state['epochs_without_improvement']
+
+    def on_train_begin(self, logs=None):
+        if self.checkpoint_folder is None:
+            self.best_weights = [tf.Variable(weight, trainable=False) for weight in self.model.weights]
+
+    def on_epoch_end(self, epoch, logs=None):
+        loss_difference = abs(logs['loss'] - self.target_loss)
+
+        if loss_difference < self.best_loss_difference:
+            self.best_loss_difference = loss_difference
+            self.best_epoch = epoch
+            self.epochs_without_improvement = 0
+            if self.checkpoint_folder is None:
+                for best_weight, weight in zip(self.best_weights, self.model.weights):
+                    best_weight.assign(weight)
+            else:
+                save_best_weights(self.checkpoint_folder, self.model)
+        else:
+            self.epochs_without_improvement += 1
+            if self.patience is not None and self.epochs_without_improvement >= self.patience:
+                print(f"No epoch got closer to a loss of {self.target_loss} in {self.patience} epochs, stopping")
+                self.model.stop_training = True
+
+    def on_train_end(self, logs=None):
+        if self.best_epoch is None:
+            return
+        if self.checkpoint_folder is None:
+            for best_weight, weight in zip(self.best_weights, self.model.weights):
+                weight.assign(best_weight)
+        else:
+            load_best_weights(self.checkpoint_folder, self.model)
+
+def train(lstm_model, music_input, music_output, epochs=100, patience=None, checkpoint_folder=None, resume=False,
+          checkpoint_every=1, weights_file="best_weights_loss.weights.h5", input_scale=None):
     """Method where we use our MIDI files to train the network so we can create original songs. This creates
-    a .hdf5 file which we can use to populate music from the network"""
+    a .weights.h5 file which we can use to populate music from the network. music_input and music_output come from
+    create_training_windows.
+    All the epochs run in one fit, and BestLossWeights keeps the weights of the epoch with the loss closest to 0.2.
+    patience stops training early once that many epochs go by without getting closer.
+    With checkpoint_folder set, a checkpoint is saved there every checkpoint_every epochs, and resume picks up after
+    the epoch of the last one with the same weights, optimizer, batches and best-so-far tracker.
+    The best weights are saved to weights_file, whose name has to end in .weights.h5 for Keras to save it.
+    The note numbers are divided by input_scale, which defaults to the size of the network's vocabulary"""
+
+    batch_size = 32
+    steps_per_epoch = math.ceil(len(music_output) / batch_size)
+    # The sampler's position is kept as its seed and the batches fit has used. Its random state can't be, since
+    # tf.data has already drawn the prefetched batches from it by the time an epoch ends
+    seed = numpy.random.SeedSequence().entropy
+    batches_done = 0
+    best_loss_weights = BestLossWeights(target_loss=0.2, patience=patience, checkpoint_folder=checkpoint_folder)
+
+    initial_epoch = 0
+    if resume and checkpoint_folder is not None:
+        checkpoint = load_checkpoint(checkpoint_folder)
+        if checkpoint is None:
+            print("No checkpoint found, training from the first epoch")
+        else:
+            restore_checkpoint(lstm_model, checkpoint)
+            seed = checkpoint.state['seed']
+            batches_done = checkpoint.state['batches']
+            best_loss_weights.load_state(checkpoint.state['best_loss'])
+            initial_epoch = checkpoint.epoch + 1
+            print(f"Resuming training after epoch {initial_epoch}")
 
-    best_loss_difference = float('inf')
-    best_epoch_weights = None
+    if input_scale is None:
+        input_scale = lstm_model.output_shape[-1]
+    dataset = create_training_dataset(music_input, music_output, input_scale, batch_size, seed=seed,
+                                      skip_batches=batches_done)
 
-    for epoch in range(100):  
-        history = lstm_model.fit(music_input, music_output, epochs=1, batch_size=32, verbose=1)
+    callbacks = [best_loss_weights]
+    if checkpoint_folder is not None:
+        callbacks.append(TrainingCheckpoint(checkpoint_folder, every=checkpoint_every, get_state=lambda epoch: {
+            'seed': seed, 'batches': (epoch + 1) * steps_per_epoch, 'best_loss': best_loss_weights.state()}))
 
-        current_loss = history.history['loss'][0]
-        loss_difference = abs(current_loss - 0.2)
+    history = lstm_model.fit(dataset, epochs=epochs, initial_epoch=initial_epoch, steps_per_epoch=steps_per_epoch,
+                             callbacks=callbacks, verbose=1)
 
-        if loss_difference < best_loss_difference:
-            best_loss_difference = loss_difference
-            best_epoch_weights = lstm_model.get_weights()
+    # The model now holds the weights of the epoch with the loss closest to 0.2
+    if best_loss_weights.best_epoch is not None:
+        lstm_model.save_weights(weights_file)
 
-    # Save the weights of the epoch with the loss closest to 0.2
-    if best_epoch_weights is not None:
-        lstm_model.set_weights(best_epoch_weights)
-        lstm_model.save_weights("best_weights_loss.h5")
+    return history
 
 def train_model(output_folder):
     """Takes the selected songs and runs it through the LSTM model"""
     try:
         if output_folder:
-            train_neural_network(output_folder)
-            messagebox.showinfo("Success!", "Training completed successfully.")
+            if train_neural_network(output_folder):
+                messagebox.showinfo("Success!", "Training completed successfully.")
+            else:
+                messagebox.showinfo("Success!", "The model is already trained on these songs.")
         else:
             print("Please select an output folder first.")
     except Exception as e:
         print("Error during training:", e)
 
-def move_selected_songs(csv_file_path, midi_folder, output_folder):
+SELECTION_MANIFEST = "selection.txt"
+SELECTION_MODES = ("hardlink", "symlink", "copy", "manifest")
+
+def training_files(folder_path):
+    """The MIDI files to train on for folder_path: the ones listed in its selection manifest if move_selected_songs
+    wrote one, otherwise every .mid file in it"""
+    manifest_path = os.path.join(folder_path, SELECTION_MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as manifest:
+            return sorted(os.path.normpath(os.path.join(folder_path, line.rstrip('\n'))) for line in manifest if line.strip())
+    return sorted(glob.glob(os.path.join(folder_path, "*.mid")))
+
+def place_song(source_path, destination_path, mode):
+    """Puts a selected song into the output folder as a hard link, symbolic link or copy, unless the one there is
+    already up to date. Links that can't be made (another drive, or no permission for symbolic links) fall back to a
+    copy. Returns True if anything had to be written"""
+    if mode == "symlink":
+        target = os.path.abspath(source_path)
+        if os.path.islink(destination_path) and os.readlink(destination_path) == target:
+            return False
+    elif os.path.isfile(destination_path) and not os.path.islink(destination_path):
+        destination_stat, source_stat = os.stat(destination_path), os.stat(source_path)
+        if os.path.samefile(source_path, destination_path) or (destination_stat.st_size == source_stat.st_size and
+                                                                destination_stat.st_mtime == source_stat.st_mtime):
+            return False  # The same file, or a copy of it (copy2 keeps the modification time)
+
+    if os.path.lexists(destination_path):
+        os.remove(destination_path)
+    try:
+        if mode == "hardlink":
+            os.link(source_path, destination_path)
+        elif mode == "symlink":
+            os.symlink(target, destination_path)
+        else:
+            shutil.copy2(source_path, destination_path)
+    except OSError:
+        shutil.copy2(source_path, destination_path)
+    return True
+
+def move_selected_songs(csv_file_path, midi_folder, output_folder, mode="hardlink"):
+    """Makes output_folder hold the songs in the csv file. Only the difference from what is already there is changed:
+    songs that are no longer selected are removed and new ones are added, as hard links by default so nothing is
+    copied (mode can also be "symlink" or "copy"). With mode "manifest" no MIDI files are placed at all; the folder
+    just gets a selection.txt listing the songs, which get_notes reads instead"""
     try:
         if midi_folder and output_folder:
             # Only open 'selected_songs.csv' within the with statement
@@ -196,24 +605,45 @@ def move_selected_songs(csv_file_path, midi_folder, output_folder):
 
             if not selected_songs:
                 raise ValueError("No songs selected.")
+            if mode not in SELECTION_MODES:
+                raise ValueError(f"Unknown selection mode '{mode}'.")
+            os.makedirs(output_folder, exist_ok=True)
 
-            # Clear the output folder before moving new songs
-            for file in os.listdir(output_folder):
-                file_path = os.path.join(output_folder, file)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-
-            moved_songs = []  # Track successfully moved songs
+            moved_songs = []  # Track songs found in the MIDI folder
             for song in selected_songs:
-                midi_file_path = os.path.join(midi_folder, song + '.mid')
-                if os.path.exists(midi_file_path):
-                    # Move the MIDI file to the output folder
-                    destination_path = os.path.join(output_folder, song + '.mid')
-                    shutil.copyfile(midi_file_path, destination_path)
+                if os.path.exists(os.path.join(midi_folder, song + '.mid')):
                     moved_songs.append(song)
-                    print(f"Moved {song}.mid to {output_folder}")
                 else:
                     print(f"MIDI file '{song}.mid' not found in the selected folder.")
+
+            manifest_path = os.path.join(output_folder, SELECTION_MANIFEST)
+            if mode == "manifest":
+                wanted_files = {SELECTION_MANIFEST}
+                manifest_lines = [os.path.relpath(os.path.join(midi_folder, song + '.mid'), output_folder) + '\n'
+                                  for song in moved_songs]
+                replace_file(manifest_path, lambda file: file.write(''.join(manifest_lines).encode('utf-8')))
+            else:
+                wanted_files = set(song + '.mid' for song in moved_songs)
+
+            # Remove whatever is left over from the last selection
+            removed = 0
+            for file in os.listdir(output_folder):
+                file_path = os.path.join(output_folder, file)
+                if file not in wanted_files and (os.path.isfile(file_path) or os.path.islink(file_path)):
+                    os.remove(file_path)
+                    removed += 1
+
+            if mode == "manifest":
+                print(f"Selection manifest lists {len(moved_songs)} songs, {removed} files removed")
+            else:
+                added = 0
+                for song in moved_songs:
+                    if place_song(os.path.join(midi_folder, song + '.mid'), os.path.join(output_folder, song + '.mid'), mode):
+                        added += 1
+                        print(f"Moved {song}.mid to {output_folder}")
+                print(f"Selection updated: {added} songs added, {removed} files removed, "
+                      f"{len(moved_songs) - added} already in place")
+
             if moved_songs:
                 # Display success message only if songs were moved
                 messagebox.showinfo("Success", "Moving selected songs completed successfully.")
@@ -258,6 +688,14 @@ class MusicGeneratorApp:
         self.train_button.place(relx=0.5, rely=0.6, anchor='center')
 
         def music_creation_callback():
+            # Use the generation server if it is running, it already has the network loaded
+            if server_is_running():
+                try:
+                    output_file_paths = save_music(request_music(), 1)
+                    messagebox.showinfo("Success!", f"MIDI file generated: {output_file_paths[0]}")
+                    return
+                except Exception as e:
+                    print("Error asking the generation server for music:", e)
             os.system('python music_creation.py')
 
         self.create_button = tk.Button(root, text="Gimme My Music!", command=music_creation_callback)
@@ -304,7 +742,53 @@ class MusicGeneratorApp:
                 songs.extend(row)
         return songs
     
+def main():
+    parser = argparse.ArgumentParser(description="Open the Music Generator window, or train without it")
+    parser.add_argument("--train", metavar="FOLDER",
+                        help="train on every MIDI file in FOLDER (for example the whole 'MIDI Music' library)")
+    parser.add_argument("--epochs", type=int, default=None,
+                        help="number of epochs to train for (default 100, or 5 with --fine-tune)")
+    parser.add_argument("--patience", type=int, default=None,
+                        help="stop early after this many epochs without the loss getting closer to 0.2")
+    parser.add_argument("--xla", action="store_true", help="compile the training step with XLA")
+    parser.add_argument("--resume", action="store_true",
+                        help="carry on from the last checkpoint in data/checkpoints instead of starting over")
+    parser.add_argument("--label", nargs="+", metavar="LABEL", choices=LABELS + ("all",),
+                        help="train a model for each LABEL on its songs in music_features.csv ('all' for every label)")
+    parser.add_argument("--midi-folder", default="MIDI Music", help="folder with the MIDI files for --label")
+    parser.add_argument("--processes", type=int, default=None, help="labels trained at once (default: all of them)")
+    parser.add_argument("--threads", type=int, default=None, help="threads each training process may use")
+    parser.add_argument("--force", action="store_true",
+                        help="train again even if the model was already trained on the same songs and settings")
+    parser.add_argument("--fine-tune", nargs="+", metavar="FILE",
+                        help="update the --label model with these new MIDI files instead of training from scratch")
+    parser.add_argument("--replay-ratio", type=float, default=3,
+                        help="with --fine-tune, old notes replayed for every new note (default 3)")
+    args = parser.parse_args()
+
+    if args.fine_tune:
+        if not args.label or len(args.label) != 1 or "all" in args.label:
+            parser.error("--fine-tune needs exactly one --label")
+        limit_threads(args.threads)
+        fine_tune_label(args.label[0], args.fine_tune, epochs=args.epochs or 5, replay_ratio=args.replay_ratio,
+                        jit_compile=args.xla)
+        return
+
+    training_options = dict(epochs=args.epochs or 100, patience=args.patience, jit_compile=args.xla,
+                            resume=args.resume, force=args.force)
+    if args.label:
+        labels = list(LABELS) if "all" in args.label else list(dict.fromkeys(args.label))
+        if len(labels) == 1:
+            limit_threads(args.threads)
+            train_label(labels[0], args.midi_folder, **training_options)
+        else:
+            train_labels(labels, args.processes, args.threads, midi_folder=args.midi_folder, **training_options)
+    elif args.train:
+        train_neural_network(args.train, **training_options)
+    else:
+        root = tk.Tk()
+        app = MusicGeneratorApp(root)
+        root.mainloop()
+
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = MusicGeneratorApp(root)
-    root.mainloop()
+    main()
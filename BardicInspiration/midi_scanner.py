@@ -0,0 +1,133 @@
+"""Reads only what feature_extraction needs out of a MIDI file: tempo, time signature, key signature and program
+changes. mido.MidiFile decodes every message of every track into an object, but most of a MIDI file is notes, so
+this walks the track chunks byte by byte instead, skips note and controller messages by their length and only
+decodes the events it looks at (and the note numbers of note_on messages, for the pitch class counts). It follows
+the same rules as mido for reading tracks (running status, meta and sysex events), so scan_music_data gives the
+same feature dict as extract_music_data. One difference: the data bytes of skipped messages aren't checked, so a
+damaged note message that mido would refuse is passed over here."""
+
+import os
+import struct
+
+try:
+    from BardicInspiration.instrument_int_to_string import program_family
+except ImportError:
+    from instrument_int_to_string import program_family
+
+KEY_SIGNATURES = {(-7, 0): 'Cb', (-6, 0): 'Gb', (-5, 0): 'Db', (-4, 0): 'Ab', (-3, 0): 'Eb', (-2, 0): 'Bb',
+                  (-1, 0): 'F', (0, 0): 'C', (1, 0): 'G', (2, 0): 'D', (3, 0): 'A', (4, 0): 'E', (5, 0): 'B',
+                  (6, 0): 'F#', (7, 0): 'C#',
+                  (-7, 1): 'Abm', (-6, 1): 'Ebm', (-5, 1): 'Bbm', (-4, 1): 'Fm', (-3, 1): 'Cm', (-2, 1): 'Gm',
+                  (-1, 1): 'Dm', (0, 1): 'Am', (1, 1): 'Em', (2, 1): 'Bm', (3, 1): 'F#m', (4, 1): 'C#m',
+                  (5, 1): 'G#m', (6, 1): 'D#m', (7, 1): 'A#m'}
+
+# Data bytes that follow each status byte, for everything except meta (0xFF) and sysex (0xF0, 0xF7) events
+MESSAGE_LENGTHS = {}
+for status in range(0x80, 0xF0):
+    MESSAGE_LENGTHS[status] = 1 if 0xC0 <= status < 0xE0 else 2  # Program change and aftertouch have one
+MESSAGE_LENGTHS.update({0xF1: 1, 0xF2: 2, 0xF3: 1, 0xF6: 0, 0xF8: 0, 0xFA: 0, 0xFB: 0, 0xFC: 0, 0xFE: 0})
+
+SET_TEMPO = 0x51
+TIME_SIGNATURE = 0x58
+KEY_SIGNATURE = 0x59
+DRUM_NOTE_ON = 0x99  # note_on on channel 10, where notes are drum sounds rather than pitches
+
+def read_variable_int(data, position):
+    """Reads a variable length number and returns (value, position after it)"""
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, position
+
+def scan_track(data, position, end, events, pitch_classes=None):
+    """Adds the (kind, value) of every event we care about between position and end of one track to events. If
+    pitch_classes is a list of 12 counts, every note played (outside the drum channel) is also counted in it"""
+    last_status = None
+    while position < end:
+        _, position = read_variable_int(data, position)  # Delta time
+        status = data[position]
+        position += 1
+
+        if status < 0x80:
+            # Running status: this byte is already the first data byte of a message like the last one
+            if last_status is None:
+                raise OSError('running status without last_status')
+            status = last_status
+            position -= 1
+        elif status != 0xFF:
+            last_status = status  # Meta events don't set running status
+
+        if status == 0xFF:
+            meta_type = data[position]
+            length, position = read_variable_int(data, position + 1)
+            if meta_type == SET_TEMPO:
+                events.append(('tempo', (data[position] << 16) | (data[position + 1] << 8) | data[position + 2]))
+            elif meta_type == TIME_SIGNATURE:
+                events.append(('time_signature', f"{data[position]}/{2 ** data[position + 1]}"))
+            elif meta_type == KEY_SIGNATURE:
+                key, mode = struct.unpack_from('bB', data, position)
+                if (key, mode) not in KEY_SIGNATURES:
+                    raise ValueError(f"Could not decode key signature {key}, mode {mode}")
+                events.append(('key_signature', KEY_SIGNATURES[(key, mode)]))
+            position += length
+        elif status == 0xF0 or status == 0xF7:
+            length, position = read_variable_int(data, position)
+            position += length
+        elif status in MESSAGE_LENGTHS:
+            if 0xC0 <= status < 0xD0:
+                events.append(('program_change', data[position]))
+            elif pitch_classes is not None and 0x90 <= status < 0xA0 and status != DRUM_NOTE_ON and data[position + 1]:
+                pitch_classes[data[position] % 12] += 1  # A note_on with velocity 0 is a note_off
+            position += MESSAGE_LENGTHS[status]
+        else:
+            raise OSError(f'undefined status byte 0x{status:02x}')
+    if position > end:
+        raise EOFError('track ended in the middle of an event')
+
+def scan_events(data, pitch_classes=None):
+    """Every tempo, time signature, key signature and program change event in the bytes of a MIDI file, as
+    (kind, value) in the order mido.MidiFile would list them: track by track. See scan_track for pitch_classes"""
+    if len(data) < 14 or data[:4] != b'MThd':
+        raise OSError('MThd not found. Probably not a MIDI file')
+    header_size, = struct.unpack_from('>L', data, 4)
+    _, track_count, _ = struct.unpack_from('>hhh', data, 8)
+
+    events = []
+    position = 8 + header_size
+    for _ in range(track_count):
+        if position + 8 > len(data):
+            raise EOFError('file ends before all of its tracks')
+        name, size = struct.unpack_from('>4sL', data, position)
+        if name != b'MTrk':
+            raise OSError('no MTrk header at start of track')
+        position += 8
+        try:
+            scan_track(data, position, position + size, events, pitch_classes)
+        except IndexError:
+            raise EOFError('file ends in the middle of a track')
+        position += size
+    return events
+
+def scan_music_data(midi_file, label):
+    """Same features as feature_extraction.extract_music_data, read with scan_events instead of mido"""
+    features = {}
+    features['song_name'] = os.path.splitext(os.path.basename(midi_file))[0]
+    with open(midi_file, 'rb') as file:
+        data = file.read()
+
+    pitch_classes = [0] * 12
+    for kind, value in scan_events(data, pitch_classes):
+        if kind == 'tempo':
+            features['tempo'] = 60 * 1e6 / value * 4 / 4.  # Exactly what mido.tempo2bpm gives
+        elif kind == 'program_change':
+            if 'instruments' not in features:
+                features['instruments'] = []
+            features['instruments'].append(program_family(value))  # A damaged data byte can be 128 or more
+        else:
+            features[kind] = value
+    features['label'] = label
+    features['pitch_classes'] = pitch_classes
+    return features
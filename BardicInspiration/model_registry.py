@@ -0,0 +1,200 @@
+"""Keeps a trained model for each music label, so training Boss music doesn't overwrite the Tavern model. Every
+training run gets a new numbered version, and a label's `current` file points at the newest finished one:
+    models/<label>/v<number>/    vocab.json, tokens.npy, offsets.npy (the corpus, see corpus.py),
+                                 best_weights_loss.weights.h5 and info.json (when and how it was trained)
+    models/<label>/current       the number of the version generation should use
+A version that was started but never finished (training crashed or is still running) is never made current, so
+generation keeps using the last good model. Each version also remembers the fingerprint of the songs and settings it
+was trained with, so asking for the same training again just hands back that version. To see what is there:
+    python model_registry.py"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+try:
+    from BardicInspiration.corpus import replace_file, corpus_exists
+    from BardicInspiration.note_cache import NoteCache
+    from BardicInspiration.catalog_snapshot import load_catalog
+except ImportError:
+    from corpus import replace_file, corpus_exists
+    from note_cache import NoteCache
+    from catalog_snapshot import load_catalog
+
+LABELS = ("Tavern", "Boss", "Sad", "Exploration", "Victory")
+DEFAULT_REGISTRY_FOLDER = "models"
+WEIGHTS_FILE = "best_weights_loss.weights.h5"  # Keras only saves weights to names ending in .weights.h5
+LEGACY_WEIGHTS_FILE = "best_weights_loss.h5"  # What models trained before that were saved as
+INFO_FILE = "info.json"
+CURRENT_FILE = "current"
+FINGERPRINT_FILE = "fingerprint"
+TRAINING_VERSION = 1  # Bump this whenever training changes enough that the same songs would give a different model
+
+def training_fingerprint(files, **hyperparameters):
+    """A hash of everything that decides what training produces: the contents of the MIDI files (through the note
+    cache key, which also covers the parser version) in the order they are trained on, and the hyperparameters"""
+    cache = NoteCache()
+    description = {'training_version': TRAINING_VERSION, 'files': [cache.key(file) for file in files],
+                   'hyperparameters': hyperparameters}
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()
+
+def read_fingerprint(folder):
+    """The fingerprint save_fingerprint wrote in folder, or None"""
+    try:
+        with open(os.path.join(folder, FINGERPRINT_FILE), 'r') as fingerprint_file:
+            return fingerprint_file.read().strip()
+    except OSError:
+        return None
+
+def save_fingerprint(folder, fingerprint):
+    """Saves the fingerprint of what was trained in folder. None removes it, for while the folder is being retrained"""
+    fingerprint_path = os.path.join(folder, FINGERPRINT_FILE)
+    if fingerprint is None:
+        if os.path.exists(fingerprint_path):
+            os.remove(fingerprint_path)
+    else:
+        replace_file(fingerprint_path, lambda file: file.write(fingerprint.encode('utf-8')))
+
+def saved_weights_file(weights_file):
+    """weights_file, or the best_weights_loss.h5 next to it when only a model saved under the old name is there.
+    Keras still loads weights from those, it just won't save to them"""
+    if not os.path.exists(weights_file):
+        legacy_file = os.path.join(os.path.dirname(weights_file), LEGACY_WEIGHTS_FILE)
+        if os.path.exists(legacy_file):
+            return legacy_file
+    return weights_file
+
+def label_songs(features_csv, label):
+    """Names of the songs music_features.csv files under label, read from the catalog's snapshot (see
+    catalog_snapshot.py). Labels match without caring about case, like the search window. A song listed twice is only
+    named once, with the label of its last row"""
+    label = label.lower()
+    return [song for song, attributes in load_catalog(features_csv).items()
+            if attributes['Label'].strip().lower() == label]
+
+class ModelVersion:
+    """One trained (or training) version of a label's model"""
+    def __init__(self, label, version, folder):
+        self.label = label
+        self.version = version
+        self.folder = folder
+
+    @property
+    def corpus_folder(self):
+        return self.folder
+
+    @property
+    def weights_file(self):
+        return os.path.join(self.folder, WEIGHTS_FILE)
+
+    @property
+    def checkpoint_folder(self):
+        return os.path.join(self.folder, "checkpoints")
+
+    def info(self):
+        """What was saved about the training run, or an empty dict for an unfinished version"""
+        try:
+            with open(os.path.join(self.folder, INFO_FILE), 'r', encoding='utf-8') as info_file:
+                return json.load(info_file)
+        except (OSError, ValueError):
+            return {}
+
+    def input_scale(self):
+        """What training divided the note numbers by before feeding them to the network, or None for a version
+        saved before this was recorded (those used the size of their vocabulary)"""
+        return self.info().get('input_scale')
+
+    def is_complete(self):
+        return os.path.exists(saved_weights_file(self.weights_file)) and corpus_exists(self.corpus_folder)
+
+class ModelRegistry:
+    """The models folder, one subfolder per label"""
+    def __init__(self, registry_folder=DEFAULT_REGISTRY_FOLDER):
+        self.registry_folder = registry_folder
+
+    def label_folder(self, label):
+        if label not in LABELS:
+            raise ValueError(f"Unknown label '{label}'. Labels are: {', '.join(LABELS)}")
+        return os.path.join(self.registry_folder, label)
+
+    def get(self, label, version):
+        return ModelVersion(label, version, os.path.join(self.label_folder(label), f"v{version}"))
+
+    def versions(self, label):
+        """Every version number of a label, finished or not, oldest first"""
+        label_folder = self.label_folder(label)
+        if not os.path.exists(label_folder):
+            return []
+        return sorted(int(name[1:]) for name in os.listdir(label_folder) if name.startswith("v") and name[1:].isdigit())
+
+    def new_version(self, label):
+        """Makes the folder for the next version of a label and returns it. Two processes can't get the same number,
+        since creating the folder fails for the second one"""
+        label_folder = self.label_folder(label)
+        os.makedirs(label_folder, exist_ok=True)
+        version = (self.versions(label) or [0])[-1] + 1
+        while True:
+            try:
+                os.makedirs(os.path.join(label_folder, f"v{version}"))
+                return self.get(label, version)
+            except FileExistsError:
+                version += 1
+
+    def unfinished_version(self, label):
+        """The newest version that was started after the current one but never published, if there is one"""
+        current = self.current(label)
+        versions = self.versions(label)
+        if versions and (current is None or versions[-1] > current.version):
+            return self.get(label, versions[-1])
+        return None
+
+    def publish(self, model_version, info):
+        """Saves info about the run and makes model_version the label's current model"""
+        info = dict(info, label=model_version.label, version=model_version.version, trained_at=time.time())
+        replace_file(os.path.join(model_version.folder, INFO_FILE),
+                     lambda file: file.write(json.dumps(info, indent=2).encode('utf-8')))
+        self.set_current(model_version)
+
+    def set_current(self, model_version):
+        replace_file(os.path.join(self.label_folder(model_version.label), CURRENT_FILE),
+                     lambda file: file.write(str(model_version.version).encode('utf-8')))
+
+    def find(self, label, fingerprint):
+        """The newest finished version of label that was trained with this fingerprint, or None"""
+        for version in reversed(self.versions(label)):
+            model_version = self.get(label, version)
+            if model_version.info().get('fingerprint') == fingerprint and model_version.is_complete():
+                return model_version
+        return None
+
+    def current(self, label):
+        """The version generation should use for label, or None if the label has never finished training"""
+        try:
+            with open(os.path.join(self.label_folder(label), CURRENT_FILE), 'r') as current_file:
+                return self.get(label, int(current_file.read().strip()))
+        except (OSError, ValueError):
+            return None
+
+    def trained_labels(self):
+        return [label for label in LABELS if self.current(label) is not None]
+
+def main():
+    parser = argparse.ArgumentParser(description="List the trained model for each label")
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY_FOLDER, help="models folder")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    for label in LABELS:
+        current = registry.current(label)
+        if current is None:
+            print(f"{label:12} not trained")
+        else:
+            info = current.info()
+            print(f"{label:12} v{current.version}  {info.get('songs', '?')} songs, vocabulary {info.get('vocab', '?')}"
+                  f"  ({len(registry.versions(label))} versions)")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
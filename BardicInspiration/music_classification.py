@@ -1,43 +1,28 @@
 import csv
+import os
 import tkinter as tk
 from tkinter import messagebox
 
-def process_csv(csv_file):
-    """Process a CSV file containing music information and return a dictionary."""
-    music_info = {}
-    with open(csv_file, 'r') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            piece_name = row['song_name'] 
-            tempo = row['tempo']
-            if tempo.lower() in ['unknown', '']:
-                tempo = -1
-            else:
-                try:
-                    tempo = float(tempo)
-                except ValueError:
-                    print("Invalid tempo value:", tempo)
-                    tempo = -1
-            row['tempo'] = tempo
-            instruments = [instrument.strip() for instrument in row['instruments'].split(';')]
-            music_info[piece_name] = {
-                'Tempo': tempo,
-                'Time Signature': row['time_signature'],
-                'Instruments': instruments,  # Convert string representation of list to list
-                'Key Signature': row['key_signature'],
-                'Label': row['label']
-            }
-    return music_info
+try:
+    from BardicInspiration.music_index import MusicIndex
+    from BardicInspiration.catalog_columns import CatalogColumns
+    from BardicInspiration.name_index import NameIndex
+    from BardicInspiration.catalog_snapshot import process_csv, load_catalog, tempo_range
+except ImportError:
+    from music_index import MusicIndex
+    from catalog_columns import CatalogColumns
+    from name_index import NameIndex
+    from catalog_snapshot import process_csv, load_catalog, tempo_range
 
-def music_search(selected_tempo, selected_time, selected_instrument, selected_key, selected_label, music_info):
-    """Perform a search for music based on user-selected criteria."""
+loaded_indexes = {}  # csv_file: (modification time, MusicIndex), see load_music_index
+loaded_name_indexes = {}  # csv_file: (modification time, NameIndex), see load_name_index
 
-    tempo_ranges = {
-        "0-60": (0.0, 60.0),
-        "61-120": (61.0, 120.0),
-        "121-180": (121.0, 180.0),
-        "181+": (181.0, float('inf'))  # Using float('inf') to represent infinity
-    }
+def music_search(selected_tempo, selected_time, selected_instrument, selected_key, selected_label, music_info):
+    """Perform a search for music based on user-selected criteria. music_info is either the dictionary from
+    process_csv, which is checked song by song, or a MusicIndex, which answers it with its bitsets.
+    selected_tempo can also be a (min, max) tuple."""
+    if isinstance(music_info, MusicIndex):
+        return music_info.search(selected_tempo, selected_time, selected_instrument, selected_key, selected_label)
 
     music_selected = []
     for song, attributes in music_info.items():
@@ -48,33 +33,72 @@ def music_search(selected_tempo, selected_time, selected_instrument, selected_ke
                 if selected_tempo == "Any":
                     music_selected.append(song)
                 else:
-                    min_tempo, max_tempo = tempo_ranges[selected_tempo]
+                    min_tempo, max_tempo = tempo_range(selected_tempo)
                     if min_tempo <= attributes["Tempo"] <= max_tempo:
                         music_selected.append(song)
 
     return music_selected
 
+def music_search_batch(searches, music_info):
+    """Performs many searches at once. searches is a list of (tempo, time, instrument, key, label) choices, the same
+    as music_search takes, and music_info the dictionary from process_csv or a CatalogColumns made from it (make it
+    once when searching the same catalog again). Returns one array of song IDs per search, where an ID is the song's
+    place in the catalog, so list(music_info)[ID] is its name."""
+    if not isinstance(music_info, CatalogColumns):
+        music_info = CatalogColumns(music_info)
+    return music_info.search_batch(searches)
+
+def load_music_index(csv_file):
+    """The MusicIndex of a CSV file. It is built from the catalog's snapshot (see catalog_snapshot.py) the first time
+    and kept in memory for the next searches, until the file's modification time changes"""
+    modified = os.stat(csv_file).st_mtime_ns
+    loaded = loaded_indexes.get(csv_file)
+    if loaded is None or loaded[0] != modified:
+        loaded = loaded_indexes[csv_file] = (modified, MusicIndex(load_catalog(csv_file)))
+    return loaded[1]
+
+def load_name_index(csv_file):
+    """The NameIndex of a CSV file's song names, kept in memory like load_music_index"""
+    modified = os.stat(csv_file).st_mtime_ns
+    loaded = loaded_name_indexes.get(csv_file)
+    if loaded is None or loaded[0] != modified:
+        loaded = loaded_name_indexes[csv_file] = (modified, NameIndex(load_music_index(csv_file).songs))
+    return loaded[1]
+
+def save_selected_songs(selected_music):
+    """Writes the songs to selected_songs.csv and tells the user how many there were"""
+    with open('selected_songs.csv', 'w', newline='') as csvfile:
+        fieldnames = ['Song Name']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for song in selected_music:
+            writer.writerow({'Song Name': song})
+
+    messagebox.showinfo("Success", f"{len(selected_music)} songs found and saved to selected_songs.csv")
+
 def perform_search_function(selected_tempo, selected_time, selected_instrument, selected_key, selected_label):
     """Once a user makes their selection, perform_search_functions will take the criteria and compare each song
     to it. If it matches, it goes into the newly created search_results.csv file"""
 
-    music_info = process_csv('music_features.csv')
+    music_info = load_music_index('music_features.csv')
 
     selected_music = music_search(selected_tempo, selected_time, selected_instrument, selected_key, selected_label, music_info)
 
     if selected_music:
-        # Write selected songs to a CSV file
-        with open('selected_songs.csv', 'w', newline='') as csvfile:
-            fieldnames = ['Song Name']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for song in selected_music:
-                writer.writerow({'Song Name': song})
-
-        messagebox.showinfo("Success", f"{len(selected_music)} songs found and saved to selected_songs.csv")
+        save_selected_songs(selected_music)
     else:
         messagebox.showinfo("No Results", "No songs found matching the criteria.")
 
+def perform_name_search_function(query, limit=50):
+    """Finds the songs whose names hold query (or, when none do, the names most like it) and saves them to
+    selected_songs.csv, best match first"""
+    selected_music = load_name_index('music_features.csv').search(query, limit)
+
+    if selected_music:
+        save_selected_songs(selected_music)
+    else:
+        messagebox.showinfo("No Results", f"No song names look like \"{query}\".")
+
 def music_gui():
     root = tk.Tk()
     root.title("Bardic Inspiration")
@@ -134,6 +158,16 @@ def music_gui():
     search_button = tk.Button(frame, text="Search", font=("Arial", 12), command=perform_search)
     search_button.grid(row=6, columnspan=2, pady=10)
 
+    # Or find songs by name
+    tk.Label(frame, text="Or Find by Name:", font=("Arial", 12)).grid(row=7, column=0, padx=5, pady=5, sticky="e")
+    name_var = tk.StringVar(root)
+    name_entry = tk.Entry(frame, textvariable=name_var, font=("Arial", 12))
+    name_entry.grid(row=7, column=1, padx=5, pady=5, sticky="w")
+    name_entry.bind("<Return>", lambda event: perform_name_search_function(name_var.get()))
+    find_button = tk.Button(frame, text="Find", font=("Arial", 12),
+                            command=lambda: perform_name_search_function(name_var.get()))
+    find_button.grid(row=8, columnspan=2, pady=10)
+
     root.mainloop()
 
 if __name__ == "__main__":
@@ -1,29 +1,87 @@
+import argparse
 import pickle
 import numpy
 import os
+from numpy.lib.stride_tricks import sliding_window_view
 from music21 import note, stream, chord
-from keras.models import Sequential
-from keras.layers import Dense, Dropout, LSTM, BatchNormalization, Activation
+from keras.models import Sequential, Model
+from keras.layers import Dense, Dropout, LSTM, BatchNormalization, Activation, Input
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-def generate_learned_midi_file():
+try:
+    from BardicInspiration.corpus import corpus_exists, load_corpus, encode_songs
+    from BardicInspiration.model_registry import (ModelRegistry, LABELS, DEFAULT_REGISTRY_FOLDER, WEIGHTS_FILE,
+                                                  saved_weights_file)
+except ImportError:
+    from corpus import corpus_exists, load_corpus, encode_songs
+    from model_registry import ModelRegistry, LABELS, DEFAULT_REGISTRY_FOLDER, WEIGHTS_FILE, saved_weights_file
+
+def load_generation_corpus(corpus_folder="data"):
+    """Opens the integer corpus written by training. Older installs only have notes.pkl, so that is used instead"""
+    if corpus_exists(corpus_folder):
+        return load_corpus(corpus_folder)
+    with open(os.path.join(corpus_folder, "notes.pkl"), "rb") as file:
+        return encode_songs([pickle.load(file)])
+
+def generation_files(label=None, registry_folder=DEFAULT_REGISTRY_FOLDER):
+    """(corpus folder, weights file) to generate from. Without a label that is the single model lstm_network.py
+    --train makes, with one it is the label's current model in the registry. Weights saved as best_weights_loss.h5
+    before Keras 3 are used when there are no newer ones"""
+    if label is None:
+        return "data", saved_weights_file(WEIGHTS_FILE)
+    model_version = ModelRegistry(registry_folder).current(label)
+    if model_version is None:
+        raise FileNotFoundError(f"No trained model for '{label}'. Train it with: python lstm_network.py --label {label}")
+    return model_version.corpus_folder, saved_weights_file(model_version.weights_file)
+
+def weights_file_exists(label=None):
+    try:
+        return os.path.exists(generation_files(label)[1])
+    except FileNotFoundError:
+        return False
+
+def load_generation_model(label=None, registry_folder=DEFAULT_REGISTRY_FOLDER):
+    """Loads the saved notes and the trained network so new music can be generated from them. label picks which
+    label's model to use (see generation_files). Returns (lstm_model, net_input, pitch_names, note_vocab, input_scale),
+    input_scale being what training divided the note numbers by"""
+    corpus_folder, weights_file = generation_files(label, registry_folder)
+    corpus = load_generation_corpus(corpus_folder)
+
+    pitch_names = corpus.vocab
+    note_vocab = len(pitch_names)
+
+    net_input = prepare_token_sequence(corpus.tokens)
+    lstm_model = create_neural_network(numpy.reshape(net_input[:1], (1, -1, 1)), note_vocab, weights_file)
+
+    input_scale = None
+    if label is not None:  # A fine tuned version keeps the input scale of the version it started from
+        input_scale = ModelRegistry(registry_folder).current(label).input_scale()
+
+    return lstm_model, net_input, pitch_names, note_vocab, input_scale or note_vocab
+
+def generate_learned_midi_file(label=None):
     """This method will take the learning network at the code for notes and process them to create a new .midi file """
-    if not os.path.exists("best_weights_loss.h5"):
+    if not weights_file_exists(label):
         messagebox.showerror("Error", "No training weights file found.")
         return None, None, None, None, None
-    with open("data/notes.pkl", "rb") as file:
-        notes = pickle.load(file)
-    
-    pitch_names = sorted(set(item for item in notes))
-    note_vocab = len(set(notes))
 
-    net_input, norm_input = prepare_note_sequence(notes, pitch_names, note_vocab)
-    lstm_model = create_neural_network(norm_input, note_vocab)
-    music_output = create_music(lstm_model, net_input, pitch_names, note_vocab)
+    lstm_model, net_input, pitch_names, note_vocab, input_scale = load_generation_model(label)
+    music_output = create_music_incremental(lstm_model, net_input, pitch_names, note_vocab, input_scale=input_scale)
 
     return music_output, pitch_names, lstm_model, net_input, note_vocab
 
+def generate_learned_midi_files(count, label=None):
+    """Same as generate_learned_midi_file, but creates `count` pieces at once in a single batch"""
+    if not weights_file_exists(label):
+        messagebox.showerror("Error", "No training weights file found.")
+        return None, None, None, None, None
+
+    lstm_model, net_input, pitch_names, note_vocab, input_scale = load_generation_model(label)
+    music_outputs = create_music_batch(lstm_model, net_input, pitch_names, note_vocab, count, input_scale=input_scale)
+
+    return music_outputs, pitch_names, lstm_model, net_input, note_vocab
+
 def prepare_note_sequence(notes, pitch_names, note_vocab):
     """Prepares the notes that will be used in the new music that is created"""
     note_to_integer = dict((note, number) for number, note in enumerate(pitch_names)) 
@@ -46,7 +104,14 @@ def prepare_note_sequence(notes, pitch_names, note_vocab):
 
     return net_input, norm_input
 
-def create_neural_network(net_input, note_vocab):
+def prepare_token_sequence(tokens, number_of_notes=100):
+    """Same seed windows as prepare_note_sequence, but for already encoded tokens. The windows are a view over
+    the token array, so nothing is copied"""
+    if len(tokens) <= number_of_notes:
+        raise ValueError("Not enough notes to create music sequences")
+    return sliding_window_view(numpy.asarray(tokens), number_of_notes)[:-1]
+
+def create_neural_network(net_input, note_vocab, weights_file="best_weights_loss.weights.h5"):
     """Creates the network and creates new music based on the training weights"""
     lstm_model = Sequential()
     lstm_model.add(LSTM(
@@ -67,22 +132,55 @@ def create_neural_network(net_input, note_vocab):
     lstm_model.add(Activation('softmax'))
     lstm_model.compile(loss='categorical_crossentropy', optimizer='rmsprop')
 
-    lstm_model.load_weights("best_weights_loss.h5")
+    if weights_file:
+        lstm_model.load_weights(weights_file)
 
     return lstm_model
 
-def create_music(lstm_model, net_input, pitch_names, note_vocab):
-    """Creates music by using the LSTM model, note input, pitch input, and any other music information"""
+def create_stateful_network(lstm_model, note_vocab, batch_size=1):
+    """Builds a stateful copy of the trained network so notes can be fed in one at a time. The LSTM layers keep
+    their hidden state between calls, so each new note only costs a single timestep instead of the whole window.
+    Recurrent dropout is left out since it does nothing at inference and it lets Keras use the fused LSTM kernel"""
+    stateful_model = Sequential()
+    # Stateful layers need a fixed batch size. Any number of timesteps, so we can warm up on the whole seed
+    stateful_model.add(Input(batch_shape=(batch_size, None, 1)))
+    stateful_model.add(LSTM(512, stateful=True, return_sequences=True))
+    stateful_model.add(LSTM(512, return_sequences=True, stateful=True))
+    stateful_model.add(LSTM(512, stateful=True))
+    stateful_model.add(BatchNormalization())
+    stateful_model.add(Dropout(0.3))
+    stateful_model.add(Dense(256))
+    stateful_model.add(Activation('relu'))
+    stateful_model.add(BatchNormalization())
+    stateful_model.add(Dropout(0.3))
+    stateful_model.add(Dense(note_vocab))
+    stateful_model.add(Activation('softmax'))
+
+    stateful_model.set_weights(lstm_model.get_weights())
+
+    return stateful_model
+
+def reset_states(stateful_model):
+    """Clears the hidden state the LSTM layers kept from the last piece"""
+    for layer in stateful_model.layers:
+        if getattr(layer, 'stateful', False):
+            layer.reset_state()
+
+def create_music(lstm_model, net_input, pitch_names, note_vocab, length=500, input_scale=None):
+    """Creates music by using the LSTM model, note input, pitch input, and any other music information. The note
+    numbers are divided by input_scale (note_vocab unless it is set) like they were in training. Every note is
+    predicted from the last 100 notes only, re-running the whole window each time"""
+    input_scale = input_scale or note_vocab
     music_start = numpy.random.randint(0, len(net_input) - 1)
 
     integer_to_note = dict((number, note) for number, note in enumerate(pitch_names))
 
-    pattern = net_input[music_start]
+    pattern = numpy.asarray(net_input[music_start])
     pred_output = []
 
-    for note_index in range(500):
+    for note_index in range(length):
         prediction_input = numpy.reshape(pattern, (1, len(pattern), 1))
-        prediction_input = prediction_input / float(note_vocab)
+        prediction_input = prediction_input / float(input_scale)
 
         prediction = lstm_model.predict(prediction_input, verbose=0)
 
@@ -93,16 +191,91 @@ def create_music(lstm_model, net_input, pitch_names, note_vocab):
         result = integer_to_note[index]
         pred_output.append(result)
 
-        pattern.append(index)
-        pattern = pattern[1:len(pattern)]
+        # Slide the window along by one note
+        pattern = numpy.append(pattern[1:], index)
         
     # Convert Note objects to string representations
     pred_output = [str(note) for note in pred_output]
 
     return pred_output
 
-def create_midi(pred_output):
-    """Adds in notes, chords, or rests into the music"""
+def create_step_network(lstm_model, note_vocab):
+    """Builds a copy of the trained network that takes the LSTM states as inputs and hands the new states back,
+    instead of keeping them inside the layers like create_stateful_network does. That way every row of a batch can
+    belong to a different piece at a different point in its song. Inputs are [notes, h1, c1, h2, c2, h3, c3] and
+    outputs are [probabilities, h1, c1, h2, c2, h3, c3]"""
+    note_input = Input(shape=(None, 1))
+    state_inputs = [Input(shape=(512,)) for _ in range(6)]
+
+    layer_output, h1, c1 = LSTM(512, return_sequences=True, return_state=True)(note_input, initial_state=state_inputs[0:2])
+    layer_output, h2, c2 = LSTM(512, return_sequences=True, return_state=True)(layer_output, initial_state=state_inputs[2:4])
+    layer_output, h3, c3 = LSTM(512, return_state=True)(layer_output, initial_state=state_inputs[4:6])
+    layer_output = BatchNormalization()(layer_output)
+    layer_output = Dropout(0.3)(layer_output)
+    layer_output = Dense(256)(layer_output)
+    layer_output = Activation('relu')(layer_output)
+    layer_output = BatchNormalization()(layer_output)
+    layer_output = Dropout(0.3)(layer_output)
+    layer_output = Dense(note_vocab)(layer_output)
+    layer_output = Activation('softmax')(layer_output)
+
+    step_model = Model([note_input] + state_inputs, [layer_output, h1, c1, h2, c2, h3, c3])
+    step_model.set_weights(lstm_model.get_weights())
+
+    return step_model
+
+def sample_notes(predictions):
+    """Picks one note index for every row of predictions, weighted by its probabilities. This does the same as
+    calling numpy.random.choice on each row, but for the whole batch at once"""
+    cumulative = numpy.cumsum(predictions, axis=1)
+    # Scale by the row total so float32 rounding in the softmax can't push us past the last note
+    draws = numpy.random.random_sample((len(predictions), 1)) * cumulative[:, -1:]
+    indexes = (cumulative <= draws).sum(axis=1)
+    return numpy.minimum(indexes, predictions.shape[1] - 1)
+
+def create_music_batch(lstm_model, net_input, pitch_names, note_vocab, count, length=500, stateful_model=None,
+                       input_scale=None):
+    """Creates `count` pieces of music at the same time. Every piece gets its own random seed pattern, then one
+    batched step of a stateful copy of the network predicts the next note for all of them. A stateful_model made
+    by create_stateful_network with batch_size=count can be passed in to skip rebuilding it. input_scale is the
+    same as for create_music.
+    The first note is predicted from the same 100 note window as create_music, but after that the LSTM state holds
+    the seed and every note generated since, where create_music forgets all but the last 100 notes. So the pieces
+    match what the network gives for the whole history so far, not what create_music would make from the same seed"""
+    input_scale = input_scale or note_vocab
+    music_starts = numpy.random.randint(0, len(net_input) - 1, size=count)
+
+    if stateful_model is None:
+        stateful_model = create_stateful_network(lstm_model, note_vocab, batch_size=count)
+    else:
+        reset_states(stateful_model)
+
+    patterns = numpy.array([net_input[music_start] for music_start in music_starts])
+    seed_input = numpy.reshape(patterns, (count, patterns.shape[1], 1)) / float(input_scale)
+
+    # The first prediction sees exactly the same window as create_music does
+    predictions = stateful_model(seed_input.astype('float32'), training=False).numpy()
+    pred_indexes = numpy.empty((count, length), dtype=int)
+
+    for note_index in range(length):
+        indexes = sample_notes(predictions)
+        pred_indexes[:, note_index] = indexes
+
+        if note_index < length - 1:
+            step_input = numpy.reshape(indexes / float(input_scale), (count, 1, 1)).astype('float32')
+            predictions = stateful_model(step_input, training=False).numpy()
+
+    pitch_array = numpy.array(pitch_names, dtype=object)
+    return [[str(pitch) for pitch in pitch_array[row]] for row in pred_indexes]
+
+def create_music_incremental(lstm_model, net_input, pitch_names, note_vocab, length=500, input_scale=None):
+    """Creates music like create_music, but warms a stateful copy of the network on the seed pattern once and then
+    feeds it one note per step instead of re-running the full 100 note window for every note. The network remembers
+    the whole piece instead of the last 100 notes (see create_music_batch)"""
+    return create_music_batch(lstm_model, net_input, pitch_names, note_vocab, 1, length, input_scale=input_scale)[0]
+
+def write_midi(pred_output, output_file_path):
+    """Adds in notes, chords, or rests into the music and writes it to output_file_path"""
     output_notes = []
     offset = 0
 
@@ -132,14 +305,28 @@ def create_midi(pred_output):
 
     midi_stream = stream.Stream(output_notes)
 
-    output_folder = "output"
-    if not os.path.exists(output_folder):
+    output_folder = os.path.dirname(output_file_path)
+    if output_folder and not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    output_file_path = os.path.join(output_folder, "output.mid")
     midi_stream.write('midi', fp=output_file_path)
 
-    messagebox.showinfo(f"Success!", "MIDI file generated: {output_file_path}")
+    return output_file_path
+
+def create_midi(pred_output, output_file_name="output.mid"):
+    """Writes the generated music to the output folder and lets the user know where it went"""
+    output_file_path = write_midi(pred_output, os.path.join("output", output_file_name))
+
+    messagebox.showinfo("Success!", f"MIDI file generated: {output_file_path}")
+
+def create_midi_files(pred_outputs):
+    """Writes one MIDI file per generated piece (output_1.mid, output_2.mid, ...) and shows a single message"""
+    output_file_paths = []
+    for number, pred_output in enumerate(pred_outputs, start=1):
+        output_file_paths.append(write_midi(pred_output, os.path.join("output", f"output_{number}.mid")))
+
+    messagebox.showinfo("Success!", f"{len(output_file_paths)} MIDI files generated in: output")
+    return output_file_paths
 
 def post_process_music(midi_stream, output_file_path):
     """Write the MIDI stream to a file"""
@@ -148,5 +335,16 @@ def post_process_music(midi_stream, output_file_path):
     messagebox.showinfo("Success", "Moving selected songs completed successfully.")
 
 if __name__ == '__main__':
-    music_output, pitch_names, lstm_model, net_input, note_vocab = generate_learned_midi_file()
-    create_midi(music_output)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create new music with the trained network")
+    parser.add_argument("--count", type=int, default=1, help="number of pieces to generate in one batch")
+    parser.add_argument("--label", choices=LABELS, default=None,
+                        help="use this label's model from the model registry instead of best_weights_loss.weights.h5")
+    args = parser.parse_args()
+
+    if args.count > 1:
+        music_outputs, pitch_names, lstm_model, net_input, note_vocab = generate_learned_midi_files(args.count, args.label)
+        if music_outputs is not None:
+            create_midi_files(music_outputs)
+    else:
+        music_output, pitch_names, lstm_model, net_input, note_vocab = generate_learned_midi_file(args.label)
+        create_midi(music_output)
\ No newline at end of file
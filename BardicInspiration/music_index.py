@@ -0,0 +1,77 @@
+"""An in-memory index of the dictionary process_csv returns, so a search is a few bitwise ANDs instead of checking
+every song. Songs are numbered in catalog order, and the index keeps
+    one bitset per label (lower case), key signature, time signature and instrument, with bit n set for song n
+    the tempos sorted, with the song each one belongs to, so a tempo range is two binary searches
+A search ANDs the bitsets of the chosen values (and the tempo range's) together and reads the song numbers back out
+of the result, which keeps them in catalog order. The bitsets are packed numpy arrays, 1 bit per song."""
+
+import numpy
+
+try:
+    from BardicInspiration.catalog_snapshot import tempo_range
+except ImportError:
+    from catalog_snapshot import tempo_range
+
+def value_bitsets(values, song_count):
+    """{value: packed bitset of the songs that have it} for a list of (song number, value)"""
+    song_numbers = {}
+    for song_number, value in values:
+        song_numbers.setdefault(value, []).append(song_number)
+    bitsets = {}
+    for value, numbers in song_numbers.items():
+        bits = numpy.zeros(song_count, dtype=bool)
+        bits[numbers] = True
+        bitsets[value] = numpy.packbits(bits)
+    return bitsets
+
+class MusicIndex:
+    """Answers music_search for a process_csv dictionary"""
+    def __init__(self, music_info):
+        self.songs = list(music_info)
+        attributes = list(music_info.values())
+        count = len(self.songs)
+
+        self.labels = value_bitsets(((number, song['Label'].lower()) for number, song in enumerate(attributes)), count)
+        self.keys = value_bitsets(((number, song['Key Signature']) for number, song in enumerate(attributes)), count)
+        self.times = value_bitsets(((number, song['Time Signature']) for number, song in enumerate(attributes)), count)
+        self.instruments = value_bitsets(((number, instrument) for number, song in enumerate(attributes)
+                                          for instrument in set(song['Instruments'])), count)
+
+        tempos = numpy.array([song['Tempo'] for song in attributes], dtype=float)
+        self.tempo_order = numpy.argsort(tempos, kind='stable')
+        self.sorted_tempos = tempos[self.tempo_order]
+        self.empty = numpy.packbits(numpy.zeros(count, dtype=bool))
+
+    def __len__(self):
+        return len(self.songs)
+
+    def tempo_bitset(self, min_tempo, max_tempo):
+        """Bitset of the songs with min_tempo <= tempo <= max_tempo"""
+        start = numpy.searchsorted(self.sorted_tempos, min_tempo, side='left')
+        end = numpy.searchsorted(self.sorted_tempos, max_tempo, side='right')
+        bits = numpy.zeros(len(self.songs), dtype=bool)
+        bits[self.tempo_order[start:end]] = True
+        return numpy.packbits(bits)
+
+    def search(self, selected_tempo, selected_time, selected_instrument, selected_key, selected_label):
+        """Names of the songs that match, in catalog order. Takes the same choices as music_search, and selected_tempo
+        can also be a (min, max) tuple"""
+        bitsets = []
+        if selected_instrument != "Any":
+            bitsets.append(self.instruments.get(selected_instrument, self.empty))
+        if selected_time != "Any":
+            bitsets.append(self.times.get(selected_time, self.empty))
+        if selected_key != "Any":
+            bitsets.append(self.keys.get(selected_key, self.empty))
+        if selected_label != "Any":
+            bitsets.append(self.labels.get(selected_label.lower(), self.empty))
+        if selected_tempo != "Any":
+            bitsets.append(self.tempo_bitset(*tempo_range(selected_tempo)))
+
+        if not bitsets:
+            return list(self.songs)
+        matches = bitsets[0]
+        for bitset in bitsets[1:]:
+            matches = matches & bitset
+        song_numbers = numpy.flatnonzero(numpy.unpackbits(matches, count=len(self.songs)))
+        return [self.songs[number] for number in song_numbers]
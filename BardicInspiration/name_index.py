@@ -0,0 +1,182 @@
+"""Finds songs by name. Names are compared in lower case with everything but letters and digits turned into single
+spaces, so "tavern tarren" finds "World of Warcraft - Forsaken Tavern_ Tarren Mill". Results are ranked shortest
+name first (the query is more of the name), then in catalog order, and the index numbers the songs in that order
+(their rank). For each three-byte piece (trigram) of the names' UTF-8 it keeps the sorted ranks of the songs that
+have it:
+    trigrams    every different trigram, sorted
+    offsets     where each trigram's ranks start in postings
+    postings    the ranks of every trigram, one after the other
+A name holds a query only if it has all of the query's trigrams. A lookup goes through the shortest of the query's
+lists from the start, keeps the ranks that are also in the other lists and checks those names, and stops as soon as
+it has enough, so even a query that a hundred thousand songs match only looks at the first few. Names are padded
+with a space at each end, so the trigrams also mark where words start and end. To try it:
+    python name_index.py "tavern" -n 20
+    python name_index.py "zelda bolreo"  # no song has that, so the closest names are listed"""
+
+import argparse
+import re
+
+import numpy
+
+try:
+    from BardicInspiration.feature_catalog import read_rows
+except ImportError:
+    from feature_catalog import read_rows
+
+WORD = re.compile(r'[^\W_]+')
+MIN_SIMILARITY = 0.3  # The share of the query's trigrams a fuzzy match must have
+MAX_FUZZY_POSTINGS = 20000  # Ranks fuzzy reads out of the query's rarest trigrams
+MAX_FUZZY_CANDIDATES = 1024  # Names fuzzy counts every shared trigram of
+
+def normalize(name):
+    return ' '.join(WORD.findall(name.casefold()))
+
+def trigram_codes(data):
+    """The trigram starting at each byte of a uint8 array (but the last two) as one number"""
+    data = data.astype(numpy.int32)
+    return (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+
+def run_starts(values):
+    """Positions in a sorted array where each different value starts"""
+    if not len(values):
+        return numpy.zeros(0, dtype=numpy.int64)
+    return numpy.flatnonzero(numpy.concatenate(([True], values[1:] != values[:-1])))
+
+def query_codes(text):
+    return numpy.unique(trigram_codes(numpy.frombuffer(text.encode('utf-8'), dtype=numpy.uint8)))
+
+class NameIndex:
+    """Trigram index of a list of song names, see the module docstring"""
+    def __init__(self, songs):
+        self.songs = list(songs)
+        texts = [normalize(song) for song in self.songs]
+        encoded = [f" {text} ".encode('utf-8') for text in texts]
+        lengths = numpy.fromiter(map(len, encoded), dtype=numpy.int64, count=len(encoded))
+        self.by_rank = numpy.lexsort((numpy.arange(len(encoded)), lengths))  # Song number of each rank
+        self.texts = [texts[number] for number in self.by_rank]
+        ranks = numpy.empty(len(encoded), dtype=numpy.int64)
+        ranks[self.by_rank] = numpy.arange(len(encoded))
+
+        codes = trigram_codes(numpy.frombuffer(b''.join(encoded), dtype=numpy.uint8))
+        numbers = numpy.repeat(numpy.arange(len(encoded), dtype=numpy.int64), lengths)[:len(codes)]
+        inside = numpy.arange(len(codes)) + 2 < numpy.cumsum(lengths)[numbers]  # Not running into the next name
+        # Sorting (trigram, rank) pairs puts each trigram's songs together and in order. A name with the same trigram
+        # twice gives the same pair twice, and only the first is kept
+        pairs = (codes[inside].astype(numpy.int64) << 32) | ranks[numbers[inside]]
+        pairs.sort()
+        pairs = pairs[run_starts(pairs)]
+        self.postings = (pairs & 0xFFFFFFFF).astype(numpy.int32)
+        codes = (pairs >> 32).astype(numpy.int32)
+        starts = run_starts(codes)
+        self.trigrams = codes[starts]
+        self.offsets = numpy.append(starts, len(pairs))
+
+    def __len__(self):
+        return len(self.songs)
+
+    def names(self, ranks):
+        return [self.songs[self.by_rank[rank]] for rank in ranks]
+
+    def posting(self, code):
+        """Sorted ranks of the songs with the trigram code"""
+        number = numpy.searchsorted(self.trigrams, code)
+        if number == len(self.trigrams) or self.trigrams[number] != code:
+            return self.postings[:0]
+        return self.postings[self.offsets[number]:self.offsets[number + 1]]
+
+    def first_between(self, first, last, limit):
+        """The first limit ranks of the songs with any trigram code from first to last"""
+        start = numpy.searchsorted(self.trigrams, first, side='left')
+        end = numpy.searchsorted(self.trigrams, last, side='right')
+        # The first limit of all of them are among the first limit of each
+        heads = [self.postings[self.offsets[number]:min(self.offsets[number] + limit, self.offsets[number + 1])]
+                 for number in range(start, end)]
+        return numpy.unique(numpy.concatenate(heads))[:limit].tolist() if heads else []
+
+    def first_in_all(self, lists, limit, accept=None):
+        """The first limit ranks that are in every list and that accept (if given) lets through"""
+        lists = sorted(lists, key=len)
+        found, start, chunk = [], 0, max(4 * limit, 64)
+        while start < len(lists[0]) and len(found) < limit:
+            ranks = lists[0][start:start + chunk]
+            for other in lists[1:]:
+                positions = numpy.minimum(numpy.searchsorted(other, ranks), len(other) - 1)
+                ranks = ranks[other[positions] == ranks]
+            found.extend(rank for rank in ranks.tolist() if accept is None or accept(rank))
+            start += chunk
+            chunk *= 2
+        return found[:limit]
+
+    def find(self, query, limit=20):
+        """Names holding query, shortest first, then in catalog order. A query of one or two letters finds the names
+        with a word starting with them"""
+        text = normalize(query)
+        if not text or limit <= 0:
+            return []
+        data = text.encode('utf-8')
+        if len(data) == 1:
+            code = (ord(' ') << 16) | (data[0] << 8)
+            return self.names(self.first_between(code, code | 0xFF, limit))
+        if len(data) == 2:
+            return self.names(self.first_in_all([self.posting(query_codes(' ' + text)[0])], limit))
+        lists = [self.posting(code) for code in query_codes(text)]
+        if len(data) == 3:
+            return self.names(self.first_in_all(lists, limit))
+        # Having every trigram doesn't mean having them in order, so the names are checked too
+        return self.names(self.first_in_all(lists, limit, lambda rank: text in self.texts[rank]))
+
+    def fuzzy(self, query, limit=20, min_similarity=MIN_SIMILARITY):
+        """The names that have the largest share of the query's trigrams, for a query that is misspelled or has the
+        words in another order. Names sharing as many come shortest first, then in catalog order.
+        Only the lists of the query's rarest trigrams are read, up to MAX_FUZZY_POSTINGS ranks, and the names in most
+        of them are then looked up in the other lists, best first, until no name left could make the results. When
+        every list fits, as it does for a catalog of a few thousand songs, this finds the same names as reading all
+        of them. In a bigger one a name that only shares the query's most common trigrams can be missed"""
+        text = normalize(query)
+        if not text or limit <= 0:
+            return []
+        lists = sorted((self.posting(code) for code in query_codes(f" {text} ")), key=len)
+        needed = max(int(numpy.ceil(min_similarity * len(lists))), 1)
+        # The common trigrams are most of the ranks to read and say the least about which name was meant
+        rare = max(int(numpy.searchsorted(numpy.cumsum([len(ranks) for ranks in lists]), MAX_FUZZY_POSTINGS,
+                                          side='right')), 1)
+        common = lists[rare:]
+        candidates, shared = numpy.unique(numpy.concatenate(lists[:rare])[:MAX_FUZZY_POSTINGS], return_counts=True)
+        order = numpy.argsort(-shared, kind='stable')[:max(MAX_FUZZY_CANDIDATES, limit)]
+        candidates, shared = candidates[order], shared[order]
+
+        # A name can't share more than its rare trigrams and all the common ones, so once that is no more than the
+        # limit-th best count so far, the names after it can't make the results
+        counted, least, chunk = 0, 0, max(4 * limit, 64)
+        while counted < len(candidates) and shared[counted] + len(common) > least:
+            block = slice(counted, counted + chunk)
+            for ranks in common:
+                positions = numpy.minimum(numpy.searchsorted(ranks, candidates[block]), len(ranks) - 1)
+                shared[block] += ranks[positions] == candidates[block]
+            counted = min(counted + chunk, len(candidates))
+            if counted >= limit:
+                least = numpy.partition(shared[:counted], counted - limit)[counted - limit]
+            chunk *= 2
+        candidates, shared = candidates[:counted], shared[:counted]
+        keep = shared >= needed
+        candidates, shared = candidates[keep], shared[keep]
+        return self.names(candidates[numpy.lexsort((candidates, -shared))[:limit]])
+
+    def search(self, query, limit=20):
+        """The names holding query or, when there are none, the names most like it"""
+        return self.find(query, limit) or self.fuzzy(query, limit)
+
+def main():
+    parser = argparse.ArgumentParser(description="Find songs in the catalog by name")
+    parser.add_argument("query", help="part of a song name")
+    parser.add_argument("-n", type=int, default=20, help="how many songs to list")
+    parser.add_argument("--csv", default="music_features.csv", help="features CSV")
+    parser.add_argument("--fuzzy", action="store_true", help="list the names most like the query, even if some hold it")
+    args = parser.parse_args()
+
+    index = NameIndex(dict.fromkeys(row['song_name'] for row in read_rows(args.csv)))
+    for song in (index.fuzzy(args.query, args.n) if args.fuzzy else index.search(args.query, args.n)):
+        print(song)
+
+if __name__ == "__main__":
+    main()
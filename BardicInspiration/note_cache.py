@@ -0,0 +1,120 @@
+"""Keeps the notes parsed out of each MIDI file on disk so training doesn't have to parse the same song twice.
+Entries are keyed by a hash of the file's contents and PARSER_VERSION, so renaming a file still hits the cache
+and changing the file (or the parser) misses it. When the cache grows past its size cap, the least recently
+used entries are removed first. To prune it by hand:
+    python note_cache.py prune --max-mb 100"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import tempfile
+
+PARSER_VERSION = 1  # Bump this whenever parse_midi_file changes what it pulls out of a file
+DEFAULT_CACHE_FOLDER = os.path.join("data", "note_cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def file_hash(file_path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class NoteCache:
+    """A folder of pickled note lists, one per parsed MIDI file"""
+    def __init__(self, cache_folder=DEFAULT_CACHE_FOLDER, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+
+    def key(self, file_path):
+        """Cache key for a MIDI file: its content hash combined with the parser version"""
+        return hashlib.sha256(f"{PARSER_VERSION}:{file_hash(file_path)}".encode('utf-8')).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_folder, key + ".pkl")
+
+    def get(self, key):
+        """Returns the cached notes for key, or None if they aren't cached"""
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path, 'rb') as entry:
+                notes = pickle.load(entry)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        try:
+            os.utime(entry_path)  # Mark the entry as recently used
+        except OSError:
+            pass  # Another process pruned it after we read it, the notes are still good
+        return notes
+
+    def put(self, key, notes):
+        """Stores the notes for key. The entry is written to a temporary file first so a crash can't leave half of it"""
+        if not os.path.exists(self.cache_folder):
+            os.makedirs(self.cache_folder)
+        handle, temp_path = tempfile.mkstemp(dir=self.cache_folder, suffix=".tmp")
+        try:
+            with os.fdopen(handle, 'wb') as entry:
+                pickle.dump(notes, entry)
+            os.replace(temp_path, self.entry_path(key))
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def entries(self):
+        """(last used time, size, path) of every entry, oldest first. Entries removed while this runs are left out"""
+        try:
+            names = os.listdir(self.cache_folder)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if name.endswith(".pkl"):
+                try:
+                    stat = os.stat(os.path.join(self.cache_folder, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(self.cache_folder, name)))
+        return sorted(entries)
+
+    def size(self):
+        """Total bytes used by the cache"""
+        return sum(size for _, size, _ in self.entries())
+
+    def prune(self, max_bytes=None):
+        """Removes the least recently used entries until the cache fits in max_bytes (the cache's cap by default).
+        Returns how many entries were removed"""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry_path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+                removed += 1
+            except FileNotFoundError:
+                pass  # Already removed by another process pruning at the same time
+            total -= size
+        return removed
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the cache of parsed MIDI notes")
+    parser.add_argument("command", choices=["info", "prune", "clear"])
+    parser.add_argument("--folder", default=DEFAULT_CACHE_FOLDER, help="cache folder")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024), help="size to prune down to")
+    args = parser.parse_args()
+
+    cache = NoteCache(args.folder, int(args.max_mb * 1024 * 1024))
+    if args.command == "info":
+        print(f"{len(cache.entries())} entries, {cache.size() / (1024 * 1024):.1f} MB in {args.folder}")
+    elif args.command == "prune":
+        print(f"Removed {cache.prune()} entries")
+    else:
+        print(f"Removed {cache.prune(0)} entries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Finds the songs most like a given song, or most like a description ("about 90 bpm, A minor, mostly flutes"), for
+when music_search's exact matches find nothing or far too much. Each song of music_features.csv becomes a vector of
+    tempo           1 number, log2 of the tempo / 120 (0 when unknown)
+    key             3 numbers: the key's place on the circle of fifths as a point on a circle, and 0.5 for minor
+    meter           4 numbers, one for each of duple, triple, compound and other time signatures
+    instruments     11 numbers, the share of each instrument family among the song's instruments
+    pitch_classes   12 numbers, the share of the song's notes on each pitch class (even when unknown)
+each part multiplied by its WEIGHTS, and "more like this" is the songs at the smallest distance. The distances to
+every song are worked out at once with a matrix product, which takes about 9 ms for a million songs on one core.
+That is mostly reading the 124 MB of vectors, and nothing here skips songs yet: lower bounds from a few principal
+directions of each block were tried, but with 31 numbers per song they need more than half of them before they rule
+out most songs, so they saved little. If scipy is installed, tree=True also builds a k-d tree for searches on whole
+vectors. With this many numbers per song the tree only wins on small or tightly grouped catalogs, so
+benchmarks/bench_similarity.py is worth running first. The index is built from the catalog snapshot (see
+catalog_snapshot), the same as searching. To try it:
+    python similarity_index.py "Song name" -k 10
+    python similarity_index.py --tempo 90 --key Am --instruments Flute"""
+
+import argparse
+import math
+
+import numpy
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+try:
+    from BardicInspiration.catalog_snapshot import catalog_entry, load_catalog
+    from BardicInspiration.midi_scanner import KEY_SIGNATURES
+    from BardicInspiration.instrument_int_to_string import FAMILIES, PROGRAM_NUMBER, program_family
+except ImportError:
+    from catalog_snapshot import catalog_entry, load_catalog
+    from midi_scanner import KEY_SIGNATURES
+    from instrument_int_to_string import FAMILIES, PROGRAM_NUMBER, program_family
+
+METERS = ("duple", "triple", "compound", "other")
+BLOCKS = (("tempo", 1), ("key", 3), ("meter", 4), ("instruments", len(FAMILIES)), ("pitch_classes", 12))
+WEIGHTS = {"tempo": 1.0, "key": 1.0, "meter": 0.7, "instruments": 1.0, "pitch_classes": 1.5}
+KEYS = dict((name, fifths_and_mode) for fifths_and_mode, name in KEY_SIGNATURES.items())
+
+def block_slices():
+    """{block name: slice of the vector it fills}"""
+    slices, start = {}, 0
+    for name, size in BLOCKS:
+        slices[name] = slice(start, start + size)
+        start += size
+    return slices
+
+SLICES = block_slices()
+DIMENSIONS = sum(size for _, size in BLOCKS)
+
+def tempo_part(tempo):
+    if tempo is None or tempo <= 0:
+        return [0.0]
+    return [min(max(math.log2(tempo / 120.0), -2.0), 2.0)]
+
+def key_part(key):
+    if key not in KEYS:
+        return [0.0, 0.0, 0.0]
+    fifths, mode = KEYS[key]  # Sharps (or flats, below 0) in the key signature, so A minor sits with C major
+    angle = 2 * math.pi * fifths / 12
+    return [math.cos(angle), math.sin(angle), 0.5 * mode]
+
+def meter_part(time_signature):
+    part = [0.0] * len(METERS)
+    try:
+        numerator = int(str(time_signature).split('/')[0])
+    except ValueError:
+        return part
+    if numerator in (2, 4):
+        part[0] = 1.0
+    elif numerator == 3:
+        part[1] = 1.0
+    elif numerator in (6, 9, 12):
+        part[2] = 1.0
+    else:
+        part[3] = 1.0
+    return part
+
+def instrument_families(instruments):
+    """Family names of a CSV instruments field, which holds either names joined by ';' or, in a catalog extracted
+    before the names were, a list of program numbers"""
+    text = instruments.strip()
+    if text.startswith('['):
+        return [program_family(int(program)) for program in PROGRAM_NUMBER.findall(text)]
+    return [name.strip() if name.strip() in FAMILIES else "Other" for name in text.split(';') if name.strip()]
+
+def instrument_part(families):
+    part = [0.0] * len(FAMILIES)
+    for family in families:
+        part[FAMILIES.index(family if family in FAMILIES else "Other")] += 1.0
+    total = sum(part)
+    return [count / total for count in part] if total else part
+
+def pitch_class_part(pitch_classes):
+    total = sum(pitch_classes) if pitch_classes else 0
+    if not total:
+        return [1.0 / 12] * 12  # Nothing known about the notes, so no pitch class stands out
+    return [count / total for count in pitch_classes]
+
+def weighted_vector(parts):
+    """Joins {block name: numbers} into one vector, weighting each block"""
+    vector = numpy.zeros(DIMENSIONS, dtype=numpy.float32)
+    for name, values in parts.items():
+        vector[SLICES[name]] = numpy.asarray(values, dtype=numpy.float32) * WEIGHTS[name]
+    return vector
+
+def catalog_vector(attributes):
+    """The vector of one song of the process_csv dictionary"""
+    tempo = attributes['Tempo']
+    return weighted_vector({"tempo": tempo_part(tempo if tempo > 0 else None),
+                            "key": key_part(attributes['Key Signature']),
+                            "meter": meter_part(attributes['Time Signature']),
+                            "instruments": instrument_part(instrument_families(';'.join(attributes['Instruments']))),
+                            "pitch_classes": pitch_class_part(attributes.get('Pitch Classes'))})
+
+def song_vector(row):
+    """The vector of one music_features.csv row"""
+    return catalog_vector(catalog_entry(row))
+
+def target_vector(tempo=None, key=None, time_signature=None, instruments=None, pitch_classes=None):
+    """(vector, block names) describing the songs wanted. Only the blocks that were given are compared, so
+    target_vector(tempo=90) finds the songs closest to 90 bpm whatever else they are like. instruments is a list of
+    family names and pitch_classes 12 counts"""
+    parts = {}
+    if tempo is not None:
+        parts["tempo"] = tempo_part(tempo)
+    if key is not None:
+        parts["key"] = key_part(key)
+    if time_signature is not None:
+        parts["meter"] = meter_part(time_signature)
+    if instruments is not None:
+        parts["instruments"] = instrument_part(instruments)
+    if pitch_classes is not None:
+        parts["pitch_classes"] = pitch_class_part(pitch_classes)
+    return weighted_vector(parts), list(parts)
+
+class SimilarityIndex:
+    """The vectors of a catalog's songs, one row per song in catalog order"""
+    def __init__(self, songs, vectors, tree=False):
+        self.songs = list(songs)
+        self.positions = dict((song, number) for number, song in enumerate(self.songs))
+        self.vectors = numpy.ascontiguousarray(vectors, dtype=numpy.float32).reshape(-1, DIMENSIONS)
+        # Squared length of each song's part of every block, so a search on some of the blocks doesn't need the others
+        self.block_norms = numpy.stack([(self.vectors[:, SLICES[name]] ** 2).sum(axis=1) for name, _ in BLOCKS], axis=1)
+        self.norms = self.block_norms.sum(axis=1)
+        self.tree = None
+        if tree:
+            if cKDTree is None:
+                raise ImportError("tree=True needs scipy. Install it with pip install scipy, or search without the tree")
+            self.tree = cKDTree(self.vectors)
+
+    @classmethod
+    def from_catalog(cls, music_info, tree=False):
+        """Builds the index from the process_csv dictionary"""
+        return cls(list(music_info), numpy.array([catalog_vector(attributes) for attributes in music_info.values()],
+                                                 dtype=numpy.float32), tree)
+
+    @classmethod
+    def from_rows(cls, rows, tree=False):
+        """Builds the index from music_features.csv rows. A song listed twice keeps its last row, like process_csv"""
+        return cls.from_catalog(dict((row['song_name'], catalog_entry(row)) for row in rows), tree)
+
+    @classmethod
+    def from_csv(cls, csv_file, tree=False):
+        """Builds the index from the catalog snapshot, which load_catalog keeps up to date"""
+        return cls.from_catalog(load_catalog(csv_file), tree)
+
+    def __len__(self):
+        return len(self.songs)
+
+    def nearest(self, vector, k=10, blocks=None, exclude=None):
+        """The k songs closest to vector as (song name, distance), closest first. blocks limits the comparison to
+        some of the BLOCKS (all of them by default) and exclude is a song number to leave out"""
+        count = min(k + (exclude is not None), len(self.songs))
+        if count == 0:
+            return []
+        if self.tree is not None and blocks is None:
+            distances, numbers = self.tree.query(vector, k=count)
+            found = list(zip(numpy.atleast_1d(numbers), numpy.atleast_1d(distances)))
+        else:
+            if blocks is None:
+                mask, query, norms = None, numpy.asarray(vector, dtype=numpy.float32), self.norms
+            else:
+                mask = numpy.zeros(DIMENSIONS, dtype=numpy.float32)
+                block_mask = numpy.zeros(len(BLOCKS), dtype=numpy.float32)
+                for number, (name, _) in enumerate(BLOCKS):
+                    if name in blocks:
+                        mask[SLICES[name]] = 1.0
+                        block_mask[number] = 1.0
+                query = vector * mask
+                norms = self.block_norms @ block_mask
+            # The squared distances less the query's own squared length, which is the same for every song. Worked
+            # out in place, as at a million songs the time goes on reading and writing memory
+            squared = self.vectors @ (-2 * query)
+            squared += norms
+            if exclude is not None:
+                squared[exclude] = numpy.inf
+            # That sum rounds badly for songs very close to the query, so it only picks a few more candidates than
+            # needed, and their distances are then worked out exactly
+            candidates = min(2 * count + 16, len(squared))
+            if candidates < len(squared):
+                numbers = numpy.argpartition(squared, candidates - 1)[:candidates]
+            else:
+                numbers = numpy.arange(candidates)
+            differences = self.vectors[numbers].astype(numpy.float64) - query
+            if mask is not None:
+                differences *= mask
+            exact = numpy.sqrt((differences ** 2).sum(axis=1))
+            exact[numbers == exclude] = numpy.inf
+            order = numpy.lexsort((numbers, exact))[:count]
+            found = [(numbers[position], exact[position]) for position in order]
+        return [(self.songs[number], float(distance)) for number, distance in found if number != exclude][:k]
+
+    def similar_to(self, song_name, k=10):
+        """The k songs most like song_name, leaving out the song itself"""
+        number = self.positions[song_name]
+        return self.nearest(self.vectors[number], k, exclude=number)
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the songs most like a song, or most like a description")
+    parser.add_argument("song", nargs="?", help="name of a song in the catalog")
+    parser.add_argument("-k", type=int, default=10, help="how many songs to list")
+    parser.add_argument("--csv", default="music_features.csv", help="features CSV")
+    parser.add_argument("--tempo", type=float, help="tempo in beats per minute")
+    parser.add_argument("--key", help="key signature, like C or F#m")
+    parser.add_argument("--time-signature", help="time signature, like 3/4")
+    parser.add_argument("--instruments", nargs="+", choices=FAMILIES, help="instrument families")
+    args = parser.parse_args()
+
+    index = SimilarityIndex.from_csv(args.csv)
+    if args.song:
+        if args.song not in index.positions:
+            parser.error(f"'{args.song}' is not in {args.csv}")
+        results = index.similar_to(args.song, args.k)
+    else:
+        vector, blocks = target_vector(args.tempo, args.key, args.time_signature, args.instruments)
+        if not blocks:
+            parser.error("give a song or at least one of --tempo, --key, --time-signature and --instruments")
+        results = index.nearest(vector, args.k, blocks)
+    for song, distance in results:
+        print(f"{distance:6.3f}  {song}")
+
+if __name__ == "__main__":
+    main()
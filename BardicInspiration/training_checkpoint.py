@@ -0,0 +1,119 @@
+"""Saves training progress while lstm_network.train runs, so a run that gets killed can carry on from its last
+finished epoch instead of starting over. A checkpoint folder holds
+    checkpoint.npz     the model's variables (weights and the dropout layers' random state), the optimizer's
+                       variables, the best weights so far, the last finished epoch, the batch sampler's seed and
+                       how many batches it has handed out, and the best-so-far tracker
+    best_weights.npz   the weights of the epoch with the loss closest to the target so far, while training runs
+Keeping the best weights on disk means training doesn't hold a second copy of the model in memory. best_weights.npz
+can move on to a later epoch than the last checkpoint, so each checkpoint keeps its own copy of the best weights and
+resuming puts that copy back. Both files are written next to their final name and then swapped in, so a crash in the
+middle of a write leaves the previous checkpoint as it was. To continue a run:
+    python lstm_network.py --train "MIDI Music" --resume"""
+
+import json
+import os
+
+import numpy
+from keras.callbacks import Callback
+
+try:
+    from BardicInspiration.corpus import replace_file
+except ImportError:
+    from corpus import replace_file
+
+DEFAULT_CHECKPOINT_FOLDER = os.path.join("data", "checkpoints")
+CHECKPOINT_FILE = "checkpoint.npz"
+BEST_WEIGHTS_FILE = "best_weights.npz"
+
+def save_arrays(path, arrays, **extra):
+    """Writes a list of arrays (plus any extra named arrays) to an .npz file, swapping it in once it is complete"""
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    named_arrays = dict((f"array_{number}", numpy.asarray(array)) for number, array in enumerate(arrays))
+    named_arrays.update(extra)
+    replace_file(path, lambda file: numpy.savez(file, **named_arrays))
+
+def load_arrays(path):
+    """Reads a file written by save_arrays back into (list of arrays, dict of the extra arrays)"""
+    with numpy.load(path) as npz_file:
+        count = sum(1 for name in npz_file.files if name.startswith("array_"))
+        arrays = [npz_file[f"array_{number}"] for number in range(count)]
+        extra = dict((name, npz_file[name]) for name in npz_file.files if not name.startswith("array_"))
+    return arrays, extra
+
+def assign_arrays(variables, arrays, what):
+    """Copies saved arrays into variables, after checking they belong to a network of the same shape"""
+    if len(variables) != len(arrays) or any(tuple(variable.shape) != array.shape
+                                            for variable, array in zip(variables, arrays)):
+        raise ValueError(f"The checkpoint's {what} don't match this network. Was the corpus or the network changed?")
+    for variable, array in zip(variables, arrays):
+        variable.assign(array)
+
+def save_best_weights(checkpoint_folder, lstm_model):
+    save_arrays(os.path.join(checkpoint_folder, BEST_WEIGHTS_FILE), lstm_model.get_weights())
+
+def load_best_weights(checkpoint_folder, lstm_model):
+    weights, _ = load_arrays(os.path.join(checkpoint_folder, BEST_WEIGHTS_FILE))
+    assign_arrays(lstm_model.weights, weights, "best weights")
+
+class Checkpoint:
+    """A checkpoint read back from disk by load_checkpoint"""
+    def __init__(self, checkpoint_folder, model_arrays, optimizer_arrays, best_arrays, epoch, state):
+        self.checkpoint_folder = checkpoint_folder
+        self.model_arrays = model_arrays
+        self.optimizer_arrays = optimizer_arrays
+        self.best_arrays = best_arrays  # Empty if no epoch had been kept as the best yet
+        self.epoch = epoch
+        self.state = state
+
+def save_checkpoint(checkpoint_folder, lstm_model, epoch, state):
+    """Saves everything needed to continue training after epoch (counted from 0). state is a JSON-able dict with
+    the rest of the trainer's progress, like the batch sampler's position and the best-so-far tracker. The best
+    weights are copied in from best_weights.npz, so they always belong to the tracker saved with them"""
+    model_arrays = [variable.numpy() for variable in lstm_model.variables]
+    optimizer_arrays = [variable.numpy() for variable in lstm_model.optimizer.variables]
+    best_weights_path = os.path.join(checkpoint_folder, BEST_WEIGHTS_FILE)
+    best_arrays = load_arrays(best_weights_path)[0] if os.path.exists(best_weights_path) else []
+    save_arrays(os.path.join(checkpoint_folder, CHECKPOINT_FILE), model_arrays + optimizer_arrays + best_arrays,
+                model_count=numpy.array(len(model_arrays)), optimizer_count=numpy.array(len(optimizer_arrays)),
+                epoch=numpy.array(epoch), state=numpy.array(json.dumps(state)))
+
+def load_checkpoint(checkpoint_folder):
+    """Returns the Checkpoint saved in checkpoint_folder, or None if there isn't one"""
+    checkpoint_path = os.path.join(checkpoint_folder, CHECKPOINT_FILE)
+    if not os.path.exists(checkpoint_path):
+        return None
+    arrays, extra = load_arrays(checkpoint_path)
+    model_count = int(extra['model_count'])
+    best_start = model_count + int(extra['optimizer_count'])
+    return Checkpoint(checkpoint_folder, arrays[:model_count], arrays[model_count:best_start], arrays[best_start:],
+                      int(extra['epoch']), json.loads(str(extra['state'])))
+
+def restore_checkpoint(lstm_model, checkpoint):
+    """Puts the model, the optimizer and best_weights.npz back the way they were when the checkpoint was saved"""
+    assign_arrays(lstm_model.variables, checkpoint.model_arrays, "weights")
+    if not lstm_model.optimizer.built:
+        lstm_model.optimizer.build(lstm_model.trainable_variables)
+    assign_arrays(lstm_model.optimizer.variables, checkpoint.optimizer_arrays, "optimizer state")
+
+    # A later epoch may have replaced best_weights.npz before the run stopped
+    best_weights_path = os.path.join(checkpoint.checkpoint_folder, BEST_WEIGHTS_FILE)
+    if checkpoint.best_arrays:
+        save_arrays(best_weights_path, checkpoint.best_arrays)
+    elif os.path.exists(best_weights_path):
+        os.remove(best_weights_path)
+
+class TrainingCheckpoint(Callback):
+    """Saves a checkpoint every `every` epochs. get_state is called with the epoch for the trainer's own progress
+    (see save_checkpoint), so it has to come after any callback whose progress it saves"""
+
+    def __init__(self, checkpoint_folder, get_state, every=1):
+        super().__init__()
+        self.checkpoint_folder = checkpoint_folder
+        self.get_state = get_state
+        self.every = every
+
+    def on_epoch_end(self, epoch, logs=None):
+        if (epoch + 1) % self.every == 0:
+            save_checkpoint(self.checkpoint_folder, self.model, epoch, self.get_state(epoch))
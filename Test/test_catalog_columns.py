@@ -0,0 +1,49 @@
+import itertools
+
+import numpy
+import pytest
+
+from BardicInspiration.catalog_columns import CatalogColumns, categorical_codes
+from BardicInspiration.music_classification import music_search, music_search_batch
+
+@pytest.fixture
+def music_info():
+    return {
+        "Song1": {"Tempo": 120.0, "Time Signature": "4/4", "Instruments": ["Piano", "Guitar"], "Key Signature": "C", "Label": "Tavern"},
+        "Song2": {"Tempo": 140.0, "Time Signature": "3/4", "Instruments": ["Flute", "Violin", "Flute"], "Key Signature": "G", "Label": "Exploration"},
+        "Song3": {"Tempo": 90.0, "Time Signature": "6/8", "Instruments": ["Trumpet"], "Key Signature": "Dm", "Label": "Sad"},
+        "Song4": {"Tempo": -1, "Time Signature": "4/4", "Instruments": ["Piano"], "Key Signature": "C", "Label": "tavern"},
+        "Song5": {"Tempo": 181.0, "Time Signature": "4/4", "Instruments": [""], "Key Signature": "Am", "Label": "Boss"},
+        "Song6": {"Tempo": 60.0, "Time Signature": "2/2", "Instruments": ["Guitar"], "Key Signature": "C", "Label": "Tavern"},
+        "Song7": {"Tempo": 120.00001, "Time Signature": "4/4", "Instruments": [f"Instrument{n}" for n in range(10)] + ["Guitar"],
+                  "Key Signature": "C", "Label": "TAVERN"},
+    }
+
+def test_categorical_codes():
+    codes, names = categorical_codes(["C", "G", "C", "Am"])
+    assert names == ["C", "G", "Am"]
+    assert codes.tolist() == [0, 1, 0, 2]
+
+def test_search_batch_matches_music_search(music_info):
+    searches = list(itertools.product(["Any", "0-60", "61-120", "121-180", "181+", (60.0, 120.0)],
+                                      ["Any", "4/4", "3/4", "5/4"], ["Any", "Piano", "Guitar", "Instrument9", "Harp"],
+                                      ["Any", "C", "G"], ["Any", "Tavern", "sad", "Victory"]))
+    columns = CatalogColumns(music_info)
+
+    results = music_search_batch(searches, columns)
+
+    assert len(results) == len(searches)
+    for search, ids in zip(searches, results):
+        assert columns.names(ids) == music_search(*search, music_info), search
+
+def test_search_batch_in_chunks(music_info):
+    searches = [("Any", "4/4", "Any", "Any", "Any"), ("61-120", "Any", "Guitar", "Any", "Tavern"), ("Any",) * 5]
+    expected = [[0, 3, 4, 6], [0], [0, 1, 2, 3, 4, 5, 6]]
+
+    assert [ids.tolist() for ids in music_search_batch(searches, music_info)] == expected
+    assert [ids.tolist() for ids in CatalogColumns(music_info).search_batch(searches, chunk_size=1)] == expected
+
+def test_empty_catalog_and_batch():
+    columns = CatalogColumns({})
+    assert [ids.tolist() for ids in columns.search_batch([("Any", "Any", "Piano", "Any", "Any")])] == [[]]
+    assert columns.search_batch([]) == []
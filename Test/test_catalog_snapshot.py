@@ -0,0 +1,122 @@
+import csv
+import os
+from unittest.mock import patch
+
+import pytest
+
+from BardicInspiration import catalog_snapshot
+from BardicInspiration.catalog_snapshot import (load_catalog, process_csv, refresh_snapshot, snapshot_file,
+                                                wait_for_snapshots, parse_tempo, tempo_range)
+from BardicInspiration.model_registry import label_songs
+
+def write_catalog(csv_file, rows, mtime_ns=None):
+    with open(csv_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['song_name', 'tempo', 'time_signature', 'instruments', 'key_signature', 'label'])
+        writer.writerows(rows)
+    if mtime_ns is not None:
+        os.utime(csv_file, ns=(mtime_ns, mtime_ns))
+
+@pytest.fixture
+def csv_file(tmp_path):
+    csv_file = str(tmp_path / "music_features.csv")
+    write_catalog(csv_file, [["Song1", "120", "4/4", "Piano;Guitar", "C", "Tavern"],
+                             ["Song2", "unknown", "3/4", "Flute", "Am", "Boss"]], mtime_ns=1)
+    return csv_file
+
+def parse_count(csv_file, background=False):
+    """(what load_catalog returned, how many times it parsed the CSV)"""
+    with patch.object(catalog_snapshot, 'process_csv', wraps=process_csv) as parse:
+        music_info = load_catalog(csv_file, background=background)
+    return music_info, parse.call_count
+
+def test_snapshot_is_used_until_csv_changes(csv_file):
+    assert parse_count(csv_file) == (process_csv(csv_file), 1)
+    assert os.path.exists(snapshot_file(csv_file))
+    assert parse_count(csv_file) == (process_csv(csv_file), 0)
+
+    write_catalog(csv_file, [["Song3", "90", "6/8", "Violin", "D", "Sad"]], mtime_ns=2)
+    music_info, parses = parse_count(csv_file)
+    assert parses == 1
+    assert list(music_info) == ["Song3"]
+
+def test_touched_csv_is_hashed_once(csv_file):
+    load_catalog(csv_file, background=False)
+    os.utime(csv_file, ns=(5, 5))
+    with patch.object(catalog_snapshot, 'file_hash', wraps=catalog_snapshot.file_hash) as file_hash:
+        assert parse_count(csv_file)[1] == 0
+        assert parse_count(csv_file)[1] == 0
+    assert file_hash.call_count == 1
+
+def test_same_size_different_contents(csv_file):
+    load_catalog(csv_file, background=False)
+    write_catalog(csv_file, [["Song1", "120", "4/4", "Piano;Guitar", "C", "Tavern"],
+                             ["Song2", "unknown", "3/4", "Flute", "Am", "Sad!"]], mtime_ns=3)
+    music_info, parses = parse_count(csv_file)
+    assert parses == 1
+    assert music_info["Song2"]["Label"] == "Sad!"
+
+def test_broken_snapshot_is_rebuilt(csv_file):
+    with open(snapshot_file(csv_file), 'wb') as file:
+        file.write(b'not a snapshot')
+    assert parse_count(csv_file) == (process_csv(csv_file), 1)
+    assert parse_count(csv_file)[1] == 0
+
+def test_background_write(csv_file):
+    assert parse_count(csv_file, background=True)[1] == 1
+    wait_for_snapshots()
+    assert parse_count(csv_file)[1] == 0
+
+    write_catalog(csv_file, [["Song3", "90", "6/8", "Violin", "D", "Sad"]], mtime_ns=2)
+    refresh_snapshot(csv_file)
+    wait_for_snapshots()
+    assert parse_count(csv_file) == ({"Song3": {"Tempo": 90.0, "Time Signature": "6/8", "Instruments": ["Violin"],
+                                                "Key Signature": "D", "Label": "Sad"}}, 0)
+
+def test_parse_tempo():
+    assert parse_tempo('120.5') == 120.5
+    assert parse_tempo('Unknown') == parse_tempo('') == parse_tempo('fast') == -1
+
+def test_tempo_range():
+    assert tempo_range("61-120") == (61.0, 120.0)
+    assert tempo_range((90, 110)) == (90, 110)
+
+def test_process_csv_utf8_and_quiet(tmp_path, capsys):
+    csv_file = str(tmp_path / "music_features.csv")
+    with open(csv_file, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['song_name', 'tempo', 'time_signature', 'instruments', 'key_signature', 'label'])
+        writer.writerows([["Café Théâtre", "fast", "4/4", "Piano", "C", "Tavern"]] * 3)
+
+    music_info = process_csv(csv_file)
+    assert list(music_info) == ["Café Théâtre"]
+    assert music_info["Café Théâtre"]["Tempo"] == -1
+    assert capsys.readouterr().out == ""
+
+def test_background_failure_is_quiet():
+    def changed_while_pickled():
+        raise RuntimeError("dictionary changed size during iteration")
+    with patch('threading.excepthook') as excepthook:
+        catalog_snapshot.in_background(changed_while_pickled).join()
+    excepthook.assert_not_called()
+
+def test_label_songs_last_row_wins(tmp_path):
+    csv_file = str(tmp_path / "music_features.csv")
+    write_catalog(csv_file, [["a", "120", "4/4", "Piano", "C", "Boss"], ["b", "90", "3/4", "Violin", "G", "Boss "],
+                             ["a", "120", "4/4", "Piano", "C", "Tavern"], ["c", "100", "4/4", "Piano", "D", "Boss"]])
+    assert label_songs(csv_file, "Boss") == ["b", "c"]
+    assert label_songs(csv_file, "Tavern") == ["a"]
+
+def test_pitch_classes_only_when_the_column_is_there(tmp_path, csv_file):
+    assert "Pitch Classes" not in load_catalog(csv_file, background=False)["Song1"]
+
+    newer_file = str(tmp_path / "newer.csv")
+    with open(newer_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['song_name', 'tempo', 'time_signature', 'instruments', 'key_signature', 'label',
+                         'pitch_classes'])
+        writer.writerows([["Song1", "120", "4/4", "Piano", "C", "Tavern", "[4, 0, 2, 0, 3, 1, 0, 5, 0, 1, 0, 1]"],
+                          ["Song2", "90", "3/4", "Flute", "Am", "Sad", ""]])
+    music_info = load_catalog(newer_file, background=False)
+    assert music_info["Song1"]["Pitch Classes"] == [4, 0, 2, 0, 3, 1, 0, 5, 0, 1, 0, 1]
+    assert music_info["Song2"]["Pitch Classes"] is None
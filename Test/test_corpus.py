@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from BardicInspiration.corpus import Corpus, encode_songs, append_songs, save_corpus, load_corpus, corpus_exists, token_dtype
+
+def test_encode_songs():
+    corpus = encode_songs([['D4', 'C4'], ['E4', 'C4', 'D4']])
+
+    assert corpus.vocab == ['C4', 'D4', 'E4']
+    assert list(corpus.tokens) == [1, 0, 2, 0, 1]
+    assert list(corpus.offsets) == [0, 2, 5]
+    assert len(corpus) == 2
+    assert list(corpus.song(1)) == [2, 0, 1]
+    assert corpus.notes() == ['D4', 'C4', 'E4', 'C4', 'D4']
+
+def test_append_songs():
+    corpus = encode_songs([['D4', 'C4']])
+
+    appended = append_songs(corpus, [['C4', 'F4'], ['A4']])
+
+    # Old tokens keep their numbers, new notes go at the end of the vocabulary
+    assert appended.vocab == ['C4', 'D4', 'A4', 'F4']
+    assert list(appended.tokens) == [1, 0, 0, 3, 2]
+    assert list(appended.offsets) == [0, 2, 4, 5]
+    assert appended.notes() == ['D4', 'C4', 'C4', 'F4', 'A4']
+
+def test_token_dtype():
+    assert token_dtype(125) == np.int16
+    assert token_dtype(40000) == np.int32
+
+def test_save_and_load_corpus():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_corpus(encode_songs([['C4', 'D4'], ['E4']]), tmpdirname)
+
+        assert corpus_exists(tmpdirname)
+        corpus = load_corpus(tmpdirname)
+
+        assert isinstance(corpus.tokens, np.memmap)
+        assert corpus.tokens.dtype == np.int16
+        assert corpus.notes() == ['C4', 'D4', 'E4']
+        assert list(corpus.offsets) == [0, 2, 3]
+
+def test_load_corpus_without_mmap():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_corpus(encode_songs([['C4']]), tmpdirname)
+
+        assert not isinstance(load_corpus(tmpdirname, mmap=False).tokens, np.memmap)
+
+def test_load_missing_corpus():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        with pytest.raises(FileNotFoundError):
+            load_corpus(tmpdirname)
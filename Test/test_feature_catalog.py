@@ -0,0 +1,100 @@
+import csv
+import os
+
+import pytest
+
+from BardicInspiration.feature_catalog import FeatureCatalog, compact, read_rows, write_rows
+
+def features(song_name, tempo=120.0, label="Tavern"):
+    return {'song_name': song_name, 'tempo': tempo, 'time_signature': '4/4', 'instruments': ['Piano'],
+            'key_signature': 'C', 'label': label}
+
+@pytest.fixture
+def midi_file(tmp_path):
+    path = tmp_path / "song.mid"
+    path.write_bytes(b"MThd first version")
+    return str(path)
+
+def test_new_file_needs_extraction(tmp_path, midi_file):
+    catalog = FeatureCatalog(str(tmp_path / "features.csv"))
+
+    state = catalog.check(midi_file, "Tavern")
+
+    assert state['size'] == os.path.getsize(midi_file) and len(state['hash']) == 64
+
+def test_saved_file_is_skipped(tmp_path, midi_file):
+    csv_file = str(tmp_path / "features.csv")
+    catalog = FeatureCatalog(csv_file)
+    catalog.upsert(midi_file, "Tavern", features("song"), catalog.check(midi_file, "Tavern"))
+    catalog.save()
+
+    catalog = FeatureCatalog(csv_file)
+    assert catalog.check(midi_file, "Tavern") is None
+    # Another label means the row has to be written again
+    assert catalog.check(midi_file, "Boss") is not None
+
+def test_touched_file_is_skipped(tmp_path, midi_file):
+    csv_file = str(tmp_path / "features.csv")
+    catalog = FeatureCatalog(csv_file)
+    catalog.upsert(midi_file, "Tavern", features("song"), catalog.check(midi_file, "Tavern"))
+    catalog.save()
+    os.utime(midi_file, ns=(1, 1))
+
+    catalog = FeatureCatalog(csv_file)
+    assert catalog.check(midi_file, "Tavern") is None
+    catalog.save()
+    assert FeatureCatalog(csv_file).manifest[os.path.abspath(midi_file)]['mtime_ns'] == 1
+
+def test_changed_file_is_extracted_again(tmp_path, midi_file):
+    csv_file = str(tmp_path / "features.csv")
+    catalog = FeatureCatalog(csv_file)
+    catalog.upsert(midi_file, "Tavern", features("song"), catalog.check(midi_file, "Tavern"))
+    catalog.save()
+    with open(midi_file, 'wb') as file:
+        file.write(b"MThd second version")
+
+    assert FeatureCatalog(csv_file).check(midi_file, "Tavern") is not None
+
+def test_missing_row_is_extracted_again(tmp_path, midi_file):
+    # The manifest only counts for songs that are still in the CSV
+    csv_file = str(tmp_path / "features.csv")
+    catalog = FeatureCatalog(csv_file)
+    catalog.upsert(midi_file, "Tavern", features("song"), catalog.check(midi_file, "Tavern"))
+    catalog.save()
+    write_rows(csv_file, [])
+
+    assert FeatureCatalog(csv_file).check(midi_file, "Tavern") is not None
+
+def test_upsert_replaces_row_in_place(tmp_path, midi_file):
+    csv_file = str(tmp_path / "features.csv")
+    write_rows(csv_file, [features("first"), features("song"), features("last")])
+
+    catalog = FeatureCatalog(csv_file)
+    catalog.upsert(midi_file, "Tavern", features("song", tempo=90.0), catalog.check(midi_file, "Tavern"))
+    catalog.save()
+
+    rows = read_rows(csv_file)
+    assert [row['song_name'] for row in rows] == ['first', 'song', 'last']
+    assert rows[1]['tempo'] == '90.0' and rows[1]['instruments'] == 'Piano'
+
+def test_save_without_changes_leaves_files_alone(tmp_path):
+    csv_file = str(tmp_path / "features.csv")
+    write_rows(csv_file, [features("song")])
+    os.utime(csv_file, ns=(1, 1))
+
+    FeatureCatalog(csv_file).save()
+
+    assert os.stat(csv_file).st_mtime_ns == 1
+    assert not os.path.exists(csv_file + ".manifest.json")
+
+def test_compact(tmp_path):
+    csv_file = str(tmp_path / "features.csv")
+    write_rows(csv_file, [features("a", 60.0), features("b"), features("a", 70.0), features("c"), features("b", 80.0)])
+
+    assert compact(csv_file) == 2
+    assert [(row['song_name'], row['tempo']) for row in read_rows(csv_file)] == [('a', '70.0'), ('b', '80.0'), ('c', '120.0')]
+    assert compact(csv_file) == 0
+
+def test_compact_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        compact(str(tmp_path / "missing.csv"))
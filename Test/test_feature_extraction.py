@@ -6,7 +6,10 @@ import tkinter as tk
 
 
 # Import the functions to be tested
-from BardicInspiration.feature_extraction import extract_music_data, process_folder, main, browse_folder, browse_output_csv, process_folder_gui
+from BardicInspiration.feature_extraction import extract_music_data, process_folder, main, browse_folder, browse_output_csv, process_folder_gui, process_folder_batch, extract_files, batch_main
+import csv
+import os
+import mido
 
 # Define test data
 TEST_LABEL = "test_label"
@@ -62,13 +65,97 @@ def test_extract_music_data():
         assert 'label' in features
         assert features['label'] == TEST_LABEL
 
-def test_process_folder(test_folder):
-    with patch('builtins.open', create=True) as mock_open:
-        mock_open.side_effect = [MagicMock(), MagicMock()]
+def write_feature_midi(path, tempo=500000, numerator=4, denominator=4, programs=(0,), key='C'):
+    # Small real MIDI file with every message extract_music_data looks at
+    midi = mido.MidiFile()
+    track = mido.MidiTrack()
+    track.append(mido.MetaMessage('set_tempo', tempo=tempo))
+    track.append(mido.MetaMessage('time_signature', numerator=numerator, denominator=denominator))
+    track.append(mido.MetaMessage('key_signature', key=key))
+    for program in programs:
+        track.append(mido.Message('program_change', program=program))
+    track.append(mido.Message('note_on', note=60, velocity=64, time=0))
+    track.append(mido.Message('note_off', note=60, velocity=64, time=480))
+    midi.tracks.append(track)
+    midi.save(str(path))
+
+@pytest.fixture
+def feature_folder(tmp_path):
+    folder_path = tmp_path / "midi"
+    folder_path.mkdir()
+    write_feature_midi(folder_path / "a.mid", tempo=600000, programs=(0, 41))
+    write_feature_midi(folder_path / "b.mid", numerator=3, key='G')
+    with open(folder_path / "broken.mid", 'w') as f:
+        f.write("not a MIDI file")
+    write_feature_midi(folder_path / "c.mid", programs=(73,))
+    with open(folder_path / "notes.txt", 'w') as f:
+        f.write("not a MIDI file either")
+    return folder_path
+
+def test_process_folder_batch(feature_folder, tmp_path):
+    output_csv = str(tmp_path / "features.csv")
+
+    report = process_folder_batch(str(feature_folder), "Tavern", output_csv, workers=2, verbose=False)
+
+    assert [os.path.basename(midi_file) for midi_file, _, _ in report] == ['a.mid', 'b.mid', 'broken.mid', 'c.mid']
+    assert [error is None for _, _, error in report] == [True, True, False, True]
+    with open(output_csv, newline='') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    assert [row['song_name'] for row in rows] == ['a', 'b', 'c']
+    assert rows[0]['tempo'] == '100.0' and rows[0]['instruments'] == 'Piano;Violin'
+    assert rows[1]['time_signature'] == '3/4' and rows[1]['key_signature'] == 'G'
+    assert all(row['label'] == 'Tavern' for row in rows)
+
+def test_extract_files_parallel_matches_serial(feature_folder):
+    midi_files = sorted(str(path) for path in feature_folder.glob("*.mid"))
+
+    serial = [(midi_file, features, error) for midi_file, features, _, error in extract_files(midi_files, "Sad", workers=1)]
+    parallel = [(midi_file, features, error) for midi_file, features, _, error in extract_files(midi_files, "Sad", workers=2)]
+
+    assert parallel == serial
+
+def test_batch_main(feature_folder, tmp_path):
+    output_csv = str(tmp_path / "features.csv")
+    # The broken file makes the command report a failure, but the other rows are still written
+    assert batch_main([str(feature_folder), "--label", "Boss", "--output", output_csv, "--workers", "1"]) == 1
+    with open(output_csv, newline='') as csvfile:
+        assert len(list(csv.DictReader(csvfile))) == 3
+
+def test_process_folder(feature_folder, tmp_path, capsys):
+    output_csv = str(tmp_path / "features.csv")
+
+    process_folder(str(feature_folder), TEST_LABEL, output_csv)
+
+    with open(output_csv, newline='') as csvfile:
+        assert [row['song_name'] for row in csv.DictReader(csvfile)] == ['a', 'b', 'c']
+    assert "broken.mid" in capsys.readouterr().out
+
+def test_process_folder_twice_is_idempotent(feature_folder, tmp_path):
+    output_csv = str(tmp_path / "features.csv")
+    process_folder_batch(str(feature_folder), "Tavern", output_csv, workers=1, verbose=False)
+
+    with patch('BardicInspiration.feature_extraction.extract_music_data', side_effect=OSError) as mock_extract:
+        process_folder(str(feature_folder), "Tavern", output_csv)
+    report = process_folder_batch(str(feature_folder), "Tavern", output_csv, workers=1, verbose=False)
+
+    # Only the broken file is tried again
+    mock_extract.assert_called_once_with(str(feature_folder / "broken.mid"), "Tavern")
+    assert [seconds is None for _, seconds, _ in report] == [True, True, False, True]
+    with open(output_csv, newline='') as csvfile:
+        assert [row['song_name'] for row in csv.DictReader(csvfile)] == ['a', 'b', 'c']
+
+def test_process_folder_batch_replaces_changed_rows(feature_folder, tmp_path):
+    output_csv = str(tmp_path / "features.csv")
+    process_folder_batch(str(feature_folder), "Tavern", output_csv, workers=1, verbose=False)
 
-        process_folder(test_folder, TEST_LABEL, TEST_OUTPUT_CSV)
+    write_feature_midi(feature_folder / "b.mid", numerator=2, key='D')
+    report = process_folder_batch(str(feature_folder), "Tavern", output_csv, workers=1, verbose=False)
 
-        assert mock_open.call_count == 2
+    assert [os.path.basename(midi_file) for midi_file, seconds, _ in report if seconds is not None] == ['b.mid', 'broken.mid']
+    with open(output_csv, newline='') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    assert [row['song_name'] for row in rows] == ['a', 'b', 'c']
+    assert rows[1]['time_signature'] == '2/4' and rows[1]['key_signature'] == 'D'
 
 def test_extract_music_data_nonexistent_file():
     # Pass a non-existent MIDI file path
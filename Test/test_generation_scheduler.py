@@ -0,0 +1,74 @@
+import threading
+import unittest
+
+import numpy as np
+
+from BardicInspiration.music_creation import prepare_note_sequence, create_neural_network
+from BardicInspiration.generation_scheduler import GenerationScheduler
+
+class TestGenerationScheduler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pitch_names = ["C4", "D4", "E4", "F4", "G4"]
+        cls.net_input, norm_input = prepare_note_sequence(cls.pitch_names * 21, cls.pitch_names, len(cls.pitch_names))
+        cls.lstm_model = create_neural_network(norm_input, len(cls.pitch_names), weights_file=None)
+
+    def setUp(self):
+        self.scheduler = GenerationScheduler(self.lstm_model, len(self.pitch_names), max_batch_size=3, max_wait_ms=50).start()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_submit_returns_note_and_states(self):
+        seed = np.reshape(self.net_input[0], (100, 1)) / float(len(self.pitch_names))
+
+        index, states = self.scheduler.submit(seed).result(timeout=30)
+
+        self.assertIn(index, range(len(self.pitch_names)))
+        self.assertEqual(len(states), 6)
+        self.assertEqual(states[0].shape, (512,))
+
+    def test_submit_carries_states(self):
+        # The seed sent in two steps, handing the states over, ends in the same states as sending it whole
+        seed = np.reshape(self.net_input[0], (100, 1)) / float(len(self.pitch_names))
+
+        whole_states = self.scheduler.submit(seed).result(timeout=30)[1]
+        first_states = self.scheduler.submit(seed[:60]).result(timeout=30)[1]
+        second_states = self.scheduler.submit(seed[60:], first_states).result(timeout=30)[1]
+
+        for second_state, whole_state in zip(second_states, whole_states):
+            np.testing.assert_allclose(second_state, whole_state, atol=1e-5)
+
+    def test_concurrent_requests_share_batches(self):
+        results = []
+
+        def generate():
+            results.append(self.scheduler.generate(self.net_input, self.pitch_names, length=5))
+
+        threads = [threading.Thread(target=generate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(len(pred_output) == 5 for pred_output in results))
+        self.assertTrue(all(note in self.pitch_names for pred_output in results for note in pred_output))
+
+        metrics = self.scheduler.metrics()
+        self.assertEqual(metrics['requests'], 4)
+        self.assertGreater(metrics['mean_batch_size'], 1)
+        self.assertLessEqual(max(self.scheduler.batch_sizes), 3)
+        self.assertGreater(metrics['latency_ms']['p95'], 0)
+
+    def test_bad_step_fails_only_its_request(self):
+        future = self.scheduler.submit(np.zeros((1, 1)), states=[np.zeros(3)] * 6)
+
+        with self.assertRaises(Exception):
+            future.result(timeout=30)
+
+    def test_metrics_without_requests(self):
+        self.assertEqual(self.scheduler.metrics()['requests'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
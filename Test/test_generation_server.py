@@ -0,0 +1,84 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import zipfile
+from unittest.mock import patch
+
+from BardicInspiration.music_creation import prepare_note_sequence, create_neural_network
+from BardicInspiration.generation_server import GenerationService, create_server
+from BardicInspiration.generation_client import server_is_running, request_music, save_music
+
+class TestGenerationServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Small untrained network so the tests don't need best_weights_loss.weights.h5
+        pitch_names = ["C4", "D4", "E4", "F4", "G4"]
+        net_input, norm_input = prepare_note_sequence(pitch_names * 21, pitch_names, len(pitch_names))
+        lstm_model = create_neural_network(norm_input, len(pitch_names), weights_file=None)
+        cls.service = GenerationService(lstm_model, net_input, pitch_names, len(pitch_names))
+
+        cls.server = create_server(cls.service, port=0)
+        cls.port = cls.server.server_port
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_server_is_running(self):
+        self.assertTrue(server_is_running(port=self.port))
+
+    def test_server_is_not_running(self):
+        self.assertFalse(server_is_running(port=1))
+
+    def test_generate_reuses_stateful_network(self):
+        self.service.generate(count=2, length=3)
+        stateful_model = self.service.stateful_models[2]
+        pred_outputs = self.service.generate(count=2, length=3)
+
+        self.assertIs(self.service.stateful_models[2], stateful_model)
+        self.assertEqual([len(pred_output) for pred_output in pred_outputs], [3, 3])
+
+    def test_generate_keeps_latest_stateful_network(self):
+        self.service.generate(count=2, length=3)
+        self.service.generate(count=3, length=3)
+
+        self.assertEqual(list(self.service.stateful_models), [3])
+
+    def test_request_one_piece(self):
+        music_bytes = request_music(count=1, length=5, port=self.port)
+
+        self.assertTrue(music_bytes.startswith(b"MThd"))
+
+    def test_request_several_pieces(self):
+        music_bytes = request_music(count=2, length=5, port=self.port)
+
+        with zipfile.ZipFile(io.BytesIO(music_bytes)) as archive:
+            self.assertEqual(archive.namelist(), ["output_1.mid", "output_2.mid"])
+
+    def test_request_bad_count(self):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            request_music(count=0, length=5, port=self.port)
+        self.assertEqual(context.exception.code, 400)
+
+    def test_request_generation_fails(self):
+        with patch.object(self.service, "generate_midi", side_effect=RuntimeError("no weights")):
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                request_music(count=1, length=5, port=self.port)
+        self.assertEqual(context.exception.code, 500)
+
+    def test_save_music(self):
+        music_bytes = request_music(count=2, length=5, port=self.port)
+        with tempfile.TemporaryDirectory() as output_folder:
+            output_file_paths = save_music(music_bytes, 2, output_folder)
+
+            self.assertEqual([os.path.basename(path) for path in output_file_paths], ["output_1.mid", "output_2.mid"])
+            self.assertTrue(all(os.path.exists(path) for path in output_file_paths))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import csv
+import importlib
+import os
+
+import numpy
+
+from BardicInspiration import instrument_int_to_string
+from BardicInspiration.instrument_int_to_string import (PROGRAM_FAMILIES, PROGRAM_FAMILY_CODES, FAMILIES, convert_csv,
+                                                        family_codes, int_range_to_string, map_instrument_column,
+                                                        map_programs, program_family)
+
+def test_tables():
+    assert len(PROGRAM_FAMILIES) == len(PROGRAM_FAMILY_CODES) == 128
+    assert PROGRAM_FAMILIES[:8] == ("Piano",) * 8
+    # The last program of each group belongs to it too
+    assert [PROGRAM_FAMILIES[program] for program in (7, 15, 47, 79, 80, 127)] == \
+        ["Piano", "Bells", "Violin", "Flute", "Other", "Other"]
+    assert [FAMILIES[code] for code in PROGRAM_FAMILY_CODES] == list(PROGRAM_FAMILIES)
+
+def test_program_family():
+    assert program_family(41) == "Violin"
+    assert program_family(128) == program_family(-1) == "Unknown"
+
+def test_int_range_to_string():
+    assert int_range_to_string(24) == "Guitar"
+    assert int_range_to_string("[0, 41, 73]") == ["Piano", "Violin", "Flute"]
+    assert int_range_to_string([200]) == ["Unknown"]
+    assert int_range_to_string("Piano;Violin") == "Unknown"
+
+def test_family_codes():
+    assert family_codes(numpy.array([0, 9, 127, 128, -5])).tolist() == [0, 1, 10, 11, 11]
+
+def test_map_programs():
+    assert map_programs([[0, 41], [], [73, 300]]) == [["Piano", "Violin"], [], ["Flute", "Unknown"]]
+    assert map_programs([]) == []
+
+def test_map_instrument_column():
+    assert map_instrument_column(["[0, 41]", "Guitar;Bass", "", "[]"]) == ["Piano;Violin", "Guitar;Bass", "", ""]
+
+def test_map_instrument_column_names_list():
+    cells = ["['Piano', 'Violin']", "[0, 41]", "[1, x]"]
+    assert map_instrument_column(cells) == ["['Piano', 'Violin']", "Piano;Violin", "[1, x]"]
+
+def test_convert_csv(tmp_path):
+    input_file, output_file = str(tmp_path / "music_features.csv"), str(tmp_path / "output.csv")
+    with open(input_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['song_name', 'tempo', 'instruments', 'label'])
+        writer.writerows([[f"Song{number}", '120', f"[{number}, {number + 8}]", 'Boss'] for number in range(5)])
+        writer.writerow(['Named', '90', 'Flute', 'Sad'])
+
+    assert convert_csv(input_file, output_file, chunk_rows=2) == 6
+    with open(output_file, newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert [row['instruments'] for row in rows] == ["Piano;Bells"] * 5 + ["Flute"]
+    assert rows[5] == {'song_name': 'Named', 'tempo': '90', 'instruments': 'Flute', 'label': 'Sad'}
+
+def test_import_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    importlib.reload(instrument_int_to_string)
+    assert os.listdir(tmp_path) == []
@@ -4,28 +4,60 @@ import tempfile
 import tkinter as tk
 import unittest
 from unittest.mock import patch, MagicMock, mock_open, call
-from BardicInspiration.lstm_network import train_neural_network, get_notes, music_creation, create_network, train_model, move_selected_songs
+from music21 import stream, note, chord
+from BardicInspiration.corpus import encode_songs, save_corpus, load_corpus
+from BardicInspiration.training_checkpoint import load_checkpoint, restore_checkpoint
+from BardicInspiration.model_registry import ModelRegistry, training_fingerprint
+from BardicInspiration.note_cache import NoteCache, file_hash
+from BardicInspiration.lstm_network import train_neural_network, train_label, fine_tune_label, extend_weights, replay_sample, get_notes, create_network, train_model, move_selected_songs, training_files, parse_midi_file, parse_midi_files, create_training_windows, create_training_dataset, train, BestLossWeights
+import numpy as np
 
 
+@patch('BardicInspiration.lstm_network.save_fingerprint')
 @patch('BardicInspiration.lstm_network.get_notes')
-@patch('BardicInspiration.lstm_network.music_creation')
+@patch('BardicInspiration.lstm_network.load_corpus')
+@patch('BardicInspiration.lstm_network.create_training_windows')
 @patch('BardicInspiration.lstm_network.create_network')
 @patch('BardicInspiration.lstm_network.train')
-def test_train_neural_network(mock_train, mock_create_network, mock_music_creation, mock_get_notes):
+def test_train_neural_network(mock_train, mock_create_network, mock_create_training_windows, mock_load_corpus, mock_get_notes,
+                              mock_save_fingerprint):
     folder_path = '/some/folder/path'
     notes = ['note1', 'note2', 'note3']
     music_input = 'mocked music input'
     music_output = 'mocked music output'
 
     mock_get_notes.return_value = notes
-    mock_music_creation.return_value = (music_input, music_output)
+    mock_load_corpus.return_value = encode_songs([notes])
+    mock_create_training_windows.return_value = (music_input, music_output)
 
-    train_neural_network(folder_path)
+    assert train_neural_network(folder_path)
 
     mock_get_notes.assert_called_once_with(folder_path, 'data')
-    mock_music_creation.assert_called_once_with(notes, len(set(notes)))
-    mock_create_network.assert_called_once_with(music_input, len(set(notes)))
-    mock_train.assert_called_once_with(mock_create_network.return_value, music_input, music_output)
+    mock_load_corpus.assert_called_once_with('data')
+    tokens, = mock_create_training_windows.call_args[0]
+    assert list(tokens) == [0, 1, 2]
+    mock_create_network.assert_called_once_with(music_input, len(set(notes)), jit_compile=False)
+    mock_train.assert_called_once_with(mock_create_network.return_value, music_input, music_output, epochs=100,
+                                       patience=None, checkpoint_folder=os.path.join('data', 'checkpoints'),
+                                       resume=False, weights_file='best_weights_loss.weights.h5')
+    # Cleared while training, then saved once it finished
+    assert mock_save_fingerprint.call_args_list[0] == call('data', None)
+    assert mock_save_fingerprint.call_args_list[-1] == call('data', training_fingerprint([], epochs=100, patience=None))
+
+@patch('BardicInspiration.lstm_network.get_notes')
+@patch('BardicInspiration.lstm_network.training_files', return_value=[])
+@patch('BardicInspiration.lstm_network.os.path.exists', return_value=True)
+def test_train_neural_network_skips_unchanged_songs(mock_exists, mock_training_files, mock_get_notes):
+    fingerprint = training_fingerprint([], epochs=100, patience=None)
+    with patch('BardicInspiration.lstm_network.read_fingerprint', return_value=fingerprint):
+        assert not train_neural_network('/some/folder/path')
+    mock_get_notes.assert_not_called()
+
+@patch('BardicInspiration.lstm_network.save_fingerprint')
+@patch('BardicInspiration.lstm_network.get_notes', return_value=[])
+def test_train_neural_network_no_notes(mock_get_notes, mock_save_fingerprint):
+    with pytest.raises(ValueError):
+        train_neural_network('/some/folder/path')
 
 def test_get_notes():
     with tempfile.TemporaryDirectory() as tmpdirname:
@@ -37,36 +69,249 @@ def test_get_notes():
 
         assert len(notes) == 0
 
-def test_music_creation():
-    # Define input data
-    notes = ['A', 'Ab', 'B', 'Bb', 'C#', 'C', 'D', 'Db', 'E', 'Eb', 'F', 'F#',
-             'A', 'Ab', 'B', 'Bb', 'C#', 'C', 'D', 'Db', 'E', 'Eb', 'F', 'F#',
-             'A', 'Ab', 'B', 'Bb', 'C#', 'C', 'D', 'Db', 'E', 'Eb', 'F', 'F#',
-             'A', 'Ab', 'B', 'Bb', 'C#', 'C', 'D', 'Db', 'E', 'Eb', 'F', 'F#',
-             'A', 'Ab', 'B', 'Bb', 'C#', 'C', 'D', 'Db', 'E', 'Eb', 'F', 'F#',
-             'A', 'Ab', 'B', 'Bb', 'C#', 'C', 'D', 'Db', 'E', 'Eb', 'F', 'F#',
-             'A', 'Ab', 'B', 'Bb', 'C#', 'C', 'D', 'Db', 'E', 'Eb', 'F', 'F#',
-             'A', 'Ab', 'B', 'Bb', 'C#', 'C', 'D', 'Db', 'E', 'Eb', 'F', 'F#',
-             'A', 'Ab', 'B', 'Bb', 'C#', 'C', 'D', 'Db', 'E', 'Eb', 'F', 'F#']
-    pitch_names = 108
-
-    # Call music_creation function
-    music_input, music_output = music_creation(notes, pitch_names)
+def write_test_midi(path, pitches):
+    # Small real MIDI file with single notes and one chord at the end
+    midi_stream = stream.Stream([note.Note(pitch) for pitch in pitches] + [chord.Chord(['C4', 'E4', 'G4'])])
+    midi_stream.write('midi', fp=path)
 
-    # Assertions
-    assert len(music_input) == len(notes) - 100  # Investigate if the correct number of input sequences is generated
-    assert music_input.shape[2] == 1  # Investigate if the shape of input data is correct
-    assert music_output.shape[1] == pitch_names  # Investigate if the shape of output data matches pitch names
+def test_parse_midi_file():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        midi_file_path = os.path.join(tmpdirname, "song.mid")
+        write_test_midi(midi_file_path, ['C4', 'D4'])
+
+        assert parse_midi_file(midi_file_path) == ['C4', 'D4', 'C.E.G']
+
+def test_get_notes_parallel_matches_serial():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        for number, pitches in enumerate([['C4', 'D4'], ['E4'], ['F4', 'G4', 'A4']]):
+            write_test_midi(os.path.join(tmpdirname, f"song{number}.mid"), pitches)
+        # A broken file in the middle should only lose its own notes
+        with open(os.path.join(tmpdirname, "song1b.mid"), 'w') as f:
+            f.write("not a MIDI file")
+
+        serial_notes = get_notes(tmpdirname, tmpdirname, workers=1, use_cache=False)
+        parallel_notes = get_notes(tmpdirname, tmpdirname, workers=2, use_cache=False)
+
+        assert parallel_notes == serial_notes
+        assert serial_notes == ['C4', 'D4', 'C.E.G', 'E4', 'C.E.G', 'F4', 'G4', 'A4', 'C.E.G']
+
+def test_get_notes_uses_cache():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        write_test_midi(os.path.join(tmpdirname, "song1.mid"), ['C4', 'D4'])
+        write_test_midi(os.path.join(tmpdirname, "song2.mid"), ['E4'])
+        first_notes = get_notes(tmpdirname, tmpdirname, workers=1)
+
+        # Only the new file should be parsed the second time
+        write_test_midi(os.path.join(tmpdirname, "song3.mid"), ['F4'])
+        with patch('BardicInspiration.lstm_network.parse_midi_file', side_effect=parse_midi_file) as mock_parse:
+            second_notes = get_notes(tmpdirname, tmpdirname, workers=1)
+
+        mock_parse.assert_called_once_with(os.path.join(tmpdirname, "song3.mid"))
+        assert second_notes == first_notes + ['F4', 'C.E.G']
+
+def test_get_notes_from_file_list():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        write_test_midi(os.path.join(tmpdirname, "song1.mid"), ['C4', 'D4'])
+        write_test_midi(os.path.join(tmpdirname, "song2.mid"), ['E4'])
+
+        notes = get_notes(tmpdirname, os.path.join(tmpdirname, "corpus"), workers=1,
+                          files=[os.path.join(tmpdirname, "song2.mid")], cache_folder=os.path.join(tmpdirname, "cache"))
+
+        assert notes == ['E4', 'C.E.G']
+        assert os.listdir(os.path.join(tmpdirname, "cache"))
+
+@patch('BardicInspiration.lstm_network.train_on_corpus')
+def test_train_label(mock_train_on_corpus):
+    mock_train_on_corpus.return_value = encode_songs([['C4', 'D4']])
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        midi_folder = os.path.join(tmpdirname, "MIDI Music")
+        os.makedirs(midi_folder)
+        write_test_midi(os.path.join(midi_folder, "fight.mid"), ['C4'])
+        write_test_midi(os.path.join(midi_folder, "inn.mid"), ['D4'])
+        features_csv = os.path.join(tmpdirname, "music_features.csv")
+        with open(features_csv, 'w') as csv_file:
+            csv_file.write("song_name,tempo,time_signature,instruments,key_signature,label\n"
+                           "fight,120,4/4,Piano,C,Boss\ninn,90,3/4,Violin,G,Tavern\n")
+        registry_folder = os.path.join(tmpdirname, "models")
+
+        with patch('BardicInspiration.lstm_network.NoteCache', lambda folder: NoteCache(os.path.join(tmpdirname, "cache"))):
+            model_version = train_label("Boss", midi_folder, features_csv, registry_folder, epochs=1, workers=1)
+
+            registry = ModelRegistry(registry_folder)
+            assert registry.current("Boss").version == model_version.version == 1
+            assert registry.current("Tavern") is None
+            assert load_corpus(model_version.corpus_folder).notes() == ['C4', 'C.E.G']
+            assert mock_train_on_corpus.call_args.kwargs['weights_file'] == model_version.weights_file
+
+            # The same songs and settings again give back the same version without training
+            with open(model_version.weights_file, 'wb') as weights_file:
+                weights_file.write(b"weights")
+            mock_train_on_corpus.reset_mock()
+            assert train_label("Boss", midi_folder, features_csv, registry_folder, epochs=1, workers=1).version == 1
+            mock_train_on_corpus.assert_not_called()
+            assert train_label("Boss", midi_folder, features_csv, registry_folder, epochs=2, workers=1).version == 2
+
+def test_extend_weights():
+    old_weights = [np.ones((2, 3)), np.full((4, 2), 5.0), np.full(2, 7.0)]
+    new_weights = [np.zeros((2, 3)), np.zeros((4, 3)), np.zeros(3)]
+
+    weights = extend_weights(old_weights, new_weights)
+
+    np.testing.assert_array_equal(weights[0], np.ones((2, 3)))
+    np.testing.assert_array_equal(weights[1], [[5, 5, 0]] * 4)
+    np.testing.assert_array_equal(weights[2], [7, 7, 0])
+
+def test_replay_sample():
+    corpus = encode_songs([['A'] * 10, ['B'] * 10, ['C'] * 10])
+
+    assert len(replay_sample(corpus, 15, np.random.default_rng(0))) == 20
+    np.testing.assert_array_equal(replay_sample(corpus, 1000, np.random.default_rng(0)), corpus.tokens)
+
+def test_fine_tune_label():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        registry = ModelRegistry(os.path.join(tmpdirname, "models"))
+        base_version = registry.new_version("Tavern")
+        save_corpus(encode_songs([['C4', 'D4'] * 100]), base_version.corpus_folder)
+        registry.publish(base_version, {'songs': 1})
+        new_file = os.path.join(tmpdirname, "new.mid")
+        write_test_midi(new_file, ['C4', 'E4'] * 30)
+
+        def small_network(music_input, pitch_names, jit_compile=False):
+            return create_small_network(pitch_names)
+
+        with patch('BardicInspiration.lstm_network.NoteCache', lambda folder: NoteCache(os.path.join(tmpdirname, "cache"))), \
+             patch('BardicInspiration.lstm_network.create_network', side_effect=small_network), \
+             patch('keras.models.Sequential.load_weights') as mock_load_weights, \
+             patch('BardicInspiration.lstm_network.train') as mock_train:
+            model_version = fine_tune_label("Tavern", [new_file], registry.registry_folder, epochs=2, workers=1, seed=0)
+
+        mock_load_weights.assert_called_once_with(base_version.weights_file)
+        lstm_model, music_input, music_output = mock_train.call_args.args
+        assert lstm_model.output_shape[-1] == 4  # C4, D4, then the new C.E.G and E4
+        # Every new note plus up to 3 times as many replayed old ones
+        assert len(music_output) == 200 + 61 - 100
+        assert mock_train.call_args.kwargs['epochs'] == 2
+        # C4 and D4 still reach the network as 0/2 and 1/2, not divided by the new vocabulary
+        assert mock_train.call_args.kwargs['input_scale'] == 2
+
+        corpus = load_corpus(model_version.corpus_folder)
+        assert corpus.vocab == ['C4', 'D4', 'C.E.G', 'E4']
+        assert len(corpus) == 2
+        assert registry.current("Tavern").version == 2
+        assert registry.current("Tavern").info()['fine_tuned_from'] == 1
+        assert registry.current("Tavern").input_scale() == 2
+
+def test_fine_tune_label_skips_songs_it_has():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        registry = ModelRegistry(os.path.join(tmpdirname, "models"))
+        known_file = os.path.join(tmpdirname, "known.mid")
+        write_test_midi(known_file, ['C4', 'D4'] * 30)
+        copy_file = os.path.join(tmpdirname, "renamed copy.mid")
+        write_test_midi(copy_file, ['C4', 'D4'] * 30)
+        new_file = os.path.join(tmpdirname, "new.mid")
+        write_test_midi(new_file, ['C4', 'E4'] * 30)
+        base_version = registry.new_version("Tavern")
+        save_corpus(encode_songs([['C4', 'D4'] * 100]), base_version.corpus_folder)
+        registry.publish(base_version, {'songs': 1, 'song_hashes': [file_hash(known_file)]})
+
+        def small_network(music_input, pitch_names, jit_compile=False):
+            return create_small_network(pitch_names)
+
+        with patch('BardicInspiration.lstm_network.NoteCache', lambda folder: NoteCache(os.path.join(tmpdirname, "cache"))), \
+             patch('BardicInspiration.lstm_network.create_network', side_effect=small_network), \
+             patch('keras.models.Sequential.load_weights'), \
+             patch('BardicInspiration.lstm_network.train') as mock_train:
+            assert fine_tune_label("Tavern", [copy_file], registry.registry_folder, workers=1).version == 1
+            mock_train.assert_not_called()
+
+            model_version = fine_tune_label("Tavern", [copy_file, new_file, new_file], registry.registry_folder,
+                                            workers=1, seed=0)
+
+        assert len(load_corpus(model_version.corpus_folder)) == 2  # Only new.mid, once
+        assert model_version.info()['new_songs'] == 1
+        assert model_version.info()['song_hashes'] == [file_hash(known_file), file_hash(new_file)]
+
+def test_get_notes_saves_corpus():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        write_test_midi(os.path.join(tmpdirname, "song1.mid"), ['C4', 'D4'])
+        write_test_midi(os.path.join(tmpdirname, "song2.mid"), ['E4'])
+
+        notes = get_notes(tmpdirname, tmpdirname, workers=1)
+        corpus = load_corpus(tmpdirname)
+
+        assert corpus.notes() == notes
+        assert len(corpus) == 2
+        assert corpus.vocab == sorted(set(notes))
+
+def test_parse_midi_files_keeps_file_order():
+    with patch('BardicInspiration.lstm_network.parse_midi_file', side_effect=lambda file: [file]):
+        assert parse_midi_files(['b.mid', 'a.mid'], workers=1) == [['b.mid'], ['a.mid']]
+
+def test_parse_midi_files_spawns_workers():
+    with patch('BardicInspiration.lstm_network.ProcessPoolExecutor') as executor:
+        executor.return_value.__enter__.return_value.submit.return_value.result.return_value = ['C4']
+        assert parse_midi_files(['b.mid', 'a.mid'], workers=2) == [['C4'], ['C4']]
+        assert executor.call_args.kwargs['mp_context'].get_start_method() == 'spawn'
+
+def test_create_training_windows_from_encoded_notes():
+    # Encoded tokens should give the windows of the note names they came from, in sorted vocabulary order
+    notes = ['B', 'A', 'D', 'C'] * 30
+    corpus = encode_songs([notes])
+
+    music_input, music_output = create_training_windows(corpus.tokens)
 
+    assert music_input.shape == (len(notes) - 100, 100, 1)
+    assert [corpus.vocab[token] for token in music_input[0, :, 0]] == notes[:100]
+    assert [corpus.vocab[token] for token in music_output] == notes[100:]
 
-def test_music_creation_not_enough_notes():
-    # Define input data with fewer notes than required
-    notes = ['C', 'D', 'E', 'F']  # Provide fewer notes than required for the sequence
-    pitch_names = 4
+def test_create_training_windows_is_a_view():
+    tokens = (np.arange(150) * 7 % 12).astype(np.int16)
 
-    # Call music_creation function and expect it to raise a ValueError
+    music_input, music_output = create_training_windows(tokens)
+
+    assert np.shares_memory(music_input, tokens)  # A view, not a copy
+    for start in (0, 17, 49):
+        np.testing.assert_array_equal(music_input[start, :, 0], tokens[start:start + 100])
+        assert music_output[start] == tokens[start + 100]
+
+def test_create_training_windows_not_enough_notes():
     with pytest.raises(ValueError):
-        music_input, music_output = music_creation(notes, pitch_names)
+        create_training_windows(np.arange(100))
+
+def test_create_training_dataset():
+    tokens = (np.arange(170) % 10).astype(np.int16)
+    music_input, music_output = create_training_windows(tokens)
+    dataset = create_training_dataset(music_input, music_output, 10, batch_size=16, seed=0)
+
+    for batch_input, batch_output in dataset.take(3):
+        assert batch_input.shape == (16, 100, 1)
+        assert batch_input.dtype.name == 'float32'
+        assert batch_output.dtype.name == 'int32'
+        # Every window's target is the note after its last one
+        last_notes = np.rint(batch_input.numpy()[:, -1, 0] * 10).astype(int)
+        np.testing.assert_array_equal((last_notes + 1) % 10, batch_output.numpy())
+
+def test_create_training_dataset_skip_batches():
+    tokens = (np.arange(400) % 10).astype(np.int16)
+    music_input, music_output = create_training_windows(tokens)
+    batches = [batch_output.numpy() for _, batch_output in
+               create_training_dataset(music_input, music_output, 10, batch_size=16, seed=7).take(3)]
+
+    _, skipped_output = next(iter(create_training_dataset(music_input, music_output, 10, batch_size=16, seed=7,
+                                                          skip_batches=2)))
+
+    np.testing.assert_array_equal(skipped_output.numpy(), batches[2])
+
+def test_create_training_dataset_from_memory_mapped_corpus():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_corpus(encode_songs([['C4', 'D4', 'E4'] * 50]), tmpdirname)
+        corpus = load_corpus(tmpdirname)
+        music_input, music_output = create_training_windows(corpus.tokens)
+
+        batch_input, batch_output = next(iter(create_training_dataset(music_input, music_output, 3, batch_size=8)))
+
+        assert batch_input.shape == (8, 100, 1)
+        assert set(batch_output.numpy()) <= {0, 1, 2}
 
 def test_create_network():
     # Define input data
@@ -79,6 +324,147 @@ def test_create_network():
     # Assertions
     assert len(lstm_model.layers) == 11 
 
+def create_small_network(pitch_names):
+    # Much smaller than create_network so training in a test is quick
+    from keras.models import Sequential
+    from keras.layers import Input, Flatten, Dense
+    small_model = Sequential([Input((100, 1)), Flatten(), Dense(pitch_names, activation='softmax')])
+    small_model.compile(loss='sparse_categorical_crossentropy', optimizer='rmsprop')
+    return small_model
+
+def test_best_loss_weights_keeps_closest_epoch():
+    small_model = create_small_network(4)
+    best_loss_weights = BestLossWeights(target_loss=0.2)
+    best_loss_weights.set_model(small_model)
+    best_loss_weights.on_train_begin()
+
+    best_epoch_weights = [weight.numpy().copy() for weight in small_model.weights]
+    best_loss_weights.on_epoch_end(0, {'loss': 0.3})
+    small_model.set_weights([weight + 1 for weight in best_epoch_weights])
+    best_loss_weights.on_epoch_end(1, {'loss': 0.05})
+    best_loss_weights.on_train_end()
+
+    assert best_loss_weights.best_epoch == 0
+    for weight, expected in zip(small_model.weights, best_epoch_weights):
+        np.testing.assert_array_equal(weight.numpy(), expected)
+
+def test_best_loss_weights_patience_stops_training():
+    small_model = create_small_network(4)
+    best_loss_weights = BestLossWeights(target_loss=0.2, patience=2)
+    best_loss_weights.set_model(small_model)
+    best_loss_weights.on_train_begin()
+    small_model.stop_training = False
+
+    for epoch, loss in enumerate([0.5, 0.6, 0.7]):
+        best_loss_weights.on_epoch_end(epoch, {'loss': loss})
+
+    assert small_model.stop_training
+
+def test_train_runs_one_fit():
+    tokens = (np.arange(200) % 4).astype(np.int16)
+    music_input, music_output = create_training_windows(tokens)
+    small_model = create_small_network(4)
+
+    with patch.object(small_model, 'save_weights') as mock_save_weights:
+        history = train(small_model, music_input, music_output, epochs=3)
+
+    assert len(history.history['loss']) == 3
+    mock_save_weights.assert_called_once_with("best_weights_loss.weights.h5")
+
+def test_train_saves_best_weights(tmp_path):
+    # A real save, loaded back into a new network
+    tokens = (np.arange(200) % 4).astype(np.int16)
+    music_input, music_output = create_training_windows(tokens)
+    small_model = create_small_network(4)
+    weights_file = str(tmp_path / "best_weights_loss.weights.h5")
+
+    train(small_model, music_input, music_output, epochs=2, weights_file=weights_file)
+
+    loaded_model = create_small_network(4)
+    loaded_model.load_weights(weights_file)
+    for loaded_weight, weight in zip(loaded_model.weights, small_model.weights):
+        np.testing.assert_array_equal(loaded_weight.numpy(), weight.numpy())
+
+def test_train_input_scale():
+    tokens = (np.arange(200) % 2).astype(np.int16)
+    music_input, music_output = create_training_windows(tokens)
+    small_model = create_small_network(4)
+
+    with patch('BardicInspiration.lstm_network.create_training_dataset', wraps=create_training_dataset) as dataset, \
+         patch.object(small_model, 'save_weights'):
+        train(small_model, music_input, music_output, epochs=1)
+        train(small_model, music_input, music_output, epochs=1, input_scale=2)
+
+    assert [call_args.args[2] for call_args in dataset.call_args_list] == [4, 2]
+
+def test_train_resumes_from_checkpoint():
+    tokens = (np.arange(200) % 4).astype(np.int16)
+    music_input, music_output = create_training_windows(tokens)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        first_model = create_small_network(4)
+        with patch.object(first_model, 'save_weights'):
+            train(first_model, music_input, music_output, epochs=2, checkpoint_folder=tmpdirname)
+        checkpoint = load_checkpoint(tmpdirname)
+        assert checkpoint.epoch == 1
+
+        # A new process starts from fresh weights, resuming only runs the epochs that are left
+        second_model = create_small_network(4)
+        with patch.object(second_model, 'save_weights'), \
+             patch('BardicInspiration.lstm_network.restore_checkpoint', wraps=restore_checkpoint) as mock_restore:
+            history = train(second_model, music_input, music_output, epochs=3, checkpoint_folder=tmpdirname,
+                            resume=True)
+
+        mock_restore.assert_called_once()
+        assert len(history.history['loss']) == 1
+        assert load_checkpoint(tmpdirname).epoch == 2
+
+def test_train_resume_matches_uninterrupted_run():
+    tokens = (np.arange(300) % 4).astype(np.int16)
+    music_input, music_output = create_training_windows(tokens)
+    start_weights = create_small_network(4).get_weights()
+
+    def train_from_start(checkpoint_folder, epochs, resume=False):
+        small_model = create_small_network(4)
+        small_model.set_weights(start_weights)
+        with patch.object(small_model, 'save_weights'):
+            train(small_model, music_input, music_output, epochs=epochs, checkpoint_folder=checkpoint_folder,
+                  resume=resume)
+        return small_model
+
+    with tempfile.TemporaryDirectory() as uninterrupted_folder, tempfile.TemporaryDirectory() as resumed_folder:
+        with patch('BardicInspiration.lstm_network.numpy.random.SeedSequence') as seed_sequence:
+            seed_sequence.return_value.entropy = 12345
+            train_from_start(uninterrupted_folder, 3)
+            train_from_start(resumed_folder, 1)
+            # The resumed run gets a different seed of its own, which the checkpoint's should replace
+            seed_sequence.return_value.entropy = 999
+            train_from_start(resumed_folder, 3, resume=True)
+
+        uninterrupted, resumed = load_checkpoint(uninterrupted_folder), load_checkpoint(resumed_folder)
+
+    assert resumed.state == uninterrupted.state
+    for resumed_array, uninterrupted_array in zip(resumed.model_arrays + resumed.best_arrays,
+                                                  uninterrupted.model_arrays + uninterrupted.best_arrays):
+        np.testing.assert_allclose(resumed_array, uninterrupted_array, rtol=1e-5, atol=1e-6)
+
+def test_best_loss_weights_on_disk():
+    small_model = create_small_network(4)
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        best_loss_weights = BestLossWeights(target_loss=0.2, checkpoint_folder=tmpdirname)
+        best_loss_weights.set_model(small_model)
+        best_loss_weights.on_train_begin()
+
+        best_epoch_weights = [weight.numpy().copy() for weight in small_model.weights]
+        best_loss_weights.on_epoch_end(0, {'loss': 0.3})
+        small_model.set_weights([weight + 1 for weight in best_epoch_weights])
+        best_loss_weights.on_epoch_end(1, {'loss': 0.9})
+        best_loss_weights.on_train_end()
+
+        assert not hasattr(best_loss_weights, 'best_weights')  # Nothing kept in memory
+        for weight, expected in zip(small_model.weights, best_epoch_weights):
+            np.testing.assert_array_equal(weight.numpy(), expected)
+
 class TestMoveSelectedSongs(unittest.TestCase):
     def setUp(self):
         # Create temporary directories for test data
@@ -109,6 +495,44 @@ class TestMoveSelectedSongs(unittest.TestCase):
         expected_files = ['song1.mid', 'song2.mid', 'song3.mid', 'song4.mid', 'song5.mid', 'song6.mid']
         self.assertCountEqual(moved_files, expected_files)
 
+    def select(self, songs, mode="hardlink"):
+        with open(self.csv_file_path, 'w') as csv_file:
+            csv_file.write("\n".join(songs))
+        with patch('BardicInspiration.lstm_network.messagebox'):
+            move_selected_songs(self.csv_file_path, self.midi_folder, self.output_folder, mode)
+
+    def test_move_selected_songs_only_changes_difference(self):
+        self.select(['song1', 'song2'])
+        kept_file = os.path.join(self.output_folder, 'song2.mid')
+        self.assertTrue(os.path.samefile(kept_file, os.path.join(self.midi_folder, 'song2.mid')))  # Linked, not copied
+
+        with patch('BardicInspiration.lstm_network.os.link', wraps=os.link) as mock_link:
+            self.select(['song2', 'song3'])
+
+        self.assertCountEqual(os.listdir(self.output_folder), ['song2.mid', 'song3.mid'])
+        mock_link.assert_called_once_with(os.path.join(self.midi_folder, 'song3.mid'),
+                                          os.path.join(self.output_folder, 'song3.mid'))
+
+    def test_move_selected_songs_copy_skips_unchanged(self):
+        self.select(['song1'], mode="copy")
+        with patch('BardicInspiration.lstm_network.shutil.copy2') as mock_copy:
+            self.select(['song1'], mode="copy")
+        mock_copy.assert_not_called()
+
+    def test_move_selected_songs_symlink(self):
+        self.select(['song1'], mode="symlink")
+        link_path = os.path.join(self.output_folder, 'song1.mid')
+        self.assertTrue(os.path.islink(link_path))
+        self.assertEqual(training_files(self.output_folder), [link_path])
+
+    def test_move_selected_songs_manifest(self):
+        self.select(['song1', 'song2'])
+        self.select(['song3', 'song1'], mode="manifest")
+
+        self.assertEqual(os.listdir(self.output_folder), ['selection.txt'])
+        self.assertEqual(training_files(self.output_folder),
+                         [os.path.join(self.midi_folder, 'song1.mid'), os.path.join(self.midi_folder, 'song3.mid')])
+
 def test_train_model():
     output_folder = 'output_folder'
 
@@ -0,0 +1,102 @@
+import struct
+
+import mido
+import pytest
+
+from BardicInspiration.feature_extraction import extract_music_data
+from BardicInspiration.midi_scanner import scan_events, scan_music_data, read_variable_int
+
+def write_midi(path, tracks):
+    # tracks is a list of message lists, saved with mido so the scanner reads what mido writes
+    midi = mido.MidiFile()
+    for messages in tracks:
+        midi.tracks.append(mido.MidiTrack(messages))
+    midi.save(str(path))
+    return str(path)
+
+def midi_bytes(*tracks):
+    # A type 1 file made of raw track bytes, for what mido doesn't write (running status, broken tracks)
+    header = b'MThd' + struct.pack('>LhhH', 6, 1, len(tracks), 480)
+    return header + b''.join(b'MTrk' + struct.pack('>L', len(track)) + track for track in tracks)
+
+def test_read_variable_int():
+    assert read_variable_int(bytes([0x00]), 0) == (0, 1)
+    assert read_variable_int(bytes([0x81, 0x00]), 0) == (128, 2)
+    assert read_variable_int(bytes([0x05, 0xFF, 0x7F]), 1) == (16383, 3)
+
+@pytest.mark.parametrize("key", ['C', 'G', 'F#', 'Bb', 'Cb', 'Am', 'Ebm', 'A#m'])
+def test_scan_music_data_matches_mido(tmp_path, key):
+    midi_file = write_midi(tmp_path / "song.mid", [
+        [mido.MetaMessage('track_name', name='Lead'),
+         mido.MetaMessage('set_tempo', tempo=428571),
+         mido.MetaMessage('time_signature', numerator=6, denominator=8),
+         mido.MetaMessage('key_signature', key=key),
+         mido.Message('program_change', program=24),
+         mido.Message('control_change', control=7, value=100),
+         mido.Message('pitchwheel', pitch=-200),
+         mido.Message('note_on', note=60, velocity=64, time=0),
+         mido.Message('aftertouch', value=30, time=10),
+         mido.Message('note_off', note=60, velocity=64, time=480)],
+        [mido.Message('sysex', data=[1, 2, 3]),
+         mido.Message('program_change', channel=9, program=0),
+         mido.MetaMessage('set_tempo', tempo=500000, time=960),
+         mido.Message('polytouch', note=60, value=5)],
+    ])
+
+    assert scan_music_data(midi_file, "Boss") == extract_music_data(midi_file, "Boss")
+
+def test_scan_music_data_without_events(tmp_path):
+    midi_file = write_midi(tmp_path / "empty.mid", [[mido.Message('note_on', note=60), mido.Message('note_off', note=60)]])
+
+    assert scan_music_data(midi_file, "Sad") == extract_music_data(midi_file, "Sad") == \
+        {'song_name': 'empty', 'label': 'Sad', 'pitch_classes': [1] + [0] * 11}
+
+def test_scan_music_data_pitch_classes(tmp_path):
+    midi_file = write_midi(tmp_path / "notes.mid", [
+        [mido.Message('note_on', note=60, velocity=64), mido.Message('note_on', note=72, velocity=64),
+         mido.Message('note_on', note=60, velocity=0),  # Really a note_off
+         mido.Message('note_on', channel=3, note=67, velocity=10), mido.Message('note_off', note=62)],
+        [mido.Message('note_on', channel=9, note=38, velocity=100)],  # Drums don't count
+    ])
+
+    features = scan_music_data(midi_file, "Boss")
+
+    assert features['pitch_classes'] == [2, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0]
+    assert features == extract_music_data(midi_file, "Boss")
+
+def test_scan_events_running_status():
+    # note_on, then two more note_ons and a program change with the status byte left out
+    track = bytes([0x00, 0x90, 60, 64, 0x10, 62, 64, 0x10, 64, 0,
+                   0x00, 0xFF, 0x51, 0x03, 0x07, 0xA1, 0x20,  # Meta events don't change running status
+                   0x00, 65, 64,
+                   0x00, 0xC3, 40, 0x00, 41,
+                   0x00, 0xFF, 0x2F, 0x00])
+
+    pitch_classes = [0] * 12
+    assert scan_events(midi_bytes(track), pitch_classes) == [('tempo', 500000), ('program_change', 40), ('program_change', 41)]
+    assert pitch_classes == [1, 0, 1, 0, 0, 1, 0, 0, 0, 0, 0, 0]  # 60, 62 and 65. 64 had velocity 0
+
+def test_scan_music_data_damaged_program_change(tmp_path):
+    # The scanner doesn't check data bytes, so a program change can come out above 127
+    track = bytes([0x00, 0xC0, 0x85, 0x00, 0xC1, 41, 0x00, 0xFF, 0x2F, 0x00])
+    midi_file = tmp_path / "damaged.mid"
+    midi_file.write_bytes(midi_bytes(track))
+
+    assert scan_music_data(str(midi_file), "Boss")['instruments'] == ["Unknown", "Violin"]
+
+def test_scan_events_running_status_without_status():
+    with pytest.raises(OSError):
+        scan_events(midi_bytes(bytes([0x00, 60, 64])))
+
+def test_scan_events_not_a_midi_file():
+    with pytest.raises(OSError):
+        scan_events(b'not a MIDI file')
+
+def test_scan_events_truncated_track():
+    data = midi_bytes(bytes([0x00, 0xC0, 5, 0x00, 0xFF, 0x51, 0x03, 0x07, 0xA1, 0x20]))
+    with pytest.raises(EOFError):
+        scan_events(data[:-4])
+
+def test_scan_events_unknown_key_signature():
+    with pytest.raises(ValueError):
+        scan_events(midi_bytes(bytes([0x00, 0xFF, 0x59, 0x02, 0x09, 0x00])))
@@ -0,0 +1,110 @@
+import os
+import tempfile
+
+import pytest
+
+from BardicInspiration.corpus import encode_songs, save_corpus
+from BardicInspiration.model_registry import (ModelRegistry, label_songs, training_fingerprint, read_fingerprint, save_fingerprint,
+                                              saved_weights_file, LEGACY_WEIGHTS_FILE)
+
+def test_label_songs():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        features_csv = os.path.join(tmpdirname, "music_features.csv")
+        with open(features_csv, 'w') as csv_file:
+            csv_file.write("song_name,tempo,time_signature,instruments,key_signature,label\n"
+                           "a,120,4/4,Piano,C,Boss\nb,90,3/4,Violin,G,Tavern\nc,100,4/4,Piano,D,Boss\n"
+                           "d,80,4/4,Flute,E,tavern \n")
+
+        assert label_songs(features_csv, "Boss") == ['a', 'c']
+        assert label_songs(features_csv, "Tavern") == ['b', 'd']
+
+def test_weights_file_can_be_saved():
+    # Keras 3 refuses to save weights to any other name
+    assert ModelRegistry().get("Boss", 1).weights_file.endswith(".weights.h5")
+
+def test_unknown_label():
+    with pytest.raises(ValueError):
+        ModelRegistry().label_folder("Polka")
+
+def test_versions_and_publish():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        registry = ModelRegistry(tmpdirname)
+        assert registry.current("Sad") is None
+
+        first = registry.new_version("Sad")
+        second = registry.new_version("Sad")
+        assert (first.version, second.version) == (1, 2)
+
+        registry.publish(first, {'songs': 3})
+        assert registry.current("Sad").version == 1
+        assert registry.current("Sad").info()['songs'] == 3
+        assert registry.trained_labels() == ["Sad"]
+        # Version 2 was started but never published
+        assert registry.unfinished_version("Sad").version == 2
+
+        registry.publish(second, {})
+        assert registry.current("Sad").version == 2
+        assert registry.unfinished_version("Sad") is None
+
+def test_is_complete():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        model_version = ModelRegistry(tmpdirname).new_version("Victory")
+        assert not model_version.is_complete()
+
+        save_corpus(encode_songs([['C4']]), model_version.corpus_folder)
+        with open(model_version.weights_file, 'wb') as weights_file:
+            weights_file.write(b"weights")
+
+        assert model_version.is_complete()
+
+def test_saved_weights_file_falls_back_to_legacy_name():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        model_version = ModelRegistry(tmpdirname).new_version("Boss")
+        save_corpus(encode_songs([['C4']]), model_version.corpus_folder)
+        assert saved_weights_file(model_version.weights_file) == model_version.weights_file
+
+        legacy_file = os.path.join(model_version.folder, LEGACY_WEIGHTS_FILE)
+        with open(legacy_file, 'wb') as weights_file:
+            weights_file.write(b"weights")
+        assert saved_weights_file(model_version.weights_file) == legacy_file
+        assert model_version.is_complete()
+
+        # Once the model is trained again the new file wins
+        with open(model_version.weights_file, 'wb') as weights_file:
+            weights_file.write(b"weights")
+        assert saved_weights_file(model_version.weights_file) == model_version.weights_file
+
+def test_training_fingerprint():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        song_path = os.path.join(tmpdirname, "song.mid")
+        with open(song_path, 'wb') as song_file:
+            song_file.write(b"MThd first")
+        fingerprint = training_fingerprint([song_path], epochs=100)
+
+        assert training_fingerprint([song_path], epochs=100) == fingerprint
+        assert training_fingerprint([song_path], epochs=50) != fingerprint
+        with open(song_path, 'wb') as song_file:
+            song_file.write(b"MThd changed")
+        assert training_fingerprint([song_path], epochs=100) != fingerprint
+
+def test_save_and_read_fingerprint():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        assert read_fingerprint(tmpdirname) is None
+        save_fingerprint(tmpdirname, "abc")
+        assert read_fingerprint(tmpdirname) == "abc"
+        save_fingerprint(tmpdirname, None)
+        assert read_fingerprint(tmpdirname) is None
+
+def test_find_fingerprint():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        registry = ModelRegistry(tmpdirname)
+        model_version = registry.new_version("Boss")
+        registry.publish(model_version, {'fingerprint': "abc"})
+        assert registry.find("Boss", "abc") is None  # No weights or corpus yet
+
+        save_corpus(encode_songs([['C4']]), model_version.corpus_folder)
+        with open(model_version.weights_file, 'wb') as weights_file:
+            weights_file.write(b"weights")
+
+        assert registry.find("Boss", "abc").version == 1
+        assert registry.find("Boss", "def") is None
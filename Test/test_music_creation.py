@@ -1,8 +1,12 @@
+import os
+import pickle
+import tempfile
 import unittest
 from unittest.mock import Mock, patch, mock_open
 import numpy as np
 import tkinter as tk
 from BardicInspiration.music_creation import *
+from BardicInspiration.corpus import save_corpus
 
 class TestMusicGeneration(unittest.TestCase):
     @patch('builtins.open', new_callable=unittest.mock.mock_open, read_data="dummy_data")
@@ -38,6 +42,24 @@ class TestMusicGeneration(unittest.TestCase):
         self.assertEqual(len(net_input), len(notes) - 100)
         self.assertEqual(norm_input.shape, (len(notes) - 100, 100, 1))
 
+    def test_prepare_token_sequence(self):
+        tokens = np.arange(105, dtype=np.int16) % 5
+        net_input = prepare_token_sequence(tokens)
+
+        self.assertEqual(net_input.shape, (5, 100))
+        np.testing.assert_array_equal(net_input[1], tokens[1:101])
+
+    def test_load_generation_corpus_from_notes_pickle(self):
+        # Installs from before the integer corpus only have notes.pkl
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            with open(os.path.join(tmpdirname, "notes.pkl"), "wb") as file:
+                pickle.dump(["D4", "C4", "D4"], file)
+
+            corpus = load_generation_corpus(tmpdirname)
+
+        self.assertEqual(corpus.vocab, ["C4", "D4"])
+        self.assertEqual(list(corpus.tokens), [1, 0, 1])
+
     @patch('keras.models.Sequential.load_weights')  # Mock the load_weights method
     @patch('os.path.exists', return_value=True)  # Mock os.path.exists to return True
     def test_create_neural_network(self, mock_exists, mock_load_weights):
@@ -50,7 +72,175 @@ class TestMusicGeneration(unittest.TestCase):
 
         # Assertions
         assert len(lstm_model.layers) == 11
-        mock_load_weights.assert_called_once_with("best_weights_loss.h5")
+        mock_load_weights.assert_called_once_with("best_weights_loss.weights.h5")
+
+    def test_generation_files_by_label(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            registry = ModelRegistry(tmpdirname)
+            with self.assertRaises(FileNotFoundError):
+                generation_files("Boss", tmpdirname)
+
+            model_version = registry.new_version("Boss")
+            registry.publish(model_version, {})
+
+            self.assertEqual(generation_files("Boss", tmpdirname), (model_version.corpus_folder, model_version.weights_file))
+            self.assertEqual(generation_files(), ("data", "best_weights_loss.weights.h5"))
+
+            # A model trained before the weights file was renamed is still found
+            with open(os.path.join(model_version.folder, "best_weights_loss.h5"), "wb") as weights_file:
+                weights_file.write(b"weights")
+            self.assertEqual(generation_files("Boss", tmpdirname)[1],
+                             os.path.join(model_version.folder, "best_weights_loss.h5"))
+
+    @patch('keras.models.Sequential.load_weights')
+    def test_load_generation_model_input_scale(self, mock_load_weights):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            registry = ModelRegistry(tmpdirname)
+            model_version = registry.new_version("Boss")
+            save_corpus(encode_songs([["C4", "D4", "E4"] * 40]), model_version.corpus_folder)
+            registry.publish(model_version, {'input_scale': 2})
+
+            lstm_model, net_input, pitch_names, note_vocab, input_scale = load_generation_model("Boss", tmpdirname)
+
+        self.assertEqual((note_vocab, input_scale), (3, 2))
+        mock_load_weights.assert_called_once_with(model_version.weights_file)
+
+    def test_create_stateful_network_matches_full_window(self):
+        # The stateful copy should give the same prediction as the original network on the seed window
+        note_vocab = 12
+        seed = np.random.rand(1, 100, 1).astype('float32')
+        lstm_model = create_neural_network(seed, note_vocab, weights_file=None)
+
+        stateful_model = create_stateful_network(lstm_model, note_vocab)
+
+        expected = lstm_model.predict(seed, verbose=0)
+        actual = stateful_model(seed, training=False).numpy()
+        np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+    def test_reset_states(self):
+        # A reused stateful network starts the next piece from the same state as a new one
+        note_vocab = 12
+        seed = np.random.rand(1, 100, 1).astype('float32')
+        stateful_model = create_stateful_network(create_neural_network(seed, note_vocab, weights_file=None), note_vocab)
+
+        first = stateful_model(seed, training=False).numpy()
+        reset_states(stateful_model)
+        np.testing.assert_allclose(stateful_model(seed, training=False).numpy(), first, atol=1e-6)
+
+    def test_create_step_network_carries_states(self):
+        # Feeding the window in two halves with the states handed over should match the full window
+        note_vocab = 12
+        seed = np.random.rand(2, 100, 1).astype('float32')
+        lstm_model = create_neural_network(seed, note_vocab, weights_file=None)
+        step_model = create_step_network(lstm_model, note_vocab)
+        zero_states = [np.zeros((2, 512), dtype='float32')] * 6
+
+        first_half = step_model([seed[:, :60]] + zero_states, training=False)
+        carried_states = [state.numpy() for state in first_half[1:]]
+        second_half = step_model([seed[:, 60:]] + carried_states, training=False)
+
+        np.testing.assert_allclose(second_half[0].numpy(), lstm_model.predict(seed, verbose=0), atol=1e-5)
+
+    def test_create_music_incremental(self):
+        pitch_names = ["C", "D", "E", "F", "G"]
+        notes = pitch_names * 21
+        net_input, norm_input = prepare_note_sequence(notes, pitch_names, len(pitch_names))
+        lstm_model = create_neural_network(norm_input, len(pitch_names), weights_file=None)
+
+        pred_output = create_music_incremental(lstm_model, net_input, pitch_names, len(pitch_names), length=10)
+
+        self.assertEqual(len(pred_output), 10)
+        self.assertTrue(all(note in pitch_names for note in pred_output))
+
+    def test_create_music_slides_window(self):
+        # The seed is a view over the token array, and each prediction sees the window moved along by one note
+        pitch_names = ["C", "D", "E", "F", "G"]
+        net_input = prepare_token_sequence(np.arange(105) % 5)
+        lstm_model = Mock()
+        lstm_model.predict.return_value = np.array([[0.0, 0.0, 1.0, 0.0, 0.0]])
+
+        with patch('BardicInspiration.music_creation.numpy.random.randint', return_value=3):
+            pred_output = create_music(lstm_model, net_input, pitch_names, len(pitch_names), length=3)
+
+        self.assertEqual(pred_output, ["E", "E", "E"])
+        windows = [call_args.args[0].reshape(-1) * 5 for call_args in lstm_model.predict.call_args_list]
+        np.testing.assert_allclose(windows[0], net_input[3])
+        np.testing.assert_allclose(windows[1], np.append(net_input[3][1:], 2))
+        np.testing.assert_allclose(windows[2], np.append(net_input[3][2:], [2, 2]))
+
+    def test_create_music_batch_remembers_whole_piece(self):
+        # Unlike create_music, the stateful network predicts each note from the seed plus everything generated so far
+        pitch_names = ["C", "D", "E", "F", "G"]
+        net_input, norm_input = prepare_note_sequence(pitch_names * 21, pitch_names, len(pitch_names))
+        lstm_model = create_neural_network(norm_input, len(pitch_names), weights_file=None)
+        predictions = []
+        def pick_likeliest(step_predictions):
+            predictions.append(step_predictions[0])
+            return step_predictions.argmax(axis=1)
+
+        with patch('BardicInspiration.music_creation.sample_notes', side_effect=pick_likeliest), \
+                patch('BardicInspiration.music_creation.numpy.random.randint', return_value=np.array([2])):
+            pred_output = create_music_incremental(lstm_model, net_input, pitch_names, len(pitch_names), length=4)
+
+        history = list(net_input[2])
+        for step, note_name in enumerate(pred_output):
+            expected = lstm_model.predict(np.reshape(history, (1, -1, 1)) / 5.0, verbose=0)[0]
+            np.testing.assert_allclose(predictions[step], expected, atol=1e-5)
+            history.append(pitch_names.index(note_name))
+        # The first note comes from exactly the window create_music starts from
+        windowed = lstm_model.predict(np.reshape(net_input[2], (1, 100, 1)) / 5.0, verbose=0)[0]
+        np.testing.assert_allclose(predictions[0], windowed, atol=1e-5)
+
+    def test_sample_notes(self):
+        # Rows with all their probability on one note always pick that note
+        predictions = np.array([[0.0, 1.0, 0.0], [0.0, 0.0, 1.0], [1.0, 0.0, 0.0]], dtype='float32')
+        for _ in range(20):
+            np.testing.assert_array_equal(sample_notes(predictions), [1, 2, 0])
+
+    def test_sample_notes_distribution(self):
+        np.random.seed(0)
+        predictions = np.tile(np.array([[0.2, 0.3, 0.5]], dtype='float32'), (20000, 1))
+        counts = np.bincount(sample_notes(predictions), minlength=3) / 20000.0
+        np.testing.assert_allclose(counts, [0.2, 0.3, 0.5], atol=0.02)
+
+    def test_create_music_batch(self):
+        pitch_names = ["C", "D", "E", "F", "G"]
+        notes = pitch_names * 21
+        net_input, norm_input = prepare_note_sequence(notes, pitch_names, len(pitch_names))
+        lstm_model = create_neural_network(norm_input, len(pitch_names), weights_file=None)
+
+        pred_outputs = create_music_batch(lstm_model, net_input, pitch_names, len(pitch_names), 3, length=8)
+
+        self.assertEqual(len(pred_outputs), 3)
+        for pred_output in pred_outputs:
+            self.assertEqual(len(pred_output), 8)
+            self.assertTrue(all(note in pitch_names for note in pred_output))
+
+    def test_generate_learned_midi_files(self):
+        # The path behind --count: load the model, then one batch for all the pieces
+        pitch_names = ["C", "D", "E", "F", "G"]
+        net_input, norm_input = prepare_note_sequence(pitch_names * 21, pitch_names, len(pitch_names))
+        lstm_model = create_neural_network(norm_input, len(pitch_names), weights_file=None)
+
+        with patch('BardicInspiration.music_creation.weights_file_exists', return_value=True), \
+                patch('BardicInspiration.music_creation.load_generation_model',
+                      return_value=(lstm_model, net_input, pitch_names, len(pitch_names), len(pitch_names))), \
+                patch('BardicInspiration.music_creation.create_music_batch',
+                      side_effect=lambda *args, **kwargs: create_music_batch(*args, length=6, **kwargs)) as music_batch:
+            music_outputs = generate_learned_midi_files(4)[0]
+
+        music_batch.assert_called_once()
+        self.assertEqual([len(music_output) for music_output in music_outputs], [6] * 4)
+        self.assertTrue(all(note in pitch_names for music_output in music_outputs for note in music_output))
+
+    @patch('music21.stream.Stream.write')
+    @patch('tkinter.messagebox.showinfo')
+    def test_create_midi_files(self, mock_showinfo, mock_write):
+        output_file_paths = create_midi_files([['C', 'D'], ['E', 'F'], ['G']])
+
+        self.assertEqual([os.path.basename(path) for path in output_file_paths], ['output_1.mid', 'output_2.mid', 'output_3.mid'])
+        self.assertEqual(mock_write.call_count, 3)
+        mock_showinfo.assert_called_once()
 
     @patch('music21.stream.Stream.write')
     @patch('tkinter.messagebox.showinfo')
@@ -0,0 +1,54 @@
+import csv
+import itertools
+import os
+
+import pytest
+
+from BardicInspiration.music_index import MusicIndex
+from BardicInspiration.music_classification import music_search, load_music_index
+
+@pytest.fixture
+def music_info():
+    return {
+        "Song1": {"Tempo": 120.0, "Time Signature": "4/4", "Instruments": ["Piano", "Guitar"], "Key Signature": "C", "Label": "Tavern"},
+        "Song2": {"Tempo": 140.0, "Time Signature": "3/4", "Instruments": ["Flute", "Violin", "Flute"], "Key Signature": "G", "Label": "Exploration"},
+        "Song3": {"Tempo": 90.0, "Time Signature": "6/8", "Instruments": ["Trumpet"], "Key Signature": "Dm", "Label": "Sad"},
+        "Song4": {"Tempo": -1, "Time Signature": "4/4", "Instruments": ["Piano"], "Key Signature": "C", "Label": "tavern"},
+        "Song5": {"Tempo": 181.0, "Time Signature": "4/4", "Instruments": [""], "Key Signature": "Am", "Label": "Boss"},
+        "Song6": {"Tempo": 60.0, "Time Signature": "2/2", "Instruments": ["Guitar"], "Key Signature": "C", "Label": "Tavern"},
+        "Song7": {"Tempo": 120.0, "Time Signature": "4/4", "Instruments": ["Guitar"], "Key Signature": "C", "Label": "TAVERN"},
+    }
+
+def test_search_matches_music_search(music_info):
+    index = MusicIndex(music_info)
+    choices = itertools.product(["Any", "0-60", "61-120", "121-180", "181+", (60.0, 120.0), (200.0, 100.0)],
+                                ["Any", "4/4", "3/4", "6/8", "5/4"], ["Any", "Piano", "Guitar", "Flute", "Harp"],
+                                ["Any", "C", "G", "Am"], ["Any", "Tavern", "sad", "Boss", "Victory"])
+    assert len(index) == 7
+    for choice in choices:
+        assert music_search(*choice, index) == music_search(*choice, music_info), choice
+
+def test_search_keeps_catalog_order(music_info):
+    index = MusicIndex(music_info)
+    assert index.search("Any", "Any", "Any", "Any", "Any") == list(music_info)
+    assert index.search("61-120", "4/4", "Any", "C", "Tavern") == ["Song1", "Song7"]
+
+def test_empty_index():
+    assert MusicIndex({}).search("0-60", "4/4", "Piano", "C", "Tavern") == []
+
+def test_load_music_index_refreshes_when_csv_changes(tmp_path):
+    csv_file = str(tmp_path / "music_features.csv")
+    def write_catalog(names):
+        with open(csv_file, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['song_name', 'tempo', 'time_signature', 'instruments', 'key_signature', 'label'])
+            writer.writerows([name, '100', '4/4', 'Piano', 'C', 'Tavern'] for name in names)
+
+    write_catalog(["Song1"])
+    os.utime(csv_file, ns=(1, 1))
+    index = load_music_index(csv_file)
+    assert load_music_index(csv_file) is index
+
+    write_catalog(["Song1", "Song2"])
+    os.utime(csv_file, ns=(2, 2))
+    assert load_music_index(csv_file).search("Any", "Any", "Piano", "Any", "Any") == ["Song1", "Song2"]
@@ -0,0 +1,94 @@
+import csv
+import os
+from unittest.mock import patch
+
+import pytest
+
+from BardicInspiration.name_index import NameIndex, normalize
+from BardicInspiration.music_classification import load_name_index, perform_name_search_function
+
+SONGS = [
+    "(Nakhuto Saghii) World of Warcraft - Forsaken Tavern_ Tarren Mill",
+    "(Meriadoc Took) Tavern Beat",
+    "Zelda - Legend of Zelda - Bolero of Fire - Arranged by Sinbios",
+    "The Legend of Zelda Ocarina of Time - Boss Battle",
+    "La_Chicane_Ma_Taverne",
+    "Café Théâtre",
+    "Tavern",
+]
+
+@pytest.fixture
+def index():
+    return NameIndex(SONGS)
+
+def test_normalize():
+    assert normalize("World of Warcraft - Forsaken Tavern_ Tarren Mill") == "world of warcraft forsaken tavern tarren mill"
+    assert normalize("  __--  ") == ""
+
+def test_find_substring_shortest_first(index):
+    assert index.find("tavern") == ["Tavern", "La_Chicane_Ma_Taverne", "(Meriadoc Took) Tavern Beat",
+                                    "(Nakhuto Saghii) World of Warcraft - Forsaken Tavern_ Tarren Mill"]
+    assert index.find("TAVERN tarren") == ["(Nakhuto Saghii) World of Warcraft - Forsaken Tavern_ Tarren Mill"]
+    assert index.find("tavern", limit=2) == ["Tavern", "La_Chicane_Ma_Taverne"]
+
+def test_find_words_in_order(index):
+    assert index.find("ocarina zelda") == []
+    assert index.find("of zelda") == ["The Legend of Zelda Ocarina of Time - Boss Battle",
+                                      "Zelda - Legend of Zelda - Bolero of Fire - Arranged by Sinbios"]
+
+def test_find_checks_names_with_every_trigram():
+    # "banana nab" has both trigrams of "anab", but not one after the other
+    assert NameIndex(["Banana Nab"]).find("anab") == []
+
+def test_find_short_queries_match_word_starts(index):
+    assert index.find("b") == ["(Meriadoc Took) Tavern Beat", "The Legend of Zelda Ocarina of Time - Boss Battle",
+                               "Zelda - Legend of Zelda - Bolero of Fire - Arranged by Sinbios"]
+    assert index.find("th") == ["Café Théâtre", "The Legend of Zelda Ocarina of Time - Boss Battle"]
+    assert index.find("") == index.find("--") == []
+
+def test_find_unicode(index):
+    assert index.find("théâ") == ["Café Théâtre"]
+    assert index.find("thea") == []
+
+def test_fuzzy_misspelled(index):
+    assert index.fuzzy("zelda bolreo")[0] == "Zelda - Legend of Zelda - Bolero of Fire - Arranged by Sinbios"
+    assert index.fuzzy("ocarina zelda")[0] == "The Legend of Zelda Ocarina of Time - Boss Battle"
+    assert index.fuzzy("qqqqqq") == []
+
+def test_fuzzy_reads_only_rarest_trigrams(index):
+    assert index.fuzzy("tavern beet", limit=3) == ["(Meriadoc Took) Tavern Beat", "Tavern",
+                                                   "(Nakhuto Saghii) World of Warcraft - Forsaken Tavern_ Tarren Mill"]
+    # With room for only the rarest trigrams ("n b", " be"), the best match is still counted in full, but names
+    # that only share the common "tavern" trigrams aren't found
+    with patch('BardicInspiration.name_index.MAX_FUZZY_POSTINGS', 4):
+        assert index.fuzzy("tavern beet", limit=3) == ["(Meriadoc Took) Tavern Beat"]
+
+def test_search_falls_back_to_fuzzy(index):
+    assert index.search("tarren") == ["(Nakhuto Saghii) World of Warcraft - Forsaken Tavern_ Tarren Mill"]
+    assert index.search("tavrn beat")[0] == "(Meriadoc Took) Tavern Beat"
+
+def test_empty_index():
+    index = NameIndex([])
+    assert len(index) == 0
+    assert index.find("tavern") == index.find("t") == index.fuzzy("tavern") == []
+
+def test_perform_name_search_function(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open('music_features.csv', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['song_name', 'tempo', 'time_signature', 'instruments', 'key_signature', 'label'])
+        for song in SONGS:
+            writer.writerow([song, '120', '4/4', 'Piano', 'C', 'Tavern'])
+
+    with patch('BardicInspiration.music_classification.messagebox') as messagebox:
+        perform_name_search_function("tavern beat")
+        messagebox.showinfo.assert_called_once_with("Success", "1 songs found and saved to selected_songs.csv")
+        with open('selected_songs.csv', newline='') as file:
+            assert list(csv.DictReader(file)) == [{'Song Name': "(Meriadoc Took) Tavern Beat"}]
+
+        os.remove('selected_songs.csv')
+        perform_name_search_function("xyzzy")
+        assert not os.path.exists('selected_songs.csv')
+        assert messagebox.showinfo.call_args[0][0] == "No Results"
+
+    assert load_name_index('music_features.csv') is load_name_index('music_features.csv')
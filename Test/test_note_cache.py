@@ -0,0 +1,79 @@
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+from BardicInspiration.note_cache import NoteCache, file_hash
+
+def write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def test_key_follows_file_contents():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        cache = NoteCache(os.path.join(tmpdirname, "cache"))
+        write_file(os.path.join(tmpdirname, "a.mid"), b"same data")
+        write_file(os.path.join(tmpdirname, "b.mid"), b"same data")
+        write_file(os.path.join(tmpdirname, "c.mid"), b"other data")
+
+        assert cache.key(os.path.join(tmpdirname, "a.mid")) == cache.key(os.path.join(tmpdirname, "b.mid"))
+        assert cache.key(os.path.join(tmpdirname, "a.mid")) != cache.key(os.path.join(tmpdirname, "c.mid"))
+        assert file_hash(os.path.join(tmpdirname, "a.mid")) != cache.key(os.path.join(tmpdirname, "a.mid"))
+
+def test_put_and_get():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        cache = NoteCache(tmpdirname)
+
+        assert cache.get("missing") is None
+        cache.put("abc", ['C4', 'D4'])
+        assert cache.get("abc") == ['C4', 'D4']
+
+def test_prune_removes_least_recently_used():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        cache = NoteCache(tmpdirname)
+        for number, key in enumerate(["old", "middle", "new"]):
+            cache.put(key, ['C4'] * 100)
+            os.utime(cache.entry_path(key), (time.time() - 100 + number, time.time() - 100 + number))
+        cache.get("old")  # Reading an entry makes it the most recently used
+
+        entry_size = os.path.getsize(cache.entry_path("old"))
+        removed = cache.prune(max_bytes=2 * entry_size)
+
+        assert removed == 1
+        assert cache.get("middle") is None
+        assert cache.get("old") == ['C4'] * 100
+        assert cache.get("new") == ['C4'] * 100
+
+def test_prune_empty_cache():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        assert NoteCache(os.path.join(tmpdirname, "never_created")).prune(0) == 0
+
+def test_entries_removed_by_another_process():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        cache = NoteCache(tmpdirname)
+        cache.put("gone", ['C4'])
+        cache.put("kept", ['D4'])
+        real_stat, real_remove = os.stat, os.remove
+
+        def stat_after_removal(path, *args, **kwargs):
+            if path == cache.entry_path("gone"):
+                real_remove(path)  # Another process prunes the entry between listdir and stat
+            return real_stat(path, *args, **kwargs)
+
+        with patch('BardicInspiration.note_cache.os.stat', side_effect=stat_after_removal):
+            assert [path for _, _, path in cache.entries()] == [cache.entry_path("kept")]
+
+        cache.put("gone", ['C4'])
+        entries = cache.entries()
+        real_remove(cache.entry_path("gone"))
+        with patch.object(cache, 'entries', return_value=entries):
+            assert cache.prune(0) == 1
+        assert cache.entries() == []
+
+def test_get_entry_pruned_after_reading():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        cache = NoteCache(tmpdirname)
+        cache.put("abc", ['C4'])
+
+        with patch('BardicInspiration.note_cache.os.utime', side_effect=FileNotFoundError):
+            assert cache.get("abc") == ['C4']
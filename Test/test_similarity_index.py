@@ -0,0 +1,104 @@
+import csv
+from unittest.mock import patch
+
+import numpy
+import pytest
+
+from BardicInspiration import similarity_index
+
+from BardicInspiration.similarity_index import (SimilarityIndex, instrument_families, key_part, song_vector,
+                                                target_vector, DIMENSIONS)
+
+def make_row(song_name, tempo="120", key="C", time_signature="4/4", instruments="Piano", pitch_classes=""):
+    return {'song_name': song_name, 'tempo': tempo, 'key_signature': key, 'time_signature': time_signature,
+            'instruments': instruments, 'label': "Tavern", 'pitch_classes': pitch_classes}
+
+@pytest.fixture
+def rows():
+    return [
+        make_row("Waltz", "90", "G", "3/4", "Violin;Violin;Piano"),
+        make_row("Jig", "180", "D", "6/8", "Flute;Violin"),
+        make_row("March", "118", "C", "4/4", "Trumpet;Trumpet;Bass"),
+        make_row("Lament", "60", "Am", "4/4", "Flute", "[0, 0, 0, 0, 5, 0, 0, 0, 0, 10, 0, 0]"),
+        make_row("Anthem", "122", "C", "4/4", "Trumpet;Bass"),
+        make_row("Ballad", "unknown", "Unknown", "Unknown", ""),
+    ]
+
+def test_similar_to_leaves_out_the_song(rows):
+    index = SimilarityIndex.from_rows(rows)
+    results = index.similar_to("March", 3)
+    assert [song for song, _ in results][0] == "Anthem"
+    assert "March" not in [song for song, _ in results]
+    assert [distance for _, distance in results] == sorted(distance for _, distance in results)
+
+def test_similar_to_more_than_there_are(rows):
+    assert len(SimilarityIndex.from_rows(rows).similar_to("Jig", 100)) == len(rows) - 1
+
+def test_duplicate_song_keeps_last_row(rows):
+    index = SimilarityIndex.from_rows(rows + [make_row("Waltz", "180", "D", "6/8", "Flute;Violin")])
+    assert len(index) == len(rows)
+    assert index.similar_to("Waltz", 1) == [("Jig", 0.0)]
+
+def test_target_only_compares_given_blocks(rows):
+    index = SimilarityIndex.from_rows(rows)
+    vector, blocks = target_vector(tempo=60)
+    assert blocks == ["tempo"]
+    assert index.nearest(vector, 1, blocks) == [("Lament", 0.0)]
+
+    vector, blocks = target_vector(key="G", time_signature="3/4", instruments=["Violin"])
+    assert index.nearest(vector, 1, blocks)[0][0] == "Waltz"
+
+def test_relative_minor_is_close():
+    # A minor has the same key signature as C major, so it is much closer to it than F# major is
+    c_major, a_minor, f_sharp = (numpy.array(key_part(key)) for key in ("C", "Am", "F#"))
+    assert numpy.linalg.norm(c_major - a_minor) < numpy.linalg.norm(c_major - f_sharp)
+    assert key_part("Unknown") == [0.0, 0.0, 0.0]
+
+def test_instrument_families():
+    assert instrument_families("Piano;Flute; Harp") == ["Piano", "Flute", "Other"]
+    assert instrument_families("[0, 41, 73, 127]") == ["Piano", "Violin", "Flute", "Other"]
+    assert instrument_families("") == []
+
+def test_song_vector_without_pitch_classes():
+    vector = song_vector(make_row("Song"))
+    assert vector.shape == (DIMENSIONS,)
+    assert numpy.allclose(vector[-12:], vector[-1])
+
+def test_tree_matches_brute_force(rows):
+    pytest.importorskip("scipy")
+    brute_force = SimilarityIndex.from_rows(rows)
+    tree = SimilarityIndex.from_rows(rows, tree=True)
+    for song in brute_force.songs:
+        expected = brute_force.similar_to(song, 3)
+        found = tree.similar_to(song, 3)
+        assert [round(distance, 5) for _, distance in found] == [round(distance, 5) for _, distance in expected]
+
+def test_empty_index():
+    index = SimilarityIndex.from_rows([])
+    vector, blocks = target_vector(tempo=100)
+    assert len(index) == 0
+    assert index.nearest(vector, 5, blocks) == []
+
+def test_from_csv_uses_the_catalog_snapshot(tmp_path, rows):
+    csv_file = str(tmp_path / "music_features.csv")
+    with open(csv_file, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    with patch.object(similarity_index, 'load_catalog', wraps=similarity_index.load_catalog) as load_catalog:
+        index = SimilarityIndex.from_csv(csv_file)
+    load_catalog.assert_called_once_with(csv_file)
+    assert numpy.array_equal(index.vectors, SimilarityIndex.from_rows(rows).vectors)
+
+def test_block_search_matches_every_distance():
+    rng = numpy.random.default_rng(0)
+    index = SimilarityIndex([f"Song {number}" for number in range(500)], rng.random((500, DIMENSIONS)))
+    vector, blocks = target_vector(tempo=100, instruments=["Flute", "Violin"])
+    mask = numpy.zeros(DIMENSIONS)
+    for name in blocks:
+        mask[similarity_index.SLICES[name]] = 1.0
+    distances = numpy.linalg.norm((index.vectors - vector) * mask, axis=1)
+    expected = [index.songs[number] for number in numpy.argsort(distances, kind='stable')[:5]]
+    assert [song for song, _ in index.nearest(vector, 5, blocks)] == expected
+    assert [song for song, _ in index.nearest(index.vectors[7], 3, exclude=7)] == [
+        index.songs[number] for number in numpy.argsort(numpy.linalg.norm(index.vectors - index.vectors[7], axis=1))[1:4]]
@@ -0,0 +1,93 @@
+import os
+import tempfile
+
+import numpy as np
+import pytest
+from keras.models import Sequential
+from keras.layers import Input, Dense, Dropout
+
+from BardicInspiration.training_checkpoint import (save_checkpoint, load_checkpoint, restore_checkpoint, save_arrays,
+                                                   load_arrays, save_best_weights, load_best_weights, CHECKPOINT_FILE,
+                                                   BEST_WEIGHTS_FILE)
+
+def create_small_network(inputs=3, outputs=2):
+    small_model = Sequential([Input((inputs,)), Dense(outputs), Dropout(0.2)])
+    small_model.compile(loss='mse', optimizer='rmsprop')
+    small_model.optimizer.build(small_model.trainable_variables)
+    return small_model
+
+def test_save_and_load_arrays():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        path = os.path.join(tmpdirname, "nested", "arrays.npz")
+        save_arrays(path, [np.arange(3), np.ones((2, 2))], epoch=np.array(4))
+
+        arrays, extra = load_arrays(path)
+
+        assert len(arrays) == 2
+        np.testing.assert_array_equal(arrays[1], np.ones((2, 2)))
+        assert int(extra['epoch']) == 4
+        assert os.listdir(os.path.dirname(path)) == ["arrays.npz"]  # No temporary file left behind
+
+def test_load_checkpoint_missing():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        assert load_checkpoint(tmpdirname) is None
+
+def test_checkpoint_round_trip():
+    saved_model = create_small_network()
+    saved_model.optimizer.variables[-1].assign(np.ones(saved_model.optimizer.variables[-1].shape))
+    state = {'seed': 2 ** 100, 'batches': 60, 'best_loss': {'best_epoch': 3}}
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_checkpoint(tmpdirname, saved_model, 5, state)
+        checkpoint = load_checkpoint(tmpdirname)
+
+        restored_model = create_small_network()
+        restore_checkpoint(restored_model, checkpoint)
+
+    assert checkpoint.epoch == 5
+    assert checkpoint.state == state
+    for restored, saved in zip(restored_model.variables + restored_model.optimizer.variables,
+                               saved_model.variables + saved_model.optimizer.variables):
+        np.testing.assert_array_equal(restored.numpy(), saved.numpy())
+
+def test_checkpoint_keeps_its_best_weights():
+    best_model, later_model = create_small_network(), create_small_network()
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_best_weights(tmpdirname, best_model)
+        save_checkpoint(tmpdirname, best_model, 1, {})
+        # A later epoch replaces the best weights, then training stops before the next checkpoint
+        save_best_weights(tmpdirname, later_model)
+
+        restore_checkpoint(create_small_network(), load_checkpoint(tmpdirname))
+        restored_model = create_small_network()
+        load_best_weights(tmpdirname, restored_model)
+
+    for restored, best in zip(restored_model.weights, best_model.weights):
+        np.testing.assert_array_equal(restored.numpy(), best.numpy())
+
+def test_checkpoint_before_any_best_weights():
+    small_model = create_small_network()
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_checkpoint(tmpdirname, small_model, 0, {})
+        save_best_weights(tmpdirname, small_model)
+
+        restore_checkpoint(create_small_network(), load_checkpoint(tmpdirname))
+
+        assert not os.path.exists(os.path.join(tmpdirname, BEST_WEIGHTS_FILE))
+
+def test_restore_checkpoint_wrong_network():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_checkpoint(tmpdirname, create_small_network(outputs=2), 0, {})
+
+        with pytest.raises(ValueError):
+            restore_checkpoint(create_small_network(outputs=5), load_checkpoint(tmpdirname))
+
+def test_interrupted_write_keeps_old_checkpoint():
+    small_model = create_small_network()
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_checkpoint(tmpdirname, small_model, 0, {})
+        # A crash halfway through writing the next one only leaves a temporary file behind
+        with open(os.path.join(tmpdirname, CHECKPOINT_FILE + ".tmp"), 'wb') as partial_file:
+            partial_file.write(b"PK")
+
+        assert load_checkpoint(tmpdirname).epoch == 0
@@ -0,0 +1,77 @@
+"""Time of one Search click on a large synthetic catalog: the old way (process_csv parses the whole CSV, then
+music_search checks every song) against a query on the in-memory MusicIndex. Also shows how long building the
+index takes.
+
+Run from the repository root:  python benchmarks/bench_catalog_search.py --songs 1000000"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BardicInspiration.music_classification import process_csv, music_search
+from BardicInspiration.music_index import MusicIndex
+
+INSTRUMENTS = ["Piano", "Bells", "Organ", "Guitar", "Bass", "Violin", "Voice", "Trumpet", "Reeds", "Flute", "Other"]
+TIME_SIGNATURES = ["4/4", "3/4", "2/2", "6/8", "2/4", "12/8"]
+KEYS = ["A", "Am", "Bb", "C", "Cm", "D", "Dm", "Eb", "F#", "G", "Unknown"]
+LABELS = ["Tavern", "Boss", "Sad", "Exploration", "Victory"]
+QUERIES = [
+    ("Any", "Any", "Any", "Any", "Boss"),
+    ("121-180", "3/4", "Any", "Any", "Any"),
+    ("61-120", "4/4", "Flute", "Dm", "Tavern"),
+    ("181+", "6/8", "Trumpet", "F#", "Victory"),
+]
+
+
+def write_synthetic_catalog(csv_file, songs, seed=0):
+    rng = random.Random(seed)
+    with open(csv_file, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['song_name', 'tempo', 'time_signature', 'instruments', 'key_signature', 'label'])
+        for number in range(songs):
+            instruments = ";".join(rng.choice(INSTRUMENTS) for _ in range(rng.randint(1, 4)))
+            writer.writerow([f"Song {number}", rng.uniform(30, 240), rng.choice(TIME_SIGNATURES), instruments,
+                             rng.choice(KEYS), rng.choice(LABELS)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CSV search against the in-memory index")
+    parser.add_argument("--songs", type=int, default=1000000, help="songs in the synthetic catalog")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        csv_file = os.path.join(folder, "music_features.csv")
+        write_synthetic_catalog(csv_file, args.songs)
+        print(f"{args.songs} songs, {os.path.getsize(csv_file) / (1024 * 1024):.0f} MB CSV")
+
+        start = time.perf_counter()
+        music_info = process_csv(csv_file)
+        parse_time = time.perf_counter() - start
+        print(f"process_csv (paid on every click before): {parse_time:.2f} s")
+
+        start = time.perf_counter()
+        index = MusicIndex(music_info)
+        print(f"MusicIndex built from process_csv's result: {time.perf_counter() - start:.2f} s")
+
+        print(f"{'query':52} {'results':>8} {'csv click':>10} {'in memory':>10}")
+        for query in QUERIES + [((100.0, 104.5), "Any", "Any", "Any", "Any")]:
+            query_name = " / ".join(query if isinstance(query[0], str) else (f"{query[0][0]}-{query[0][1]}",) + query[1:])
+            start = time.perf_counter()
+            expected = music_search(*query, music_info)
+            csv_time = parse_time + time.perf_counter() - start
+
+            start = time.perf_counter()
+            found = index.search(*query)
+            index_time = time.perf_counter() - start
+            assert found == expected
+            print(f"{query_name:52} {len(found):8} {csv_time:9.3f}s {index_time:9.4f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Time to pull the features out of every MIDI file in a folder with extract_music_data (mido decodes every message)
+against scan_music_data (midi_scanner only decodes meta and program change events). Also checks both give the same
+features.
+
+Run from the repository root:  python benchmarks/bench_feature_extraction.py --folder "BardicInspiration/MIDI Music" """
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BardicInspiration.feature_extraction import extract_music_data
+from BardicInspiration.midi_scanner import scan_music_data
+
+
+def run(extract, midi_files):
+    """Returns (seconds, {midi_file: features or the error's type name})"""
+    results = {}
+    start = time.perf_counter()
+    for midi_file in midi_files:
+        try:
+            results[midi_file] = extract(midi_file, "Benchmark")
+        except Exception as e:
+            results[midi_file] = type(e).__name__
+    return time.perf_counter() - start, results
+
+
+def main():
+    default_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "BardicInspiration", "MIDI Music")
+    parser = argparse.ArgumentParser(description="Benchmark mido against the meta event scanner")
+    parser.add_argument("--folder", default=default_folder, help="folder with the MIDI files")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each reader, the fastest is shown")
+    args = parser.parse_args()
+
+    midi_files = sorted(glob.glob(os.path.join(args.folder, "*.mid")))
+    total_mb = sum(os.path.getsize(midi_file) for midi_file in midi_files) / (1024 * 1024)
+
+    mido_time, mido_results = min((run(extract_music_data, midi_files) for _ in range(args.repeat)), key=lambda result: result[0])
+    scan_time, scan_results = min((run(scan_music_data, midi_files) for _ in range(args.repeat)), key=lambda result: result[0])
+    different = [midi_file for midi_file in midi_files if mido_results[midi_file] != scan_results[midi_file]]
+
+    print(f"{len(midi_files)} files, {total_mb:.1f} MB")
+    print(f"extract_music_data (mido):  {mido_time:7.2f} s  {mido_time / len(midi_files) * 1000:8.2f} ms/file")
+    print(f"scan_music_data:            {scan_time:7.2f} s  {scan_time / len(midi_files) * 1000:8.2f} ms/file")
+    print(f"speedup:                    {mido_time / scan_time:7.1f}x")
+    print(f"files with different results: {len(different)}")
+    for midi_file in different:
+        print(f"  {os.path.basename(midi_file)}: mido {mido_results[midi_file] if isinstance(mido_results[midi_file], str) else 'ok'}, "
+              f"scanner {scan_results[midi_file] if isinstance(scan_results[midi_file], str) else 'ok'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Compares the per-note cost of create_music (full 100 note window per note) with create_music_incremental
+(stateful network, one note per step). Uses random weights so it can run without best_weights_loss.weights.h5.
+
+Run from the repository root:  python benchmarks/bench_generation.py --notes 100"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BardicInspiration.music_creation import prepare_note_sequence, create_neural_network, create_music, create_music_incremental
+
+
+def time_generation(generate, lstm_model, net_input, pitch_names, note_vocab, length):
+    """Runs one generation and returns the seconds spent per generated note"""
+    start = time.perf_counter()
+    generate(lstm_model, net_input, pitch_names, note_vocab, length)
+    return (time.perf_counter() - start) / length
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark windowed vs. stateful note generation")
+    parser.add_argument("--notes", type=int, default=100, help="notes generated per run")
+    parser.add_argument("--vocab", type=int, default=125, help="size of the note vocabulary")
+    args = parser.parse_args()
+
+    pitch_names = [f"N{number}" for number in range(args.vocab)]
+    notes = [pitch_names[number % args.vocab] for number in range(400)]
+    net_input, norm_input = prepare_note_sequence(notes, pitch_names, args.vocab)
+    lstm_model = create_neural_network(norm_input, args.vocab, weights_file=None)
+
+    windowed_time = time_generation(create_music, lstm_model, net_input, pitch_names, args.vocab, args.notes)
+    incremental_time = time_generation(create_music_incremental, lstm_model, net_input, pitch_names, args.vocab, args.notes)
+
+    print(f"create_music (windowed):   {windowed_time * 1000:8.2f} ms/note")
+    print(f"create_music_incremental:  {incremental_time * 1000:8.2f} ms/note")
+    print(f"speedup:                   {windowed_time / incremental_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
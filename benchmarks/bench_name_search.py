@@ -0,0 +1,63 @@
+"""Time to find songs by name in a synthetic catalog whose names are made of the words of the real catalog's names:
+checking every name for the query, and NameIndex.find and NameIndex.fuzzy.
+
+Run from the repository root:  python benchmarks/bench_name_search.py --songs 1000000"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BardicInspiration.feature_catalog import read_rows
+from BardicInspiration.name_index import NameIndex, WORD, normalize
+
+CSV_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "BardicInspiration",
+                        "music_features.csv")
+QUERIES = ["tavern", "zelda", "final fantasy", "battle theme", "of the", "warcraft forsaken", "k", "xq", "bolreo",
+           "legend zelda ocarina"]
+
+
+def synthetic_names(songs, rng):
+    """Names of 3 to 9 words taken from the real catalog's names, numbered so that none repeats"""
+    words = sorted(set(word for row in read_rows(CSV_FILE) for word in WORD.findall(row['song_name'])))
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(3, 9))) + f" {number}" for number in range(songs)]
+
+
+def per_query(function, queries, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for query in queries:
+            function(query)
+    return (time.perf_counter() - start) / (repeats * len(queries)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark finding songs by name")
+    parser.add_argument("--songs", type=int, default=1000000, help="songs in the synthetic catalog")
+    parser.add_argument("--repeats", type=int, default=20, help="times to run each query")
+    args = parser.parse_args()
+
+    names = synthetic_names(args.songs, random.Random(0))
+    start = time.perf_counter()
+    index = NameIndex(names)
+    build = time.perf_counter() - start
+
+    texts = [normalize(name) for name in names]
+    def scan(query):
+        text = normalize(query)
+        return [name for name, name_text in zip(names, texts) if text in name_text]
+
+    print(f"{args.songs} songs, {len(QUERIES)} queries, NameIndex built in {build:.2f} s")
+    print(f"Checking every name:  {per_query(scan, QUERIES, 1):8.3f} ms per query")
+    print(f"NameIndex.find:       {per_query(index.find, QUERIES, args.repeats):8.3f} ms per query")
+    print(f"NameIndex.fuzzy:      {per_query(index.fuzzy, QUERIES, args.repeats):8.3f} ms per query")
+    for query in QUERIES:
+        print(f"  {query!r:24} find {per_query(index.find, [query], args.repeats):7.3f} ms, "
+              f"fuzzy {per_query(index.fuzzy, [query], args.repeats):7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Time to answer a batch of searches (one per encounter of a campaign, say) on a synthetic catalog: music_search on
+the process_csv dictionary once per search, MusicIndex once per search, and music_search_batch on CatalogColumns
+answering them all together.
+
+Run from the repository root:  python benchmarks/bench_search_batch.py --songs 100000 --searches 500"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BardicInspiration.catalog_columns import CatalogColumns
+from BardicInspiration.music_classification import music_search, music_search_batch
+from BardicInspiration.music_index import MusicIndex
+
+INSTRUMENTS = ["Piano", "Bells", "Organ", "Guitar", "Bass", "Violin", "Voice", "Trumpet", "Reeds", "Flute", "Other"]
+TIME_SIGNATURES = ["4/4", "3/4", "2/2", "6/8", "2/4", "12/8"]
+KEYS = ["A", "Am", "Bb", "C", "Cm", "D", "Dm", "Eb", "F#", "G", "Unknown"]
+LABELS = ["Tavern", "Boss", "Sad", "Exploration", "Victory"]
+TEMPOS = ["0-60", "61-120", "121-180", "181+"]
+
+
+def synthetic_music_info(songs, rng):
+    """A dictionary like the one process_csv returns"""
+    return dict((f"Song {number}", {'Tempo': rng.uniform(30, 240), 'Time Signature': rng.choice(TIME_SIGNATURES),
+                                    'Instruments': [rng.choice(INSTRUMENTS) for _ in range(rng.randint(1, 4))],
+                                    'Key Signature': rng.choice(KEYS), 'Label': rng.choice(LABELS)})
+                for number in range(songs))
+
+
+def synthetic_searches(count, rng):
+    """Searches that each leave about half of the choices at "Any\""""
+    def pick(options):
+        return "Any" if rng.random() < 0.5 else rng.choice(options)
+    return [(pick(TEMPOS), pick(TIME_SIGNATURES), pick(INSTRUMENTS), pick(KEYS), pick(LABELS)) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark one search at a time against music_search_batch")
+    parser.add_argument("--songs", type=int, default=100000, help="songs in the synthetic catalog")
+    parser.add_argument("--searches", type=int, default=500, help="searches in the batch")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    music_info = synthetic_music_info(args.songs, rng)
+    searches = synthetic_searches(args.searches, rng)
+
+    start = time.perf_counter()
+    expected = [music_search(*search, music_info) for search in searches]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = MusicIndex(music_info)
+    index_build = time.perf_counter() - start
+    start = time.perf_counter()
+    assert [index.search(*search) for search in searches] == expected
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = CatalogColumns(music_info)
+    columns_build = time.perf_counter() - start
+    start = time.perf_counter()
+    results = music_search_batch(searches, columns)
+    batch_time = time.perf_counter() - start
+    assert [columns.names(ids) for ids in results] == expected
+
+    print(f"{args.songs} songs, {args.searches} searches")
+    print(f"music_search on the dictionary, one at a time: {loop_time:8.2f} s")
+    print(f"MusicIndex, one at a time:                     {index_time:8.2f} s  (+{index_build:.2f} s to build)")
+    print(f"music_search_batch on CatalogColumns:          {batch_time:8.2f} s  (+{columns_build:.2f} s to build)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Time to find the songs most like a song on a synthetic catalog of vectors: SimilarityIndex working out every
+distance with a matrix product, and (if scipy is installed) the k-d tree it builds with tree=True.
+
+Run from the repository root:  python benchmarks/bench_similarity.py --songs 1000000 --queries 100"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BardicInspiration.similarity_index import SimilarityIndex, DIMENSIONS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the nearest-neighbour song search")
+    parser.add_argument("--songs", type=int, default=1000000, help="songs in the synthetic catalog")
+    parser.add_argument("--queries", type=int, default=100, help="songs to find neighbours of")
+    parser.add_argument("-k", type=int, default=10, help="neighbours to find for each song")
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(0)
+    vectors = rng.random((args.songs, DIMENSIONS), dtype=numpy.float32)
+    songs = [f"Song {number}" for number in range(args.songs)]
+    queries = [songs[number] for number in rng.choice(args.songs, size=args.queries, replace=False)]
+
+    start = time.perf_counter()
+    index = SimilarityIndex(songs, vectors)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = [index.similar_to(song, args.k) for song in queries]
+    brute_force = (time.perf_counter() - start) / args.queries
+    print(f"{args.songs} songs, {args.queries} queries, k={args.k}")
+    print(f"Matrix product: {brute_force * 1000:8.2f} ms per query  (+{build:.2f} s to build)")
+
+    try:
+        start = time.perf_counter()
+        tree_index = SimilarityIndex(songs, vectors, tree=True)
+    except ImportError:
+        print("k-d tree: scipy is not installed")
+        return
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    found = [tree_index.similar_to(song, args.k) for song in queries]
+    tree = (time.perf_counter() - start) / args.queries
+    same = sum(set(song for song, _ in a) == set(song for song, _ in b) for a, b in zip(found, expected))
+    print(f"k-d tree:       {tree * 1000:8.2f} ms per query  (+{build:.2f} s to build, {same}/{args.queries} the same)")
+
+
+if __name__ == "__main__":
+    main()
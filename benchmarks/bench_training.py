@@ -0,0 +1,74 @@
+"""Wall time and steps/sec of training: the old loop (fit(epochs=1) once per epoch, get_weights() after each one)
+against train (one fit with BestLossWeights), and optionally train with an XLA compiled step. Uses random tokens so
+it can run without any MIDI files.
+
+Run from the repository root:  python benchmarks/bench_training.py --notes 5000 --epochs 5"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BardicInspiration.lstm_network import create_network, create_training_windows, create_training_dataset, train
+
+
+def train_epoch_at_a_time(lstm_model, music_input, music_output, epochs):
+    """The training loop train used to have: one fit per epoch and a full copy of the weights whenever it improved"""
+    best_loss_difference = float('inf')
+    batch_size = 32
+    dataset = create_training_dataset(music_input, music_output, lstm_model.output_shape[-1], batch_size)
+    steps_per_epoch = math.ceil(len(music_output) / batch_size)
+
+    for epoch in range(epochs):
+        history = lstm_model.fit(dataset, epochs=1, steps_per_epoch=steps_per_epoch, verbose=0)
+        loss_difference = abs(history.history['loss'][0] - 0.2)
+        if loss_difference < best_loss_difference:
+            best_loss_difference = loss_difference
+            best_epoch_weights = lstm_model.get_weights()
+
+
+def measure(run_training, steps):
+    """Returns (seconds, steps per second) for run_training"""
+    start = time.perf_counter()
+    run_training()
+    elapsed = time.perf_counter() - start
+    return elapsed, steps / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the epoch-at-a-time loop against a single fit")
+    parser.add_argument("--notes", type=int, default=5000, help="number of notes in the corpus")
+    parser.add_argument("--vocab", type=int, default=125, help="size of the note vocabulary")
+    parser.add_argument("--epochs", type=int, default=5, help="epochs trained by each run")
+    parser.add_argument("--xla", action="store_true", help="also time train with an XLA compiled step")
+    args = parser.parse_args()
+
+    tokens = numpy.random.default_rng(0).integers(0, args.vocab, size=args.notes).astype(numpy.int16)
+    music_input, music_output = create_training_windows(tokens)
+    steps = args.epochs * math.ceil(len(music_output) / 32)
+
+    def single_fit(jit_compile):
+        lstm_model = create_network(music_input, args.vocab, jit_compile=jit_compile)
+        with patch.object(lstm_model, 'save_weights'):  # Leave best_weights_loss.weights.h5 alone
+            train(lstm_model, music_input, music_output, epochs=args.epochs)
+
+    results = [("fit(epochs=1) per epoch", measure(
+        lambda: train_epoch_at_a_time(create_network(music_input, args.vocab), music_input, music_output, args.epochs),
+        steps))]
+    results.append(("train (one fit)", measure(lambda: single_fit(False), steps)))
+    if args.xla:
+        results.append(("train (one fit, XLA)", measure(lambda: single_fit(True), steps)))
+
+    print(f"{args.notes} notes, vocabulary {args.vocab}, {args.epochs} epochs, {steps} steps")
+    for name, (elapsed, steps_per_second) in results:
+        print(f"{name + ':':26} {elapsed:8.2f} s  {steps_per_second:8.1f} steps/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Peak memory of preparing training data: copying every window up front (list of windows, float64 inputs, one-hot
+targets, the way lstm_network used to) against create_training_windows + create_training_dataset (strided view,
+float32 per batch, integer targets).
+
+Run from the repository root:  python benchmarks/bench_training_windows.py --notes 200000 --vocab 300"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BardicInspiration.lstm_network import create_training_windows, create_training_dataset
+
+
+def copied_windows(tokens, pitch_names, number_of_notes=100):
+    """Every window copied into one float64 array and every target as a one-hot row"""
+    music_input = [tokens[i:i + number_of_notes] for i in range(len(tokens) - number_of_notes)]
+    music_input = numpy.reshape(music_input, (len(music_input), number_of_notes, 1)) / float(pitch_names)
+    music_output = numpy.eye(pitch_names, dtype='float32')[tokens[number_of_notes:]]
+    return music_input, music_output
+
+
+def measure(prepare):
+    """Returns (peak MB allocated, seconds) while running prepare"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    prepare()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare peak memory of the two training data paths")
+    parser.add_argument("--notes", type=int, default=200000, help="number of notes in the corpus")
+    parser.add_argument("--vocab", type=int, default=300, help="size of the note vocabulary")
+    args = parser.parse_args()
+
+    tokens = numpy.random.default_rng(0).integers(0, args.vocab, size=args.notes).astype(numpy.int16)
+
+    def windowed():
+        music_input, music_output = create_training_windows(tokens)
+        dataset = create_training_dataset(music_input, music_output, args.vocab)
+        next(iter(dataset))  # What training holds at any moment is a few prefetched batches
+
+    old_peak, old_time = measure(lambda: copied_windows(tokens, args.vocab))
+    new_peak, new_time = measure(windowed)
+
+    print(f"{args.notes} notes, vocabulary {args.vocab}")
+    print(f"copied windows:            peak {old_peak:9.1f} MB  {old_time:6.2f} s")
+    print(f"create_training_windows:   peak {new_peak:9.1f} MB  {new_time:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()